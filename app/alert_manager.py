@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import time
+
+from probes import probe_type
+from traceroute import path_ips, paths_differ
+
+# Níveis de alerta, do melhor para o pior
+ALERT_LEVELS = ('ok', 'degraded', 'down')
+
+DEFAULT_ALERT_CONFIG = {
+    'loss_threshold': 10,
+    'latency_threshold_ms': 1000,
+    'down_loss_threshold': 100,
+    # Para voltar a ok as métricas precisam ficar abaixo de limite * clear_ratio
+    'clear_ratio': 0.8,
+    'trigger_samples': 1,
+    'recovery_samples': 2,
+    'flap_threshold': 4,
+    'flap_window_minutes': 60,
+    # Avisar quando a rota do traceroute mudar
+    'path_change': True
+}
+
+def host_key(host):
+    """Chave do host nos estados: o mesmo nome com outro tipo de teste é outro host no banco"""
+    return (host['name'], probe_type(host))
+
+class AlertManager:
+    """Máquina de estados de alerta por host (ok → degradado → fora → recuperado)
+
+    O estado é gravado em uma thread, para a espera pelo lock do banco
+    não parar o event loop.
+    """
+
+    def __init__(self, db, notifier, config):
+        self.db = db
+        self.notifier = notifier
+        self.config = config
+        self.states = self.db.load_alert_states()
+        # (nome, tipo de teste) -> (saltos da rota atual, desde)
+        self.paths = self.db.load_host_paths()
+
+    def reload(self):
+        """Relê do banco estados e rotas (hosts que outro worker testava até agora)"""
+        self.states = self.db.load_alert_states()
+        self.paths = self.db.load_host_paths()
+
+    def forget(self, host):
+        """Tira o host da memória; o estado gravado no banco é mantido"""
+        self.states.pop(host_key(host), None)
+        self.paths.pop(host_key(host), None)
+
+    def forget_path(self, host):
+        """Esquece a rota atual do host (IP trocado); a próxima vira a nova referência"""
+        self.paths.pop(host_key(host), None)
+
+    def host_config(self, host):
+        """Limites do host: padrão < test_config.alert_defaults < host.alert"""
+        merged = dict(DEFAULT_ALERT_CONFIG)
+        merged.update(self.config['test_config'].get('alert_defaults', {}))
+        merged.update(host.get('alert', {}))
+        return merged
+
+    def classify(self, results, current, settings):
+        """Nível indicado pela amostra, com histerese entre ok e degradado"""
+        loss = results['packet_loss']
+        latency = results['avg_latency']
+
+        if not results['is_available'] or loss >= settings['down_loss_threshold']:
+            return 'down'
+        if loss > settings['loss_threshold'] or latency > settings['latency_threshold_ms']:
+            return 'degraded'
+
+        ratio = settings['clear_ratio']
+        if loss <= settings['loss_threshold'] * ratio and latency <= settings['latency_threshold_ms'] * ratio:
+            return 'ok'
+
+        # Na faixa de histerese: um host degradado continua degradado
+        return 'degraded' if current != 'ok' else 'ok'
+
+    def new_state(self):
+        return {
+            'state': 'ok',
+            'since': time.time(),
+            'pending_state': None,
+            'pending_count': 0,
+            'flapping': False,
+            'transitions': []
+        }
+
+    def update_flapping(self, state, settings, now):
+        """Descarta transições fora da janela e reavalia se o host está oscilando
+
+        Chamado a cada amostra, não só nas transições: um host que parou de
+        oscilar (num estado ou noutro) sai do modo oscilando quando as
+        transições envelhecem. Retorna True se algo mudou.
+        """
+        window = settings['flap_window_minutes'] * 60
+        transitions = [t for t in state['transitions'] if now - t <= window]
+        changed = len(transitions) != len(state['transitions'])
+        state['transitions'] = transitions
+
+        flapping = state['flapping']
+        if len(transitions) >= settings['flap_threshold']:
+            flapping = True
+        elif len(transitions) <= settings['flap_threshold'] // 2:
+            flapping = False
+        changed = changed or flapping != state['flapping']
+        state['flapping'] = flapping
+        return changed
+
+    async def evaluate(self, host, results):
+        """Atualiza o estado do host com a amostra e notifica transições"""
+        settings = self.host_config(host)
+        state = self.states.setdefault(host_key(host), self.new_state())
+        now = results['timestamp']
+        was_flapping = state['flapping']
+        # Início da instabilidade, para a duração do aviso quando a oscilação acaba
+        unstable_since = state['transitions'][0] if state['transitions'] else state['since']
+
+        level = self.classify(results, state['state'], settings)
+        previous = state['state']
+        duration = now - state['since']
+        transitioned = False
+
+        if level == state['state']:
+            changed = state['pending_state'] is not None
+            state['pending_state'] = None
+            state['pending_count'] = 0
+        else:
+            # Exige amostras consecutivas no novo nível antes de mudar
+            changed = True
+            if state['pending_state'] == level:
+                state['pending_count'] += 1
+            else:
+                state['pending_state'] = level
+                state['pending_count'] = 1
+
+            worsening = ALERT_LEVELS.index(level) > ALERT_LEVELS.index(state['state'])
+            required = settings['trigger_samples'] if worsening else settings['recovery_samples']
+            if state['pending_count'] >= required:
+                transitioned = True
+                state['state'] = level
+                state['since'] = now
+                state['pending_state'] = None
+                state['pending_count'] = 0
+                state['transitions'].append(now)
+
+        # Muitas transições na janela: host oscilando, notificações suspensas
+        if self.update_flapping(state, settings, now):
+            changed = True
+
+        if changed:
+            await asyncio.to_thread(self.db.save_alert_state, host, state)
+        if transitioned:
+            logging.info(f"Host {host['name']}: {previous} -> {level}")
+
+        if state['flapping']:
+            if not was_flapping:
+                await self.notifier.send_flapping(host, len(state['transitions']), settings['flap_window_minutes'])
+            return
+
+        if was_flapping:
+            # Parou de oscilar: avisa o estado em que o host ficou
+            logging.info(f"Host {host['name']}: estável em {state['state']}")
+            if state['state'] == 'ok':
+                await self.notifier.send_recovery(host, results, state['since'] - unstable_since)
+            else:
+                await self.notifier.send_alert(host, results)
+        elif transitioned:
+            if level == 'ok':
+                await self.notifier.send_recovery(host, results, duration)
+            else:
+                await self.notifier.send_alert(host, results)
+
+    async def evaluate_path(self, host, results):
+        """Compara a rota do traceroute com a atual do host e avisa se mudou"""
+        if not results.get('traceroute'):
+            return
+
+        ips = path_ips(results['traceroute'])
+        # Sem nenhum salto respondendo não há rota para comparar
+        if all(ip == '*' for ip in ips):
+            return
+
+        now = results['timestamp']
+        current = self.paths.get(host_key(host))
+        if current is not None and not paths_differ(current[0], ips):
+            return
+
+        self.paths[host_key(host)] = (ips, now)
+        await asyncio.to_thread(self.db.save_host_path, host, ips, now)
+
+        if current is None:
+            return
+        logging.info(f"Host {host['name']}: rota alterada")
+        if self.host_config(host)['path_change']:
+            await self.notifier.send_path_change(host, current[0], ips, now - current[1])
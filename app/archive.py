@@ -0,0 +1,270 @@
+import csv
+import gzip
+import json
+import logging
+import math
+import os
+
+from migrations import PARTITION_PREFIX, PARTITION_SECONDS, partition_start
+from rtt_stats import unpack_rtts
+
+# Colunas dos arquivos: o host vai pelo nome e IP (a tabela hosts pode mudar
+# depois) e a rota pela lista de IPs, sem depender de traceroute_paths
+ARCHIVE_COLUMNS = [
+    ('timestamp', 'float64'),
+    ('host_name', 'string'),
+    ('host_ip', 'string'),
+    ('probe_type', 'string'),
+    ('packet_loss', 'float64'),
+    ('avg_latency', 'float64'),
+    ('min_latency', 'float64'),
+    ('max_latency', 'float64'),
+    ('jitter', 'float64'),
+    ('is_available', 'bool'),
+    ('successful_pings', 'int64'),
+    ('total_pings', 'int64'),
+    ('p50_latency', 'float64'),
+    ('p95_latency', 'float64'),
+    ('p99_latency', 'float64'),
+    ('ipdv_jitter', 'float64'),
+    ('loss_bursts', 'int64'),
+    ('max_loss_burst', 'int64'),
+    ('mos', 'float64'),
+    # RTT de cada ping e de cada salto, NaN nas perdas (como em pack_rtts)
+    ('rtts', 'list<float32>'),
+    ('path', 'string'),
+    ('hop_rtts', 'list<float32>'),
+    # Texto do traceroute dos resultados anteriores à migração 6
+    ('traceroute', 'string'),
+]
+
+ARCHIVE_EXTENSIONS = {'parquet': '.parquet', 'csv': '.csv.gz'}
+
+# Colunas lidas para as agregações por host
+WINDOW_COLUMNS = ['timestamp', 'host_name', 'host_ip', 'is_available', 'avg_latency',
+                  'min_latency', 'max_latency', 'packet_loss', 'jitter']
+
+def partition_query(name):
+    """Lote de linhas da partição a partir do id, no formato de ARCHIVE_COLUMNS"""
+    return f'''
+        SELECT r.id, r.timestamp, h.name, h.ip, h.probe_type, r.packet_loss, r.avg_latency, r.min_latency,
+               r.max_latency, r.jitter, r.is_available, r.successful_pings, r.total_pings,
+               r.p50_latency, r.p95_latency, r.p99_latency, r.ipdv_jitter, r.loss_bursts,
+               r.max_loss_burst, r.mos, r.rtts, p.hops, r.hop_rtts, r.traceroute
+        FROM {name} r
+        JOIN hosts h ON h.id = r.host_id
+        LEFT JOIN traceroute_paths p ON p.id = r.path_id
+        WHERE r.id > ?
+        ORDER BY r.id
+        LIMIT ?
+    '''
+
+def archive_row(row):
+    """Linha do banco (sem o id) com os blobs de RTT convertidos em listas"""
+    row = list(row)
+    for index in (19, 21):
+        if row[index] is not None:
+            row[index] = unpack_rtts(row[index]).tolist()
+    if row[9] is not None:
+        row[9] = bool(row[9])
+    return row
+
+class ParquetWriter:
+    """Grava lotes de linhas em um arquivo Parquet (um row group por lote)"""
+
+    extension = '.parquet'
+
+    def __init__(self, path, compression='zstd'):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        types = {
+            'float64': pa.float64(),
+            'string': pa.string(),
+            'bool': pa.bool_(),
+            'int64': pa.int64(),
+            'list<float32>': pa.list_(pa.float32())
+        }
+        self.pa = pa
+        self.schema = pa.schema([(column, types[kind]) for column, kind in ARCHIVE_COLUMNS])
+        self.writer = pq.ParquetWriter(path, self.schema, compression=compression)
+
+    def write(self, rows):
+        columns = list(zip(*rows))
+        arrays = [self.pa.array(values, type=field.type) for values, field in zip(columns, self.schema)]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+class CsvWriter:
+    """Alternativa sem pyarrow: CSV com gzip, listas de RTT em JSON"""
+
+    extension = '.csv.gz'
+
+    def __init__(self, path, compression=None):
+        self.file = gzip.open(path, 'wt', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([column for column, _ in ARCHIVE_COLUMNS])
+
+    def write(self, rows):
+        for row in rows:
+            self.writer.writerow([json.dumps(value) if isinstance(value, list) else value for value in row])
+
+    def close(self):
+        self.file.close()
+
+class PartitionArchiver:
+    """Exporta partições diárias expiradas para arquivos compactados antes do DROP
+
+    Um arquivo por partição (test_results_AAAAMMDD.parquet ou .csv.gz),
+    escrito em lotes de chunk_size linhas e renomeado só no fim, então um
+    arquivo com o nome final está sempre completo.
+    """
+
+    def __init__(self, archive_dir, fmt='parquet', compression='zstd', chunk_size=50000):
+        self.archive_dir = archive_dir
+        self.compression = compression
+        self.chunk_size = chunk_size
+        self.writer_class = CsvWriter
+        if fmt == 'parquet':
+            try:
+                import pyarrow.parquet
+                self.writer_class = ParquetWriter
+            except ImportError:
+                logging.warning("pyarrow não instalado: arquivando partições em CSV com gzip")
+        elif fmt != 'csv':
+            raise ValueError(f"Formato de arquivo desconhecido: {fmt}")
+
+    def path(self, name):
+        return os.path.join(self.archive_dir, name + self.writer_class.extension)
+
+    def iter_archive(self, db, name):
+        """Exporta a partição em lotes, liberando o lock do banco entre eles
+
+        Cada passo devolve as linhas exportadas até ali; o último passo
+        devolve (caminho, linhas).
+        """
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = self.path(name)
+        partial = path + '.tmp'
+        writer = self.writer_class(partial, self.compression)
+        rows = 0
+        last_id = 0
+        try:
+            while True:
+                with db.lock:
+                    batch = db.conn.execute(partition_query(name), (last_id, self.chunk_size)).fetchall()
+                if batch:
+                    last_id = batch[-1][0]
+                    writer.write([archive_row(row[1:]) for row in batch])
+                    rows += len(batch)
+                yield rows
+                if len(batch) < self.chunk_size:
+                    break
+        except BaseException:
+            writer.close()
+            os.remove(partial)
+            raise
+        writer.close()
+        os.replace(partial, path)
+        yield path, rows
+
+class ArchiveReader:
+    """Lê os arquivos de partições, em Parquet ou CSV, em blocos"""
+
+    def __init__(self, archive_dir, chunk_size=100000):
+        self.archive_dir = archive_dir
+        self.chunk_size = chunk_size
+
+    def files(self, start_time, end_time):
+        """Arquivos com dias em [start_time, end_time), em ordem cronológica"""
+        try:
+            names = sorted(os.listdir(self.archive_dir))
+        except FileNotFoundError:
+            return []
+
+        files = []
+        for name in names:
+            for extension in ARCHIVE_EXTENSIONS.values():
+                if name.startswith(PARTITION_PREFIX) and name.endswith(extension):
+                    day_start = partition_start(name[:-len(extension)])
+                    if day_start + PARTITION_SECONDS > start_time and day_start < end_time:
+                        files.append(os.path.join(self.archive_dir, name))
+        return files
+
+    def iter_frames(self, start_time, end_time, columns=None, host_name=None):
+        """DataFrames com as linhas de [start_time, end_time), um bloco por vez"""
+        import pandas as pd
+
+        columns = columns or [column for column, _ in ARCHIVE_COLUMNS]
+        for path in self.files(start_time, end_time):
+            if path.endswith('.parquet'):
+                import pyarrow.parquet as pq
+                chunks = (batch.to_pandas() for batch in
+                          pq.ParquetFile(path).iter_batches(batch_size=self.chunk_size, columns=columns))
+            else:
+                chunks = pd.read_csv(path, usecols=columns, chunksize=self.chunk_size)
+
+            for frame in chunks:
+                keep = (frame['timestamp'] >= start_time) & (frame['timestamp'] < end_time)
+                if host_name is not None:
+                    keep &= frame['host_name'] == host_name
+                frame = frame[keep]
+                if len(frame):
+                    yield frame
+
+    def window_stats(self, start_time, end_time, host_name=None):
+        """Totais por host em [start_time, end_time), no formato de DatabaseManager.get_window_stats"""
+        totals = {}
+        for frame in self.iter_frames(start_time, end_time, WINDOW_COLUMNS, host_name):
+            frame = frame.assign(
+                available=frame['is_available'].astype(bool).astype(int),
+                latency_sumsq=frame['avg_latency'] ** 2
+            )
+            grouped = frame.groupby(['host_name', 'host_ip']).agg(
+                samples=('timestamp', 'size'),
+                available=('available', 'sum'),
+                latency_sum=('avg_latency', 'sum'),
+                latency_sumsq=('latency_sumsq', 'sum'),
+                latency_min=('min_latency', 'min'),
+                latency_max=('max_latency', 'max'),
+                loss_sum=('packet_loss', 'sum'),
+                jitter_sum=('jitter', 'sum')
+            )
+            for (name, ip), row in grouped.iterrows():
+                merge_window_row(totals, dict(row, host_name=name, host_ip=ip))
+        return sorted(totals.values(), key=lambda row: (row['host_name'], row['host_ip']))
+
+def merge_window_row(totals, row):
+    """Soma uma linha de totais por host em totals, indexado por (nome, IP)"""
+    key = (row['host_name'], row['host_ip'])
+    current = totals.get(key)
+    if current is None:
+        totals[key] = {
+            'host_name': row['host_name'],
+            'host_ip': row['host_ip'],
+            'samples': int(row['samples']),
+            'available': int(row['available']),
+            'latency_sum': float(row['latency_sum'] or 0),
+            'latency_sumsq': float(row['latency_sumsq'] or 0),
+            'latency_min': row['latency_min'],
+            'latency_max': row['latency_max'],
+            'loss_sum': float(row['loss_sum'] or 0),
+            'jitter_sum': float(row['jitter_sum'] or 0)
+        }
+        return
+    for field in ('samples', 'available', 'latency_sum', 'latency_sumsq', 'loss_sum', 'jitter_sum'):
+        current[field] += row[field] or 0
+    for field, pick in (('latency_min', min), ('latency_max', max)):
+        values = [value for value in (current[field], row[field])
+                  if value is not None and not math.isnan(value)]
+        current[field] = pick(values) if values else None
+
+def merge_window_stats(*row_lists):
+    """Junta listas de totais por host (banco e arquivo) somando os mesmos hosts"""
+    totals = {}
+    for rows in row_lists:
+        for row in rows:
+            merge_window_row(totals, row)
+    return sorted(totals.values(), key=lambda row: (row['host_name'], row['host_ip']))
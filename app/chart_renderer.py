@@ -0,0 +1,130 @@
+import logging
+import os
+
+# Figura reaproveitada entre renderizações no mesmo processo
+TEMPLATE = {}
+
+def pyplot():
+    """Importa o matplotlib no primeiro gráfico do processo"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+def availability_colors(values):
+    return ['green' if a >= 99 else 'orange' if a >= 95 else 'red' for a in values]
+
+# (chave nas estatísticas, título, rótulo do eixo, cor fixa)
+SUMMARY_PANELS = [
+    ('availability', 'Disponibilidade por Host (%)', 'Disponibilidade (%)', None),
+    ('avg_latency', 'Latência Média por Host (ms)', 'Latência (ms)', 'blue'),
+    ('packet_loss', 'Perda de Pacotes por Host (%)', 'Perda de Pacotes (%)', 'red'),
+    ('jitter', 'Jitter por Host (ms)', 'Jitter (ms)', 'purple'),
+]
+
+def build_summary_template(hosts):
+    """Cria a figura 2x2 e as barras para a lista de hosts"""
+    plt = pyplot()
+    if 'summary' in TEMPLATE:
+        plt.close(TEMPLATE['summary']['figure'])
+
+    fig, axes = plt.subplots(2, 2, figsize=(15, 12))
+    fig.suptitle('Network Monitor - Últimas 24 Horas', fontsize=16)
+
+    panels = []
+    for ax, (key, title, ylabel, color) in zip(axes.flat, SUMMARY_PANELS):
+        bars = ax.bar(hosts, [0] * len(hosts), color=color or 'green', alpha=0.7 if color else 1)
+        ax.set_title(title)
+        ax.set_ylabel(ylabel)
+        ax.tick_params(axis='x', rotation=45)
+        labels = []
+        if key == 'availability':
+            ax.set_ylim(0, 100)
+            # Valores sobre as barras de disponibilidade
+            labels = [ax.text(bar.get_x() + bar.get_width()/2, 0, '', ha='center', va='bottom')
+                      for bar in bars]
+        panels.append((key, ax, bars, labels))
+
+    plt.tight_layout()
+
+    TEMPLATE['summary'] = {'figure': fig, 'hosts': tuple(hosts), 'panels': panels}
+    return TEMPLATE['summary']
+
+def render_summary_chart(stats, chart_path, dpi=300, chart_format='png'):
+    """Desenha o resumo de 24h e salva em chart_path
+
+    Roda no processo de renderização; com a mesma lista de hosts da
+    chamada anterior apenas os dados das barras são atualizados.
+    """
+    hosts = [stat['host_name'] for stat in stats]
+
+    template = TEMPLATE.get('summary')
+    if template is None or template['hosts'] != tuple(hosts):
+        template = build_summary_template(hosts)
+
+    for key, ax, bars, labels in template['panels']:
+        values = [stat[key] for stat in stats]
+        for bar, value in zip(bars, values):
+            bar.set_height(value)
+
+        if key == 'availability':
+            for bar, color in zip(bars, availability_colors(values)):
+                bar.set_color(color)
+            for label, bar, value in zip(labels, bars, values):
+                label.set_y(value + 1)
+                label.set_text(f'{value:.1f}%')
+        else:
+            ax.relim()
+            ax.autoscale_view()
+
+    os.makedirs(os.path.dirname(chart_path), exist_ok=True)
+    template['figure'].savefig(chart_path, dpi=dpi, format=chart_format, bbox_inches='tight')
+
+    logging.info(f"Gráfico salvo em: {chart_path}")
+    return chart_path
+
+# (coluna da série, título, rótulo do eixo)
+SERIES_PANELS = [
+    ('avg_latency', 'Latência por Host (ms) - média com mínimo e máximo', 'Latência (ms)'),
+    ('packet_loss', 'Perda de Pacotes por Host (%)', 'Perda de Pacotes (%)'),
+    ('availability', 'Disponibilidade por Host (%)', 'Disponibilidade (%)'),
+]
+
+def render_series_chart(series, chart_path, hours_back=24, dpi=300, chart_format='png'):
+    """Desenha as séries temporais de todos os hosts e salva em chart_path
+    
+    series vem de DatabaseManager.get_series, já reduzida a no máximo um
+    ponto por bucket.
+    """
+    from datetime import datetime
+    import matplotlib.dates as mdates
+    plt = pyplot()
+    
+    fig, axes = plt.subplots(len(SERIES_PANELS), 1, figsize=(15, 12), sharex=True)
+    fig.suptitle(f'Network Monitor - Últimas {hours_back} Horas', fontsize=16)
+    
+    try:
+        for host_name, data in series.items():
+            times = [datetime.fromtimestamp(ts) for ts in data['timestamps']]
+            for ax, (key, _, _) in zip(axes, SERIES_PANELS):
+                line, = ax.plot(times, data[key], label=host_name, linewidth=1)
+                if key == 'avg_latency':
+                    ax.fill_between(times, data['min_latency'], data['max_latency'],
+                                    color=line.get_color(), alpha=0.15, linewidth=0)
+        
+        for ax, (key, title, ylabel) in zip(axes, SERIES_PANELS):
+            ax.set_title(title)
+            ax.set_ylabel(ylabel)
+            ax.grid(True, alpha=0.3)
+        axes[-1].set_ylim(0, 105)
+        axes[0].legend(loc='upper left', fontsize='small', ncol=4)
+        axes[-1].xaxis.set_major_formatter(mdates.DateFormatter('%d/%m %H:%M'))
+        
+        plt.tight_layout()
+        os.makedirs(os.path.dirname(chart_path), exist_ok=True)
+        fig.savefig(chart_path, dpi=dpi, format=chart_format, bbox_inches='tight')
+    finally:
+        plt.close(fig)
+    
+    logging.info(f"Gráfico de séries salvo em: {chart_path}")
+    return chart_path
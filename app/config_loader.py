@@ -0,0 +1,202 @@
+import asyncio
+import json
+import logging
+import os
+
+from probes import DNS_QUERY_TYPES, PROBE_OPTIONS, PROBE_TYPES, probe_type
+from task_scheduler import OVERLAP_POLICIES
+
+CONFIG_PATH = '/app/config/hosts.json'
+
+# Parâmetros lidos só na inicialização: mudá-los exige reiniciar o monitor
+RESTART_PREFIXES = ('db_', 'discord_', 'pipeline_', 'metrics_', 'api_', 'chart_', 'retention_', 'rollup_', 'archive_',
+                    'config_reload_', 'cycle_overlap_policy', 'shard_', 'probe_backend', 'simulation_')
+
+# Parâmetros numéricos que precisam ser positivos
+POSITIVE_KEYS = ('ping_count', 'timeout', 'test_interval_minutes', 'report_interval_hours',
+                 'max_concurrent_probes', 'max_concurrent_per_subnet', 'traceroute_max_hops',
+                 'traceroute_timeout')
+
+# Ajustes de teste que cada host pode sobrescrever em "probe"
+PROBE_KEYS = ('ping_count', 'ping_interval', 'timeout')
+
+class ConfigError(ValueError):
+    """Configuração inválida; a mensagem lista todos os problemas encontrados"""
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def probe_errors(where, prefix, probe):
+    """Problemas nos parâmetros de teste de um host ou de probe_defaults"""
+    errors = []
+    for key, value in probe.items():
+        if key == 'port':
+            if not (isinstance(value, int) and not isinstance(value, bool) and 0 < value < 65536):
+                errors.append(f"{where}: '{prefix}port' inválida ({value})")
+        elif key == 'query_type':
+            if value not in DNS_QUERY_TYPES:
+                errors.append(f"{where}: '{prefix}query_type' deve ser um de {', '.join(DNS_QUERY_TYPES)}")
+        elif key in PROBE_OPTIONS:
+            if not isinstance(value, str) or not value:
+                errors.append(f"{where}: '{prefix}{key}' deve ser um texto")
+        elif key not in PROBE_KEYS:
+            errors.append(f"{where}: parâmetro de teste desconhecido '{key}'")
+        elif not is_number(value) or value < 0 or (key != 'ping_interval' and value <= 0):
+            errors.append(f"{where}: '{prefix}{key}' inválido ({value})")
+    return errors
+
+def validate_config(config):
+    """Verifica a estrutura do hosts.json antes de aplicá-lo"""
+    if not isinstance(config, dict):
+        raise ConfigError("a raiz deve ser um objeto")
+
+    errors = []
+    hosts = config.get('hosts')
+    test_config = config.get('test_config', {})
+
+    if not isinstance(hosts, list):
+        errors.append("'hosts' deve ser uma lista")
+        hosts = []
+    if not isinstance(test_config, dict):
+        errors.append("'test_config' deve ser um objeto")
+        test_config = {}
+
+    probe_defaults = test_config.get('probe_defaults', {})
+    if not isinstance(probe_defaults, dict):
+        errors.append("test_config.probe_defaults deve ser um objeto")
+        probe_defaults = {}
+    for kind, defaults in probe_defaults.items():
+        if kind not in PROBE_TYPES or not isinstance(defaults, dict):
+            errors.append(f"test_config.probe_defaults.{kind}: tipo de teste desconhecido ou não é um objeto")
+        else:
+            errors.extend(probe_errors('test_config', f'probe_defaults.{kind}.', defaults))
+    tcp_defaults = probe_defaults.get('tcp') if isinstance(probe_defaults.get('tcp'), dict) else {}
+
+    names = set()
+    for i, host in enumerate(hosts):
+        if not isinstance(host, dict):
+            errors.append(f"hosts[{i}] deve ser um objeto")
+            continue
+        name = host.get('name')
+        if not isinstance(name, str) or not name:
+            errors.append(f"hosts[{i}] sem 'name'")
+        elif name in names:
+            errors.append(f"host duplicado: {name}")
+        names.add(name)
+        if not isinstance(host.get('ip'), str) or not host.get('ip'):
+            errors.append(f"hosts[{i}] ({name}) sem 'ip'")
+        if 'sla_target' in host and not (is_number(host['sla_target']) and 0 <= host['sla_target'] <= 100):
+            errors.append(f"{name}: 'sla_target' deve estar entre 0 e 100")
+        for section in ('alert', 'probe'):
+            if not isinstance(host.get(section, {}), dict):
+                errors.append(f"{name}: '{section}' deve ser um objeto")
+        probe = host.get('probe') if isinstance(host.get('probe'), dict) else {}
+        errors.extend(probe_errors(name, 'probe.', probe))
+        kind = probe_type(host)
+        if kind not in PROBE_TYPES:
+            errors.append(f"{name}: 'probe_type' deve ser um de {', '.join(PROBE_TYPES)}")
+        elif kind == 'tcp' and 'port' not in probe and 'port' not in tcp_defaults:
+            errors.append(f"{name}: teste tcp sem 'probe.port'")
+
+    for key in POSITIVE_KEYS:
+        if key in test_config and not (is_number(test_config[key]) and test_config[key] > 0):
+            errors.append(f"test_config.{key} deve ser um número positivo")
+    if test_config.get('cycle_overlap_policy', 'skip') not in OVERLAP_POLICIES:
+        errors.append(f"test_config.cycle_overlap_policy deve ser um de {', '.join(OVERLAP_POLICIES)}")
+
+    if errors:
+        raise ConfigError('; '.join(errors))
+
+def read_config(path=CONFIG_PATH):
+    """Lê e valida o arquivo de configuração"""
+    with open(path, 'r') as f:
+        try:
+            config = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ConfigError(f"JSON inválido: {e}")
+    validate_config(config)
+    config.setdefault('test_config', {})
+    return config
+
+def diff_hosts(old_hosts, new_hosts):
+    """Hosts adicionados, removidos e alterados (pares antigo/novo), pelo nome"""
+    old = {host['name']: host for host in old_hosts}
+    new = {host['name']: host for host in new_hosts}
+    added = [host for name, host in new.items() if name not in old]
+    removed = [host for name, host in old.items() if name not in new]
+    changed = [(old[name], host) for name, host in new.items() if name in old and old[name] != host]
+    return added, removed, changed
+
+def diff_settings(old_settings, new_settings):
+    """Chaves do test_config que mudaram, separadas em (aplicáveis agora, exigem reinício)"""
+    keys = sorted(key for key in set(old_settings) | set(new_settings)
+                  if old_settings.get(key) != new_settings.get(key))
+    restart = [key for key in keys if key.startswith(RESTART_PREFIXES)]
+    return [key for key in keys if key not in restart], restart
+
+class ConfigWatcher:
+    """Recarrega o hosts.json quando o arquivo muda (mtime) ou ao receber SIGHUP
+
+    A configuração nova só chega a on_change(config) se for válida; com
+    erro, o monitor segue com a anterior.
+    """
+
+    def __init__(self, on_change, path=CONFIG_PATH, interval=5):
+        self.on_change = on_change
+        self.path = path
+        # Intervalo de verificação do arquivo; 0 desativa (só SIGHUP)
+        self.interval = interval
+        self.signature = self.file_signature()
+        self.lock = asyncio.Lock()
+        self.task = None
+        self.reloads = 0
+        self.failures = 0
+
+    def file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def start(self):
+        if self.interval and self.task is None:
+            self.task = asyncio.create_task(self.poll())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    def trigger(self):
+        """Handler do SIGHUP: recarrega mesmo sem mudança de mtime"""
+        logging.info("SIGHUP recebido, recarregando configuração")
+        asyncio.create_task(self.reload())
+
+    async def poll(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if self.file_signature() != self.signature:
+                await self.reload()
+
+    async def reload(self):
+        """Lê, valida e aplica a configuração; retorna True se aplicou"""
+        async with self.lock:
+            # Assinatura antes da leitura: uma escrita durante a leitura gera nova tentativa
+            self.signature = self.file_signature()
+            try:
+                config = await asyncio.to_thread(read_config, self.path)
+            except (OSError, ConfigError) as e:
+                self.failures += 1
+                logging.error(f"Configuração nova rejeitada, mantendo a atual: {e}")
+                return False
+
+            try:
+                await self.on_change(config)
+            except Exception as e:
+                self.failures += 1
+                logging.error(f"Erro ao aplicar configuração: {e}")
+                return False
+            self.reloads += 1
+            return True
@@ -2,163 +2,936 @@ import sqlite3
 import json
 import logging
 from datetime import datetime, timedelta
-import threading
+import os
+import re
+import time
+
+from migrations import (ROLLUP_GRANULARITIES, RESULT_COLUMNS, PARTITION_SECONDS, migrate,
+                        partition_name, partition_start, list_partitions, create_partition)
+from rtt_stats import (histogram, pack_rtts, unpack_rtts, encode_histogram, decode_histogram,
+                       histogram_percentiles)
+from traceroute import path_hash, path_ips
+from query_cache import QueryCache, MISSING
+from probes import probe_type
+from metrics import TimedLock, DB_LOCK_WAIT, DB_WRITE_DURATION, DB_WRITE_ROWS, DB_WRITE_FAILURES
+
+# Linhas do EXPLAIN QUERY PLAN que indicam leitura da tabela inteira
+FULL_SCAN_PATTERN = re.compile(r'^SCAN (test_results\w*|rollup_\w+|hosts|latency_histograms)\b(?!.*COVERING INDEX)')
+
+def plan_problems(conn, expectations):
+    """Confere o EXPLAIN QUERY PLAN de cada consulta
+    
+    expectations: {nome: ((sql, parâmetros), trechos obrigatórios no plano,
+    trechos proibidos)}. Retorna {nome: problemas}; vazio se tudo ok.
+    """
+    problems = {}
+    for name, ((query, params), required, forbidden) in expectations.items():
+        plan = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + query, params)]
+        text = '\n'.join(plan)
+        
+        issues = [line for line in plan if FULL_SCAN_PATTERN.match(line)]
+        issues += [f"ausente: {item}" for item in required if item not in text]
+        issues += [line for line in plan if any(item in line for item in forbidden)]
+        
+        if issues:
+            problems[name] = issues
+            logging.warning(f"Plano inesperado para a consulta {name}: {issues}")
+    return problems
+
+class ResultWriteError(Exception):
+    """Resultados do lote que não foram gravados; failed diz quantos"""
+    
+    def __init__(self, message, failed):
+        super().__init__(message)
+        self.failed = failed
 
 class DatabaseManager:
-    def __init__(self, db_path='/app/data/network_monitor.db'):
+    def __init__(self, db_path='/app/data/network_monitor.db', cache_size=128, cache_bucket_seconds=60,
+                 write_retries=3, write_retry_delay=0.5, failed_results_path=None):
         self.db_path = db_path
-        self.lock = threading.Lock()
+        # Novas tentativas do lote em erros transitórios (banco travado, disco)
+        self.write_retries = write_retries
+        self.write_retry_delay = write_retry_delay
+        # Resultados que não puderam ser gravados, um JSON por linha, para inspeção
+        self.failed_results_path = failed_results_path or os.path.join(
+            os.path.dirname(db_path), 'failed_results.jsonl')
+        # Lock com o tempo de espera exposto em /metrics
+        self.lock = TimedLock(DB_LOCK_WAIT)
+        # (nome, ip, tipo de teste) -> id na tabela hosts
+        self.host_ids = {}
+        # Partições já criadas por esta conexão
+        self.partitions = set()
+        # hash da rota -> id em traceroute_paths
+        self.path_ids = {}
+        # Leituras repetidas (relatório, gráficos, SLA) saem do cache enquanto
+        # nada for gravado; write_generation muda a cada gravação desta conexão
+        self.query_cache = QueryCache(cache_size)
+        self.cache_bucket_seconds = cache_bucket_seconds
+        self.write_generation = 0
+        self.conn = self.connect()
         self.init_database()
     
+    def connect(self):
+        """Abre a conexão persistente em modo WAL"""
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # Em WAL, NORMAL só sincroniza no checkpoint e continua seguro contra corrupção
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+    
     def init_database(self):
-        """Inicializa o banco de dados"""
+        """Inicializa o banco de dados e aplica migrações pendentes"""
         with self.lock:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Tabela de resultados de testes
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS test_results (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp REAL,
-                    host_name TEXT,
-                    host_ip TEXT,
-                    packet_loss REAL,
-                    avg_latency REAL,
-                    min_latency REAL,
-                    max_latency REAL,
-                    jitter REAL,
-                    is_available BOOLEAN,
-                    successful_pings INTEGER,
-                    total_pings INTEGER,
-                    traceroute TEXT
-                )
-            ''')
+            version = migrate(self.conn)
+            logging.info(f"Banco de dados na versão {version} do schema")
             
-            # Índices para performance
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON test_results(timestamp)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_host_name ON test_results(host_name)')
+            # Sem auto_vacuum incremental o espaço das partições removidas
+            # nunca volta ao sistema de arquivos
+            if self.conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                logging.info("Convertendo banco para auto_vacuum incremental (única vez)...")
+                self.conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                self.conn.execute('VACUUM')
+    
+    def get_host_id(self, host_name, host_ip, probe_type='icmp'):
+        """Retorna o id do host, cadastrando-o se necessário (chamar com o lock)"""
+        key = (host_name, host_ip, probe_type)
+        host_id = self.host_ids.get(key)
+        if host_id is None:
+            self.conn.execute('INSERT OR IGNORE INTO hosts (name, ip, probe_type) VALUES (?, ?, ?)', key)
+            host_id = self.conn.execute(
+                'SELECT id FROM hosts WHERE name = ? AND ip = ? AND probe_type = ?', key
+            ).fetchone()[0]
+            self.host_ids[key] = host_id
+        return host_id
+    
+    def get_path_id(self, ips):
+        """Retorna o id da rota, cadastrando-a se necessário (chamar com o lock)"""
+        key = path_hash(ips)
+        path_id = self.path_ids.get(key)
+        if path_id is None:
+            self.conn.execute(
+                'INSERT OR IGNORE INTO traceroute_paths (hash, hops, first_seen) VALUES (?, ?, ?)',
+                (key, json.dumps(ips), time.time())
+            )
+            path_id = self.conn.execute(
+                'SELECT id FROM traceroute_paths WHERE hash = ?', (key,)
+            ).fetchone()[0]
+            self.path_ids[key] = path_id
+        return path_id
+    
+    def path_columns(self, hops):
+        """path_id e RTT por salto (blob float32) do traceroute do resultado"""
+        if not hops:
+            return (None, None)
+        return (self.get_path_id(path_ips(hops)), pack_rtts([hop['rtt'] for hop in hops]))
+    
+    def get_partition(self, timestamp):
+        """Retorna a partição do timestamp, criando-a se necessário (chamar com o lock)"""
+        name = partition_name(timestamp)
+        if name not in self.partitions:
+            create_partition(self.conn.cursor(), name)
+            self.partitions.add(name)
+        return name
+    
+    def results_source(self, start_time, end_time=None, conn=None):
+        """Subconsulta com os resultados de test_results e das partições do período
+        
+        Partições fora de [start_time, end_time] nem entram na consulta. conn
+        permite montar a consulta para outra conexão (a API somente leitura).
+        """
+        tables = ['test_results']
+        for name in list_partitions(conn or self.conn):
+            day_start = partition_start(name)
+            if day_start + PARTITION_SECONDS <= start_time:
+                continue
+            if end_time is not None and day_start > end_time:
+                continue
+            tables.append(name)
+        
+        columns = ', '.join(column for column, _ in RESULT_COLUMNS)
+        return '(' + ' UNION ALL '.join(f'SELECT {columns} FROM {table}' for table in tables) + ')'
+    
+    def result_row(self, host, results):
+        """Linha do lote de gravação para o resultado"""
+        return (
+            results['timestamp'],
+            (host['name'], host['ip'], probe_type(host)),
+            results['packet_loss'],
+            results['avg_latency'],
+            results['min_latency'],
+            results['max_latency'],
+            results['jitter'],
+            results['is_available'],
+            results['successful_pings'],
+            results['total_pings'],
+            results['traceroute'],
+            results.get('rtts'),
+            results.get('p50_latency'),
+            results.get('p95_latency'),
+            results.get('p99_latency'),
+            results.get('ipdv_jitter'),
+            results.get('loss_bursts'),
+            results.get('max_loss_burst'),
+            results.get('mos')
+        )
+    
+    def save_test_results(self, items):
+        """Grava de uma vez uma lista de (host, resultado), em uma única transação
+        
+        É o único caminho de gravação dos resultados: o lote vem da etapa
+        writer do pipeline, que já junta os resultados por tamanho e tempo.
+        Erros transitórios repetem o lote até write_retries vezes; depois
+        dele, ou em erro nos dados, o lote é gravado linha a linha e as
+        linhas que falham vão para failed_results_path. Nesse caso levanta
+        ResultWriteError com quantas não foram gravadas.
+        """
+        rows = []
+        failed = []
+        for host, results in items:
+            try:
+                rows.append((host, results, self.result_row(host, results)))
+            except Exception as e:
+                failed.append((host, results, e))
+        
+        attempt = 0
+        while rows:
+            with self.lock:
+                try:
+                    self.write_rows([row for _, _, row in rows])
+                    rows = []
+                    break
+                except Exception as e:
+                    error = e
+            logging.warning(f"Erro ao gravar lote de {len(rows)} resultados (tentativa {attempt + 1}): {error}")
+            # Só erros do SQLite (banco travado, disco) podem passar numa nova tentativa
+            if not isinstance(error, sqlite3.OperationalError) or attempt >= self.write_retries:
+                break
+            attempt += 1
+            time.sleep(self.write_retry_delay * attempt)
+        
+        # Separa as linhas com problema gravando uma por vez
+        with self.lock:
+            for host, results, row in rows:
+                try:
+                    self.write_rows([row])
+                except Exception as e:
+                    failed.append((host, results, e))
+        
+        if failed:
+            self.set_aside(failed)
+            raise ResultWriteError(f"{len(failed)} de {len(items)} resultados não gravados "
+                                   f"(separados em {self.failed_results_path})", len(failed))
+    
+    def set_aside(self, failed):
+        """Acrescenta os resultados não gravados ao arquivo de inspeção"""
+        DB_WRITE_FAILURES.inc(len(failed))
+        try:
+            with open(self.failed_results_path, 'a') as f:
+                for host, results, error in failed:
+                    f.write(json.dumps({
+                        'failed_at': time.time(),
+                        'error': repr(error),
+                        'host': host,
+                        'results': results
+                    }, default=repr) + '\n')
+        except Exception as e:
+            logging.error(f"Erro ao separar {len(failed)} resultados não gravados: {e}")
+    
+    def write_rows(self, result_rows):
+        """Grava as linhas de result_row em uma única transação (chamar com o lock)"""
+        if not result_rows:
+            return
+        
+        start = time.perf_counter()
+        try:
+            with self.conn:
+                # O traceroute vira referência à rota mais os RTTs por salto
+                rows = [(row[0], self.get_host_id(*row[1])) + row[2:10] + (None,) + row[11:] +
+                        self.path_columns(row[10]) for row in result_rows]
+                
+                by_partition = {}
+                for row in rows:
+                    by_partition.setdefault(self.get_partition(row[0]), []).append(row)
+                
+                for partition, partition_rows in by_partition.items():
+                    self.conn.executemany(f'''
+                        INSERT INTO {partition} 
+                        (timestamp, host_id, packet_loss, avg_latency, 
+                         min_latency, max_latency, jitter, is_available, 
+                         successful_pings, total_pings, traceroute,
+                         rtts, p50_latency, p95_latency, p99_latency,
+                         ipdv_jitter, loss_bursts, max_loss_burst, mos,
+                         path_id, hop_rtts)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', partition_rows)
+                self.update_rollups(rows)
+                self.update_histograms(rows)
+            self.write_generation += 1
+            DB_WRITE_DURATION.observe(time.perf_counter() - start)
+            DB_WRITE_ROWS.inc(len(rows))
+        except Exception:
+            # Hosts, rotas e partições criados na transação desfeita não existem mais
+            self.host_ids.clear()
+            self.path_ids.clear()
+            self.partitions.clear()
+            raise
+    
+    def update_rollups(self, rows):
+        """Soma o lote gravado nas tabelas de agregação"""
+        for name, width in ROLLUP_GRANULARITIES:
+            buckets = {}
+            for row in rows:
+                timestamp, host_id, loss, latency, min_latency, max_latency, jitter, available = row[:8]
+                key = (host_id, int(timestamp // width) * width)
+                agg = buckets.get(key)
+                if agg is None:
+                    buckets[key] = [1, 1 if available else 0, latency, latency * latency,
+                                    min_latency, max_latency, loss, jitter]
+                else:
+                    agg[0] += 1
+                    agg[1] += 1 if available else 0
+                    agg[2] += latency
+                    agg[3] += latency * latency
+                    agg[4] = min(agg[4], min_latency)
+                    agg[5] = max(agg[5], max_latency)
+                    agg[6] += loss
+                    agg[7] += jitter
             
-            conn.commit()
-            conn.close()
+            self.conn.executemany(f'''
+                INSERT INTO rollup_{name}
+                (host_id, bucket, samples, available, latency_sum, latency_sumsq,
+                 latency_min, latency_max, loss_sum, jitter_sum)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (host_id, bucket) DO UPDATE SET
+                    samples = samples + excluded.samples,
+                    available = available + excluded.available,
+                    latency_sum = latency_sum + excluded.latency_sum,
+                    latency_sumsq = latency_sumsq + excluded.latency_sumsq,
+                    latency_min = MIN(latency_min, excluded.latency_min),
+                    latency_max = MAX(latency_max, excluded.latency_max),
+                    loss_sum = loss_sum + excluded.loss_sum,
+                    jitter_sum = jitter_sum + excluded.jitter_sum
+            ''', [key + tuple(agg) for key, agg in buckets.items()])
     
-    def save_test_result(self, host, results):
-        """Salva resultado de teste no banco"""
+    def update_histograms(self, rows):
+        """Soma os RTTs do lote nos histogramas de latência por host e hora"""
+        buckets = {}
+        for row in rows:
+            if not row[11]:
+                continue
+            key = (row[1], int(row[0] // 3600) * 3600)
+            counts = histogram(unpack_rtts(row[11]))
+            buckets[key] = buckets[key] + counts if key in buckets else counts
+        
+        for (host_id, bucket), counts in buckets.items():
+            existing = self.conn.execute(
+                'SELECT counts FROM latency_histograms WHERE host_id = ? AND bucket = ?', (host_id, bucket)
+            ).fetchone()
+            if existing:
+                counts = counts + decode_histogram(existing[0])
+            self.conn.execute(
+                'INSERT OR REPLACE INTO latency_histograms (host_id, bucket, counts) VALUES (?, ?, ?)',
+                (host_id, bucket, encode_histogram(counts))
+            )
+    
+    def close(self):
+        """Fecha a conexão"""
+        with self.lock:
+            self.conn.close()
+    
+    def cached(self, name, args, compute):
+        """Resultado de compute() reaproveitado enquanto os dados não mudarem (chamar com o lock)
+        
+        A versão dos dados combina as gravações desta conexão com o
+        data_version do SQLite, que muda quando outra conexão (outro worker,
+        a retenção) grava. A chave inclui o bucket de tempo porque as janelas
+        "últimas N horas" andam com o relógio. O valor devolvido é compartilhado
+        entre as chamadas e não deve ser alterado.
+        """
+        if not self.query_cache.max_entries:
+            return compute()
+        
+        version = (self.write_generation, self.conn.execute('PRAGMA data_version').fetchone()[0])
+        key = (name, args, int(time.time() // self.cache_bucket_seconds))
+        value = self.query_cache.get(key, version)
+        if value is MISSING:
+            value = compute()
+            self.query_cache.put(key, value)
+        return value
+    
+    def window_query(self, cutoff_time, host_name=None, conn=None):
+        """Monta a consulta que soma as agregações de (cutoff_time, agora] por host
+        
+        O início da janela, que não cai em um bucket inteiro, vem dos dados
+        brutos e das agregações por minuto; o restante das agregações por
+        hora e por dia, então o resultado é igual ao de varrer test_results.
+        """
+        minute_start = (int(cutoff_time // 60) + 1) * 60
+        hour_start = -(-minute_start // 3600) * 3600
+        day_start = -(-hour_start // 86400) * 86400
+        
+        host_filter = 'AND host_id IN (SELECT id FROM hosts WHERE name = ?)' if host_name is not None else ''
+        host_params = (host_name,) if host_name is not None else ()
+        
+        rollup_columns = '''host_id, samples, available, latency_sum, latency_sumsq,
+                              latency_min, latency_max, loss_sum, jitter_sum'''
+        
+        query = f'''
+            SELECT h.name, h.ip, SUM(samples), SUM(available),
+                   SUM(latency_sum), SUM(latency_sumsq), MIN(latency_min), MAX(latency_max),
+                   SUM(loss_sum), SUM(jitter_sum)
+            FROM (
+                SELECT host_id,
+                       COUNT(*) AS samples,
+                       SUM(CASE WHEN is_available THEN 1 ELSE 0 END) AS available,
+                       SUM(avg_latency) AS latency_sum,
+                       SUM(avg_latency * avg_latency) AS latency_sumsq,
+                       MIN(min_latency) AS latency_min,
+                       MAX(max_latency) AS latency_max,
+                       SUM(packet_loss) AS loss_sum,
+                       SUM(jitter) AS jitter_sum
+                FROM {self.results_source(cutoff_time, minute_start, conn)}
+                WHERE timestamp > ? AND timestamp < ? {host_filter}
+                GROUP BY host_id
+                UNION ALL
+                SELECT {rollup_columns} FROM rollup_minute
+                WHERE bucket >= ? AND bucket < ? {host_filter}
+                UNION ALL
+                SELECT {rollup_columns} FROM rollup_hour
+                WHERE bucket >= ? AND bucket < ? {host_filter}
+                UNION ALL
+                SELECT {rollup_columns} FROM rollup_day
+                WHERE bucket >= ? {host_filter}
+            ) AS w
+            JOIN hosts h ON h.id = w.host_id
+            GROUP BY w.host_id
+            ORDER BY h.name, h.ip
+        '''
+        params = ((cutoff_time, minute_start) + host_params +
+                  (minute_start, hour_start) + host_params +
+                  (hour_start, day_start) + host_params +
+                  (day_start,) + host_params)
+        
+        return query, params
+    
+    def get_window_stats(self, hours_back, host_name=None):
+        """Obtém os totais agregados por host das últimas horas"""
         with self.lock:
             try:
-                conn = sqlite3.connect(self.db_path)
-                cursor = conn.cursor()
-                
-                cursor.execute('''
-                    INSERT INTO test_results 
-                    (timestamp, host_name, host_ip, packet_loss, avg_latency, 
-                     min_latency, max_latency, jitter, is_available, 
-                     successful_pings, total_pings, traceroute)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    results['timestamp'],
-                    host['name'],
-                    host['ip'],
-                    results['packet_loss'],
-                    results['avg_latency'],
-                    results['min_latency'],
-                    results['max_latency'],
-                    results['jitter'],
-                    results['is_available'],
-                    results['successful_pings'],
-                    results['total_pings'],
-                    json.dumps(results['traceroute'])
-                ))
+                return self.cached('window', (hours_back, host_name),
+                                   lambda: self.query_window_stats(hours_back, host_name))
                 
-                conn.commit()
-                conn.close()
+            except Exception as e:
+                logging.error(f"Erro ao obter agregados: {e}")
+                return []
+    
+    def query_window_stats(self, hours_back, host_name):
+        """Consulta de get_window_stats (sem cache)"""
+        cutoff_time = (datetime.now() - timedelta(hours=hours_back)).timestamp()
+        
+        return [{
+            'host_name': row[0],
+            'host_ip': row[1],
+            'samples': row[2],
+            'available': row[3],
+            'latency_sum': row[4],
+            'latency_sumsq': row[5],
+            'latency_min': row[6],
+            'latency_max': row[7],
+            'loss_sum': row[8],
+            'jitter_sum': row[9]
+        } for row in self.conn.execute(*self.window_query(cutoff_time, host_name))]
+    
+    def uptime_query(self, cutoff_time, now, max_gap, host_name=None):
+        """Monta a consulta de tempo disponível por host em (cutoff_time, now]"""
+        host_filter = 'AND host_id IN (SELECT id FROM hosts WHERE name = :host_name)' if host_name is not None else ''
+        
+        query = f'''
+            SELECT h.name,
+                   MIN(timestamp),
+                   SUM(CASE WHEN is_available
+                            THEN MIN(COALESCE(next_timestamp, :now) - timestamp, :max_gap)
+                            ELSE 0 END),
+                   COUNT(*)
+            FROM (
+                SELECT host_id, timestamp, is_available,
+                       LEAD(timestamp) OVER (PARTITION BY host_id ORDER BY timestamp) AS next_timestamp
+                FROM {self.results_source(cutoff_time)}
+                WHERE timestamp > :cutoff {host_filter}
+            ) AS s
+            JOIN hosts h ON h.id = s.host_id
+            GROUP BY h.name
+        '''
+        return query, {'max_gap': max_gap, 'now': now, 'cutoff': cutoff_time, 'host_name': host_name}
+    
+    def get_uptime_stats(self, hours_back, max_gap, host_name=None):
+        """Obtém o tempo disponível por host, ponderado pelo intervalo entre amostras
+        
+        Cada amostra disponível vale o tempo até a amostra seguinte, limitado
+        a max_gap segundos; intervalos maiores contam como indisponibilidade.
+        """
+        with self.lock:
+            try:
+                return self.cached('uptime', (hours_back, max_gap, host_name),
+                                   lambda: self.query_uptime_stats(hours_back, max_gap, host_name))
                 
             except Exception as e:
-                logging.error(f"Erro ao salvar resultado: {e}")
+                logging.error(f"Erro ao calcular tempo disponível: {e}")
+                return []
+    
+    def query_uptime_stats(self, hours_back, max_gap, host_name):
+        """Consulta de get_uptime_stats (sem cache)"""
+        now = datetime.now().timestamp()
+        cutoff_time = now - hours_back * 3600
+        cursor = self.conn.execute(*self.uptime_query(cutoff_time, now, max_gap, host_name))
+        
+        return [{
+            'host_name': row[0],
+            'first_timestamp': row[1],
+            'uptime': row[2] or 0,
+            'observed': now - row[1],
+            'samples': row[3]
+        } for row in cursor]
     
     def get_hourly_stats(self, hours_back=1):
         """Obtém estatísticas da última(s) hora(s)"""
+        stats = []
+        for row in self.get_window_stats(hours_back):
+            samples = row['samples']
+            stats.append({
+                'host_name': row['host_name'],
+                'host_ip': row['host_ip'],
+                'packet_loss': row['loss_sum'] / samples or 0,
+                'avg_latency': row['latency_sum'] / samples or 0,
+                'min_latency': row['latency_min'] or 0,
+                'max_latency': row['latency_max'] or 0,
+                'jitter': row['jitter_sum'] / samples or 0,
+                'availability': row['available'] * 100.0 / samples or 0,
+                'total_tests': samples or 0
+            })
+        return stats
+    
+    def get_latency_percentiles(self, hours_back=1):
+        """Percentis de latência por host, somando os histogramas das horas do período
+        
+        Os histogramas são por hora cheia, então o período é arredondado
+        para baixo até o início da hora.
+        """
         with self.lock:
             try:
-                conn = sqlite3.connect(self.db_path)
-                cursor = conn.cursor()
-                
-                cutoff_time = (datetime.now() - timedelta(hours=hours_back)).timestamp()
-                
-                cursor.execute('''
-                    SELECT host_name, host_ip,
-                           AVG(packet_loss) as avg_packet_loss,
-                           AVG(avg_latency) as avg_latency,
-                           MIN(min_latency) as min_latency,
-                           MAX(max_latency) as max_latency,
-                           AVG(jitter) as avg_jitter,
-                           SUM(CASE WHEN is_available THEN 1 ELSE 0 END) * 100.0 / COUNT(*) as availability,
-                           COUNT(*) as total_tests
-                    FROM test_results 
-                    WHERE timestamp > ?
-                    GROUP BY host_name, host_ip
-                ''', (cutoff_time,))
-                
-                results = cursor.fetchall()
-                conn.close()
-                
-                return [{
-                    'host_name': row[0],
-                    'host_ip': row[1],
-                    'packet_loss': row[2] or 0,
-                    'avg_latency': row[3] or 0,
-                    'min_latency': row[4] or 0,
-                    'max_latency': row[5] or 0,
-                    'jitter': row[6] or 0,
-                    'availability': row[7] or 0,
-                    'total_tests': row[8] or 0
-                } for row in results]
+                return self.cached('percentiles', (hours_back,),
+                                   lambda: self.query_latency_percentiles(hours_back))
                 
             except Exception as e:
-                logging.error(f"Erro ao obter estatísticas: {e}")
-                return []
+                logging.error(f"Erro ao obter percentis de latência: {e}")
+                return {}
+    
+    def query_latency_percentiles(self, hours_back):
+        """Consulta de get_latency_percentiles (sem cache)"""
+        cutoff_time = (datetime.now() - timedelta(hours=hours_back)).timestamp()
+        cursor = self.conn.execute(*self.percentiles_query(cutoff_time))
+        
+        merged = {}
+        for name, counts in cursor:
+            counts = decode_histogram(counts)
+            merged[name] = merged[name] + counts if name in merged else counts
+        
+        return {name: histogram_percentiles(counts) for name, counts in merged.items()}
+    
+    def percentiles_query(self, cutoff_time):
+        """Monta a consulta dos histogramas das horas cheias a partir de cutoff_time"""
+        query = '''
+            SELECT h.name, l.counts
+            FROM latency_histograms l
+            JOIN hosts h ON h.id = l.host_id
+            WHERE l.bucket >= ?
+        '''
+        return query, (int(cutoff_time // 3600) * 3600,)
+    
+    def history_query(self, host_ids, cutoff_time):
+        """Monta a consulta de amostras dos host_ids a partir de cutoff_time"""
+        if len(host_ids) == 1:
+            # Igualdade no host_id deixa o índice entregar já ordenado por timestamp
+            host_filter = 'host_id = ?'
+        else:
+            host_filter = f"host_id IN ({', '.join('?' * len(host_ids))})"
+        
+        query = f'''
+            SELECT timestamp, avg_latency, packet_loss, is_available
+            FROM {self.results_source(cutoff_time)} 
+            WHERE {host_filter} AND timestamp > ?
+            ORDER BY timestamp
+        '''
+        return query, tuple(host_ids) + (cutoff_time,)
     
     def get_historical_data(self, host_name, hours_back=24):
         """Obtém dados históricos de um host"""
         with self.lock:
             try:
-                conn = sqlite3.connect(self.db_path)
-                cursor = conn.cursor()
-                
-                cutoff_time = (datetime.now() - timedelta(hours=hours_back)).timestamp()
-                
-                cursor.execute('''
-                    SELECT timestamp, avg_latency, packet_loss, is_available
-                    FROM test_results 
-                    WHERE host_name = ? AND timestamp > ?
-                    ORDER BY timestamp
-                ''', (host_name, cutoff_time))
-                
-                results = cursor.fetchall()
-                conn.close()
-                
-                return results
+                return self.cached('history', (host_name, hours_back),
+                                   lambda: self.query_historical_data(host_name, hours_back))
                 
             except Exception as e:
                 logging.error(f"Erro ao obter dados históricos: {e}")
                 return []
     
-    def cleanup_old_data(self, days_to_keep=30):
-        """Remove dados antigos"""
+    @staticmethod
+    def host_ids_query(host_name):
+        """Monta a consulta dos ids do host (um por IP e tipo de teste)"""
+        return 'SELECT id FROM hosts WHERE name = ?', (host_name,)
+    
+    def query_historical_data(self, host_name, hours_back):
+        """Consulta de get_historical_data (sem cache)"""
+        cursor = self.conn.cursor()
+        
+        cutoff_time = (datetime.now() - timedelta(hours=hours_back)).timestamp()
+        
+        host_ids = [row[0] for row in cursor.execute(*self.host_ids_query(host_name))]
+        if not host_ids:
+            return []
+        
+        cursor.execute(*self.history_query(host_ids, cutoff_time))
+        return cursor.fetchall()
+    
+    def series_query(self, cutoff_time, now, points):
+        """Monta a consulta da série temporal de todos os hosts em no máximo ~points buckets
+        
+        A largura do bucket é múltipla da maior agregação que cabe nela, então
+        janelas longas leem rollup_hour/rollup_day em vez dos dados brutos e o
+        custo não cresce com o tamanho da janela.
+        """
+        width = max((now - cutoff_time) / points, 1)
+        source, source_width = None, 1
+        for name, granularity in ROLLUP_GRANULARITIES:
+            if granularity <= width:
+                source, source_width = name, granularity
+        width = int(-(-width // source_width) * source_width)
+        start = int(cutoff_time // width) * width
+        
+        if source is None:
+            samples = f'''
+                SELECT host_id, CAST(timestamp / {width} AS INTEGER) * {width} AS slot,
+                       COUNT(*) AS samples,
+                       SUM(CASE WHEN is_available THEN 1 ELSE 0 END) AS available,
+                       SUM(avg_latency) AS latency_sum,
+                       MIN(min_latency) AS latency_min,
+                       MAX(max_latency) AS latency_max,
+                       SUM(packet_loss) AS loss_sum
+                FROM {self.results_source(start)}
+                WHERE timestamp >= ?
+                GROUP BY slot, host_id
+            '''
+        else:
+            samples = f'''
+                SELECT host_id, CAST(bucket / {width} AS INTEGER) * {width} AS slot,
+                       SUM(samples) AS samples, SUM(available) AS available,
+                       SUM(latency_sum) AS latency_sum,
+                       MIN(latency_min) AS latency_min, MAX(latency_max) AS latency_max,
+                       SUM(loss_sum) AS loss_sum
+                FROM rollup_{source}
+                WHERE bucket >= ?
+                GROUP BY slot, host_id
+            '''
+        
+        query = f'''
+            SELECT h.name, s.slot, s.latency_sum / s.samples, s.latency_min, s.latency_max,
+                   s.loss_sum / s.samples, s.available * 100.0 / s.samples
+            FROM ({samples}) AS s
+            JOIN hosts h ON h.id = s.host_id
+            ORDER BY h.name, s.slot
+        '''
+        return query, (start,)
+    
+    def get_series(self, hours_back=24, points=1000):
+        """Obtém a série temporal reduzida de todos os hosts em uma consulta
+        
+        Cada ponto resume um bucket: latência média com mínimo e máximo,
+        perda média e disponibilidade. Retorna {host: {coluna: [valores]}}.
+        """
         with self.lock:
             try:
-                conn = sqlite3.connect(self.db_path)
-                cursor = conn.cursor()
+                return self.cached('series', (hours_back, points),
+                                   lambda: self.query_series(hours_back, points))
                 
-                cutoff_time = (datetime.now() - timedelta(days=days_to_keep)).timestamp()
+            except Exception as e:
+                logging.error(f"Erro ao obter série temporal: {e}")
+                return {}
+    
+    def query_series(self, hours_back, points):
+        """Consulta de get_series (sem cache)"""
+        now = datetime.now().timestamp()
+        cursor = self.conn.execute(*self.series_query(now - hours_back * 3600, now, points))
+        
+        series = {}
+        for name, slot, avg_latency, min_latency, max_latency, loss, availability in cursor:
+            host = series.setdefault(name, {
+                'timestamps': [], 'avg_latency': [], 'min_latency': [],
+                'max_latency': [], 'packet_loss': [], 'availability': []
+            })
+            host['timestamps'].append(slot)
+            host['avg_latency'].append(avg_latency or 0)
+            host['min_latency'].append(min_latency or 0)
+            host['max_latency'].append(max_latency or 0)
+            host['packet_loss'].append(loss or 0)
+            host['availability'].append(availability or 0)
+        return series
+    
+    @staticmethod
+    def alert_states_query():
+        """Monta a consulta do estado de alerta salvo de todos os hosts"""
+        query = '''
+            SELECT h.name, h.probe_type, a.state, a.since, a.pending_state,
+                   a.pending_count, a.flapping, a.transitions
+            FROM alert_state a
+            JOIN hosts h ON h.id = a.host_id
+        '''
+        return query, ()
+    
+    def load_alert_states(self):
+        """Carrega o estado de alerta salvo de cada host: {(nome, tipo de teste): estado}"""
+        with self.lock:
+            try:
+                rows = self.conn.execute(*self.alert_states_query())
+                return {
+                    (row[0], row[1]): {
+                        'state': row[2],
+                        'since': row[3],
+                        'pending_state': row[4],
+                        'pending_count': row[5],
+                        'flapping': bool(row[6]),
+                        'transitions': json.loads(row[7] or '[]')
+                    } for row in rows
+                }
                 
-                cursor.execute('DELETE FROM test_results WHERE timestamp < ?', (cutoff_time,))
+            except Exception as e:
+                logging.error(f"Erro ao carregar estado dos alertas: {e}")
+                return {}
+    
+    def save_alert_state(self, host, state):
+        """Grava o estado de alerta do host"""
+        with self.lock:
+            try:
+                with self.conn:
+                    self.conn.execute('''
+                        INSERT OR REPLACE INTO alert_state
+                        (host_id, state, since, pending_state, pending_count, flapping, transitions)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ''', (
+                        self.get_host_id(host['name'], host['ip'], probe_type(host)),
+                        state['state'],
+                        state['since'],
+                        state['pending_state'],
+                        state['pending_count'],
+                        state['flapping'],
+                        json.dumps(state['transitions'])
+                    ))
                 
-                deleted_rows = cursor.rowcount
-                conn.commit()
-                conn.close()
+            except Exception as e:
+                logging.error(f"Erro ao salvar estado do alerta: {e}")
+                self.host_ids.clear()
+    
+    @staticmethod
+    def host_paths_query():
+        """Monta a consulta da rota atual de todos os hosts"""
+        query = '''
+            SELECT h.name, h.probe_type, p.hops, hp.since
+            FROM host_paths hp
+            JOIN hosts h ON h.id = hp.host_id
+            JOIN traceroute_paths p ON p.id = hp.path_id
+        '''
+        return query, ()
+    
+    def load_host_paths(self):
+        """Carrega a rota atual de cada host: {(nome, tipo de teste): (saltos, desde)}"""
+        with self.lock:
+            try:
+                rows = self.conn.execute(*self.host_paths_query())
+                return {(row[0], row[1]): (json.loads(row[2]), row[3]) for row in rows}
                 
-                logging.info(f"Removidos {deleted_rows} registros antigos")
+            except Exception as e:
+                logging.error(f"Erro ao carregar rotas dos hosts: {e}")
+                return {}
+    
+    def save_host_path(self, host, ips, since):
+        """Grava a rota atual do host"""
+        with self.lock:
+            try:
+                with self.conn:
+                    self.conn.execute(
+                        'INSERT OR REPLACE INTO host_paths (host_id, path_id, since) VALUES (?, ?, ?)',
+                        (self.get_host_id(host['name'], host['ip'], probe_type(host)), self.get_path_id(ips), since)
+                    )
+                
+            except Exception as e:
+                logging.error(f"Erro ao salvar rota do host: {e}")
+                self.host_ids.clear()
+                self.path_ids.clear()
+    
+    def database_size(self):
+        """Tamanho do arquivo do banco, em bytes"""
+        page_count = self.conn.execute('PRAGMA page_count').fetchone()[0]
+        page_size = self.conn.execute('PRAGMA page_size').fetchone()[0]
+        return page_count * page_size
+    
+    def iter_retention(self, days_to_keep=30, rollup_days_to_keep=400, chunk_size=5000, vacuum_pages=2000,
+                       archiver=None):
+        """Aplica a retenção em passos curtos, liberando o lock entre eles
+        
+        Partições diárias expiradas são removidas inteiras com DROP TABLE;
+        linhas antigas de test_results e das agregações saem em lotes de
+        chunk_size. Com archiver, cada partição é exportada antes do DROP
+        e só é removida se o arquivo tiver todas as linhas. Cada passo
+        devolve o relatório parcial.
+        """
+        cutoff_time = (datetime.now() - timedelta(days=days_to_keep)).timestamp()
+        rollup_cutoff = (datetime.now() - timedelta(days=rollup_days_to_keep)).timestamp()
+        
+        with self.lock:
+            size_before = self.database_size()
+            partitions = list_partitions(self.conn)
+        
+        report = {
+            'partitions_dropped': 0,
+            'rows_deleted': 0,
+            'bytes_reclaimed': 0
+        }
+        if archiver is not None:
+            report['partitions_archived'] = 0
+            report['rows_archived'] = 0
+        
+        for name in partitions:
+            if partition_start(name) + PARTITION_SECONDS > cutoff_time:
+                break
+            archived_rows = None
+            if archiver is not None:
+                try:
+                    for step in archiver.iter_archive(self, name):
+                        if isinstance(step, tuple):
+                            archived_rows = step[1]
+                        yield report
+                except Exception as e:
+                    logging.error(f"Erro ao arquivar a partição {name}: {e}")
+                    continue
+            with self.lock:
+                rows = self.conn.execute(f'SELECT COUNT(*) FROM {name}').fetchone()[0]
+                if archived_rows is not None and archived_rows != rows:
+                    # Chegaram linhas durante a exportação: tenta de novo na próxima retenção
+                    logging.error(f"Partição {name} mantida: {rows} linhas, {archived_rows} arquivadas")
+                    continue
+                with self.conn:
+                    self.conn.execute(f'DROP TABLE {name}')
+                self.partitions.discard(name)
+                self.write_generation += 1
+            report['partitions_dropped'] += 1
+            report['rows_deleted'] += rows
+            if archived_rows is not None:
+                report['partitions_archived'] += 1
+                report['rows_archived'] += rows
+            yield report
+        
+        # Dados anteriores ao particionamento e agregações: remoção em lotes.
+        # As agregações por minuto têm o mesmo volume dos dados brutos;
+        # as por hora e por dia ficam mais tempo para relatórios longos
+        targets = [
+            ('test_results', 'timestamp', cutoff_time),
+            ('rollup_minute', 'bucket', cutoff_time),
+            ('rollup_hour', 'bucket', rollup_cutoff),
+            ('rollup_day', 'bucket', rollup_cutoff),
+            ('latency_histograms', 'bucket', rollup_cutoff),
+        ]
+        for table, column, cutoff in targets:
+            while True:
+                with self.lock:
+                    with self.conn:
+                        cursor = self.conn.execute(f'''
+                            DELETE FROM {table} WHERE rowid IN (
+                                SELECT rowid FROM {table} WHERE {column} < ? LIMIT ?
+                            )
+                        ''', (cutoff, chunk_size))
+                    if cursor.rowcount:
+                        self.write_generation += 1
+                if table == 'test_results':
+                    report['rows_deleted'] += cursor.rowcount
+                yield report
+                if cursor.rowcount < chunk_size:
+                    break
+        
+        # Devolve as páginas livres ao sistema de arquivos aos poucos
+        while True:
+            with self.lock:
+                free_pages = self.conn.execute('PRAGMA freelist_count').fetchone()[0]
+                if free_pages:
+                    # executescript executa o pragma até o fim (execute libera uma página só)
+                    self.conn.executescript(f'PRAGMA incremental_vacuum({vacuum_pages})')
+                report['bytes_reclaimed'] = max(0, size_before - self.database_size())
+            yield report
+            if free_pages <= vacuum_pages:
+                break
+    
+    def get_rollup_start(self):
+        """Início do dia mais antigo nas agregações diárias (None se não houver)
+        
+        A partir dele as consultas por janela são completas; antes, só o
+        arquivo das partições tem os dados.
+        """
+        with self.lock:
+            try:
+                return self.conn.execute('SELECT MIN(bucket) FROM rollup_day').fetchone()[0]
                 
             except Exception as e:
-                logging.error(f"Erro na limpeza de dados: {e}")
+                logging.error(f"Erro ao obter início das agregações: {e}")
+                return None
+    
+    def cleanup_old_data(self, days_to_keep=30):
+        """Remove dados antigos"""
+        try:
+            report = None
+            for report in self.iter_retention(days_to_keep):
+                pass
+            
+            logging.info(f"Removidos {report['rows_deleted']} registros antigos "
+                         f"({report['partitions_dropped']} partições, "
+                         f"{report['bytes_reclaimed'] / 1048576:.1f} MB liberados)")
+            return report
+            
+        except Exception as e:
+            logging.error(f"Erro na limpeza de dados: {e}")
+            return None
+    
+    def check_query_plans(self):
+        """Verifica no EXPLAIN QUERY PLAN se as consultas usam os índices esperados
+        
+        Retorna {consulta: problemas encontrados}; vazio se tudo ok.
+        """
+        with self.lock:
+            now = time.time()
+            day_ago = now - 86400
+            # consulta -> (sql e parâmetros, trechos obrigatórios no plano, trechos proibidos)
+            expectations = {
+                'window': (self.window_query(day_ago),
+                           ['SEARCH test_results USING INDEX idx_results_time', 'SEARCH rollup_minute',
+                            'SEARCH rollup_hour', 'SEARCH rollup_day'], []),
+                'window_host': (self.window_query(day_ago, 'host'),
+                                ['SEARCH test_results USING', 'SEARCH hosts USING COVERING INDEX'], []),
+                'uptime': (self.uptime_query(day_ago, now, 600),
+                           ['COVERING INDEX idx_results_host_time'], ['TEMP B-TREE FOR ORDER BY']),
+                'uptime_host': (self.uptime_query(day_ago, now, 600, 'host'),
+                                ['SEARCH test_results USING COVERING INDEX idx_results_host_time'],
+                                ['TEMP B-TREE FOR ORDER BY']),
+                'history': (self.history_query([1], day_ago),
+                            ['SEARCH test_results USING COVERING INDEX idx_results_host_time'],
+                            ['TEMP B-TREE']),
+                'series': (self.series_query(day_ago, now, 1000),
+                           ['SEARCH rollup_minute USING INDEX idx_rollup_minute_bucket',
+                            'USING INTEGER PRIMARY KEY'], []),
+                'cleanup': (('SELECT rowid FROM test_results WHERE timestamp < ? LIMIT 5000', (day_ago,)),
+                            ['idx_results_time'], []),
+                'percentiles': (self.percentiles_query(day_ago),
+                                ['SEARCH l USING INDEX idx_latency_histograms_bucket',
+                                 'SEARCH h USING INTEGER PRIMARY KEY'], ['SCAN l']),
+                'host_ids': (self.host_ids_query('host'), ['SEARCH hosts USING COVERING INDEX'], []),
+                'alert_states': (self.alert_states_query(), ['SEARCH h USING INTEGER PRIMARY KEY'], []),
+                'host_paths': (self.host_paths_query(),
+                               ['SEARCH h USING INTEGER PRIMARY KEY', 'SEARCH p USING INTEGER PRIMARY KEY'], []),
+            }
+            return plan_problems(self.conn, expectations)
@@ -1,35 +1,258 @@
 import os
 import aiohttp
+import asyncio
 import json
 import logging
+import random
+import time
 from datetime import datetime
 
+from metrics import DISCORD_SEND_DURATION
+from traceroute import describe_path
+
+# Limites do Discord por mensagem de webhook
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+
 class DiscordNotifier:
-    def __init__(self):
+    def __init__(self, max_queue=1000, max_retries=5, coalesce_delay=0.5, close_timeout=10):
         self.webhook_url = os.getenv('DISCORD_WEBHOOK_URL')
         if not self.webhook_url:
             logging.warning("Discord webhook URL não configurada")
+        
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        # Tempo de espera por mais alertas para juntar na mesma mensagem
+        self.coalesce_delay = coalesce_delay
+        # Tempo máximo que o encerramento espera a fila esvaziar
+        self.close_timeout = close_timeout
+        
+        # Sessão, fila e tarefa de envio pertencem ao event loop em uso
+        self.loop = None
+        self.session = None
+        self.queue = None
+        self.sender_task = None
+        # Item retirado da fila que não coube na mensagem anterior
+        self.carry = None
+        self.rate_limited_until = 0
+        
+        self.stats = {
+            'messages_sent': 0,
+            'embeds_sent': 0,
+            'files_sent': 0,
+            'dropped': 0,
+            'retries': 0,
+            'rate_limited': 0,
+            'last_latency': 0,
+            'max_latency': 0,
+            'total_latency': 0
+        }
+    
+    def get_stats(self):
+        """Retorna métricas de entrega (latências em segundos)"""
+        delivered = self.stats['embeds_sent'] + self.stats['files_sent']
+        return dict(
+            self.stats,
+            avg_latency=self.stats['total_latency'] / delivered if delivered else 0,
+            queue_depth=self.queue.qsize() if self.queue else 0
+        )
+    
+    def ensure_sender(self):
+        """Inicia a fila e a tarefa de envio no event loop atual"""
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop or self.sender_task is None or self.sender_task.done():
+            self.loop = loop
+            self.queue = asyncio.Queue()
+            self.carry = None
+            self.session = None
+            self.sender_task = loop.create_task(self.sender())
+    
+    def enqueue(self, kind, payload):
+        """Adiciona à fila, descartando o item mais antigo se estiver cheia"""
+        self.ensure_sender()
+        
+        if self.queue.qsize() >= self.max_queue:
+            self.queue.get_nowait()
+            self.queue.task_done()
+            self.stats['dropped'] += 1
+            logging.warning("Fila do Discord cheia, mensagem mais antiga descartada")
+        
+        self.queue.put_nowait((kind, payload, time.monotonic()))
     
     async def send_message(self, embed_data):
-        """Envia mensagem para Discord"""
+        """Enfileira mensagem para Discord"""
         if not self.webhook_url:
             logging.info("Discord não configurado, mensagem não enviada")
             return
+        
+        self.enqueue('embed', embed_data)
+    
+    async def next_item(self, timeout=None):
+        """Próximo item da fila (ou o que sobrou do lote anterior)"""
+        if self.carry is not None:
+            item, self.carry = self.carry, None
+            return item
+        if timeout is None:
+            return await self.queue.get()
+        return await asyncio.wait_for(self.queue.get(), timeout)
+    
+    async def sender(self):
+        """Consome a fila, juntando alertas em mensagens de até 10 embeds"""
+        while True:
+            item = await self.next_item()
+            
+            if item[0] == 'file':
+                await self.deliver([item])
+                continue
             
+            batch = [item]
+            size = len(json.dumps(item[1]))
+            deadline = time.monotonic() + self.coalesce_delay
+            while len(batch) < MAX_EMBEDS_PER_MESSAGE:
+                try:
+                    following = await self.next_item(max(0, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    break
+                following_size = len(json.dumps(following[1])) if following[0] == 'embed' else 0
+                if following[0] != 'embed' or size + following_size > MAX_EMBED_CHARS_PER_MESSAGE:
+                    # Fica para a próxima mensagem; ainda conta como pendente na fila
+                    self.carry = following
+                    break
+                batch.append(following)
+                size += following_size
+            
+            await self.deliver(batch)
+    
+    async def deliver(self, batch):
+        """Envia um lote e marca seus itens como concluídos na fila"""
         try:
-            async with aiohttp.ClientSession() as session:
-                payload = {
-                    "embeds": [embed_data]
-                }
+            if batch[0][0] == 'file':
+                with open(batch[0][1], 'rb') as f:
+                    content = f.read()
+                filename = os.path.basename(batch[0][1])
                 
-                async with session.post(self.webhook_url, json=payload) as response:
-                    if response.status == 204:
-                        logging.info("Mensagem enviada para Discord com sucesso")
-                    else:
-                        logging.error(f"Erro ao enviar para Discord: {response.status}")
-                        
+                def build_request():
+                    form = aiohttp.FormData()
+                    form.add_field('file', content, filename=filename)
+                    return {'data': form}
+            else:
+                payload = {"embeds": [item[1] for item in batch]}
+                
+                def build_request():
+                    return {'json': payload}
+            
+            with DISCORD_SEND_DURATION.time(kind=batch[0][0]):
+                delivered = await self.post(build_request)
+            
         except Exception as e:
             logging.error(f"Erro ao enviar mensagem Discord: {e}")
+            delivered = False
+        
+        now = time.monotonic()
+        for kind, _, enqueued in batch:
+            if delivered:
+                latency = now - enqueued
+                self.stats['embeds_sent' if kind == 'embed' else 'files_sent'] += 1
+                self.stats['last_latency'] = latency
+                self.stats['max_latency'] = max(self.stats['max_latency'], latency)
+                self.stats['total_latency'] += latency
+            else:
+                self.stats['dropped'] += 1
+            self.queue.task_done()
+        
+        if delivered:
+            self.stats['messages_sent'] += 1
+            logging.info(f"Mensagem enviada para Discord com sucesso ({len(batch)} itens)")
+        else:
+            logging.error(f"Mensagem Discord descartada após {self.max_retries} tentativas")
+    
+    async def get_session(self):
+        """Sessão HTTP reutilizada entre mensagens (mantém a conexão TLS aberta)"""
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30))
+        return self.session
+    
+    def update_rate_limit(self, headers):
+        """Respeita os cabeçalhos de rate limit do Discord"""
+        if headers.get('X-RateLimit-Remaining') == '0':
+            reset_after = float(headers.get('X-RateLimit-Reset-After', 1))
+            self.rate_limited_until = max(self.rate_limited_until, time.monotonic() + reset_after)
+    
+    async def post(self, build_request):
+        """POST no webhook com retentativas; retorna True se entregue"""
+        for attempt in range(self.max_retries + 1):
+            wait = self.rate_limited_until - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            
+            try:
+                session = await self.get_session()
+                async with session.post(self.webhook_url, **build_request()) as response:
+                    self.update_rate_limit(response.headers)
+                    
+                    if response.status in (200, 204):
+                        return True
+                    
+                    if response.status == 429:
+                        self.stats['rate_limited'] += 1
+                        retry_after = response.headers.get('Retry-After')
+                        if retry_after is None:
+                            body = await response.json(content_type=None)
+                            retry_after = body.get('retry_after', 1)
+                        self.rate_limited_until = time.monotonic() + float(retry_after)
+                        logging.warning(f"Discord rate limit, aguardando {float(retry_after):.1f}s")
+                        self.stats['retries'] += 1
+                        continue
+                    
+                    if response.status < 500:
+                        # Erros 4xx não melhoram com nova tentativa
+                        logging.error(f"Erro ao enviar para Discord: {response.status}")
+                        return False
+                    
+                    logging.warning(f"Discord respondeu {response.status}, tentando novamente")
+                    
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.warning(f"Falha de conexão com Discord: {e}")
+            
+            if attempt < self.max_retries:
+                self.stats['retries'] += 1
+                await asyncio.sleep(min(60, 2 ** attempt) * random.uniform(0.5, 1.5))
+        
+        return False
+    
+    async def flush(self, timeout=None):
+        """Aguarda o envio de tudo que está na fila; False se timeout segundos passarem antes"""
+        if self.queue is None or self.loop is not asyncio.get_running_loop():
+            return True
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+    
+    async def close(self):
+        """Envia o que falta (até close_timeout segundos) e fecha a sessão HTTP
+        
+        Com o Discord fora do ar ou limitando as requisições, o que ainda
+        estiver na fila é descartado para não travar o encerramento.
+        """
+        try:
+            if not await self.flush(self.close_timeout):
+                pending = self.queue.qsize() + (1 if self.carry is not None else 0)
+                self.stats['dropped'] += pending
+                logging.warning(f"Discord não respondeu em {self.close_timeout}s; "
+                                f"{pending} mensagens na fila descartadas no encerramento")
+        finally:
+            if self.sender_task is not None:
+                self.sender_task.cancel()
+                try:
+                    await self.sender_task
+                except asyncio.CancelledError:
+                    pass
+                self.sender_task = None
+            if self.session is not None:
+                await self.session.close()
+                self.session = None
     
     async def send_alert(self, host, results):
         """Envia alerta de problema"""
@@ -67,6 +290,78 @@ class DiscordNotifier:
         
         await self.send_message(embed)
     
+    async def send_recovery(self, host, results, duration):
+        """Envia aviso de recuperação do host"""
+        minutes = duration / 60
+        embed = {
+            "title": "✅ HOST RECUPERADO",
+            "description": f"O host **{host['name']}** voltou ao normal",
+            "color": 0x00ff00,  # Verde
+            "fields": [
+                {
+                    "name": "Host",
+                    "value": f"{host['name']} ({host['ip']})",
+                    "inline": True
+                },
+                {
+                    "name": "Duração do Problema",
+                    "value": f"{minutes:.0f} min",
+                    "inline": True
+                },
+                {
+                    "name": "Latência Média",
+                    "value": f"{results['avg_latency']:.1f}ms",
+                    "inline": True
+                }
+            ],
+            "timestamp": datetime.utcnow().isoformat(),
+            "footer": {
+                "text": "Network Monitor"
+            }
+        }
+        
+        await self.send_message(embed)
+    
+    async def send_flapping(self, host, transitions, window_minutes):
+        """Avisa que o host está oscilando e os alertas foram suspensos"""
+        embed = {
+            "title": "🔁 HOST OSCILANDO",
+            "description": f"O host **{host['name']}** mudou de estado {transitions} vezes em {window_minutes} min. Alertas suspensos até estabilizar.",
+            "color": 0xffa500,  # Laranja
+            "timestamp": datetime.utcnow().isoformat(),
+            "footer": {
+                "text": "Network Monitor"
+            }
+        }
+        
+        await self.send_message(embed)
+    
+    async def send_path_change(self, host, old_path, new_path, duration):
+        """Avisa que a rota até o host mudou"""
+        embed = {
+            "title": "🔀 ROTA ALTERADA",
+            "description": f"A rota até **{host['name']}** ({host['ip']}) mudou após {duration / 60:.0f} min na anterior",
+            "color": 0x3498db,  # Azul
+            "fields": [
+                {
+                    "name": "Rota anterior",
+                    "value": describe_path(old_path),
+                    "inline": False
+                },
+                {
+                    "name": "Nova rota",
+                    "value": describe_path(new_path),
+                    "inline": False
+                }
+            ],
+            "timestamp": datetime.utcnow().isoformat(),
+            "footer": {
+                "text": "Network Monitor"
+            }
+        }
+        
+        await self.send_message(embed)
+    
     async def send_hourly_report(self, stats_data, chart_path=None):
         """Envia relatório consolidado"""
         embed = {
@@ -84,9 +379,17 @@ class DiscordNotifier:
         for host_stats in stats_data:
             status_emoji = "🟢" if host_stats['availability'] >= 99 else "🟡" if host_stats['availability'] >= 95 else "🔴"
             
+            value = f"**Disponibilidade:** {host_stats['availability']:.2f}%\n**Latência Média:** {host_stats['avg_latency']:.1f}ms\n**Perda de Pacotes:** {host_stats['packet_loss']:.1f}%"
+            if 'p95_latency' in host_stats:
+                value += f"\n**Latência p95/p99:** {host_stats['p95_latency']:.1f}/{host_stats['p99_latency']:.1f}ms"
+            if 'sla' in host_stats:
+                sla_emoji = "✅" if host_stats['sla_met'] else "❌"
+                target = f" (meta {host_stats['sla_target']}%)" if host_stats['sla_target'] is not None else ""
+                value += f"\n**SLA:** {host_stats['sla']:.3f}%{target} {sla_emoji}"
+            
             embed["fields"].append({
                 "name": f"{status_emoji} {host_stats['host_name']}",
-                "value": f"**Disponibilidade:** {host_stats['availability']:.2f}%\n**Latência Média:** {host_stats['avg_latency']:.1f}ms\n**Perda de Pacotes:** {host_stats['packet_loss']:.1f}%",
+                "value": value,
                 "inline": True
             })
         
@@ -118,21 +421,8 @@ class DiscordNotifier:
         await self.send_message(embed)
     
     async def send_chart(self, chart_path):
-        """Envia gráfico como arquivo"""
+        """Enfileira gráfico para envio como arquivo"""
         if not self.webhook_url:
             return
-            
-        try:
-            async with aiohttp.ClientSession() as session:
-                with open(chart_path, 'rb') as f:
-                    form = aiohttp.FormData()
-                    form.add_field('file', f, filename='network_stats.png')
-                    
-                    async with session.post(self.webhook_url, data=form) as response:
-                        if response.status == 200:
-                            logging.info("Gráfico enviado para Discord")
-                        else:
-                            logging.error(f"Erro ao enviar gráfico: {response.status}")
-                            
-        except Exception as e:
-            logging.error(f"Erro ao enviar gráfico: {e}")
+        
+        self.enqueue('file', chart_path)
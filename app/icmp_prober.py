@@ -0,0 +1,290 @@
+import asyncio
+import itertools
+import logging
+import os
+import socket
+import struct
+import time
+
+from probes import resolve
+
+ICMP_ECHO_REPLY = 0
+ICMP_DEST_UNREACHABLE = 3
+ICMP_ECHO_REQUEST = 8
+ICMP_TIME_EXCEEDED = 11
+
+# Constantes do Linux nem sempre expostas pelo módulo socket
+IP_RECVERR = getattr(socket, 'IP_RECVERR', 11)
+IP_RECVTTL = getattr(socket, 'IP_RECVTTL', 12)
+MSG_ERRQUEUE = getattr(socket, 'MSG_ERRQUEUE', 0x2000)
+SO_EE_ORIGIN_ICMP = 2
+# struct sock_extended_err seguida do endereço de quem gerou o erro
+EXTENDED_ERR = struct.Struct('=IBBBBII')
+
+def icmp_checksum(data):
+    """Calcula o checksum de 16 bits usado pelo ICMP"""
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+def build_echo_request(identifier, sequence, payload):
+    """Monta um pacote ICMP echo request"""
+    header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, identifier, sequence)
+    checksum = icmp_checksum(header + payload)
+    header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, checksum, identifier, sequence)
+    return header + payload
+
+class AsyncICMPProber:
+    """Envia echos ICMP por um único socket compartilhado, sem bloquear o event loop
+
+    Também envia echos com TTL limitado para o traceroute: o roteador onde o
+    TTL expira responde Time Exceeded, que resolve o mesmo future do echo.
+    """
+
+    def __init__(self, loop=None):
+        self.loop = loop or asyncio.get_running_loop()
+        self.sock, self.raw = self.open_socket()
+        self.identifier = os.getpid() & 0xffff
+        self.sequence = itertools.count(1)
+        # (ip, sequência) -> future resolvido com (instante, respondente, tipo ICMP)
+        self.pending = {}
+        # ip -> TTL da última resposta recebida dele
+        self.reply_ttls = {}
+        self.loop.add_reader(self.sock.fileno(), self.on_readable)
+
+    @staticmethod
+    def open_socket():
+        """Abre socket ICMP datagram (sem root) ou, se não permitido, raw"""
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+            raw = False
+            # Erros ICMP (Time Exceeded) chegam pela fila de erros do socket
+            sock.setsockopt(socket.IPPROTO_IP, IP_RECVERR, 1)
+            sock.setsockopt(socket.IPPROTO_IP, IP_RECVTTL, 1)
+        except PermissionError:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+            raw = True
+        sock.setblocking(False)
+        return sock, raw
+
+    def on_readable(self):
+        """Lê todas as respostas disponíveis e resolve os futures correspondentes"""
+        while True:
+            try:
+                packet, ancillary, _, address = self.sock.recvmsg(65535, 64)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                # Com IP_RECVERR um erro ICMP pendente interrompe a leitura normal
+                logging.debug(f"Erro ao ler socket ICMP: {e}")
+                if self.raw:
+                    return
+                continue
+
+            received = time.perf_counter()
+
+            if self.raw:
+                self.handle_raw(packet, address[0], received)
+            else:
+                reply_ttl = None
+                for level, kind, data in ancillary:
+                    if level == socket.IPPROTO_IP and kind == socket.IP_TTL:
+                        reply_ttl = int.from_bytes(data[:4], 'little')
+                self.handle_reply(packet, address[0], reply_ttl, received)
+
+        if not self.raw:
+            self.read_error_queue()
+
+    def handle_reply(self, packet, source, reply_ttl, received):
+        """Echo reply: resolve o echo de (origem, sequência)"""
+        if len(packet) < 8:
+            return
+
+        icmp_type, _, _, identifier, sequence = struct.unpack('!BBHHH', packet[:8])
+        if icmp_type != ICMP_ECHO_REPLY:
+            return
+        # Em sockets datagram o kernel reescreve o identificador
+        if self.raw and identifier != self.identifier:
+            return
+
+        if reply_ttl is not None:
+            self.reply_ttls[source] = reply_ttl
+        self.resolve_probe((source, sequence), (received, source, ICMP_ECHO_REPLY))
+
+    def handle_raw(self, packet, source, received):
+        """Pacote de socket raw: cabeçalho IP seguido do ICMP"""
+        header_length = (packet[0] & 0x0f) * 4
+        reply_ttl = packet[8]
+        icmp = packet[header_length:]
+        if len(icmp) < 8:
+            return
+
+        if icmp[0] in (ICMP_TIME_EXCEEDED, ICMP_DEST_UNREACHABLE):
+            # O erro carrega o cabeçalho IP e os 8 primeiros bytes do echo original
+            original = icmp[8:]
+            if len(original) < 20:
+                return
+            original_length = (original[0] & 0x0f) * 4
+            echo = original[original_length:original_length + 8]
+            if len(echo) < 8:
+                return
+            echo_type, _, _, identifier, sequence = struct.unpack('!BBHHH', echo)
+            if echo_type != ICMP_ECHO_REQUEST or identifier != self.identifier:
+                return
+            destination = socket.inet_ntoa(original[16:20])
+            self.resolve_probe((destination, sequence), (received, source, icmp[0]))
+            return
+
+        self.handle_reply(icmp, source, reply_ttl, received)
+
+    def read_error_queue(self):
+        """Socket datagram: lê da fila de erros os Time Exceeded/Unreachable recebidos"""
+        while True:
+            try:
+                packet, ancillary, _, address = self.sock.recvmsg(512, 512, MSG_ERRQUEUE)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                logging.debug(f"Erro ao ler fila de erros ICMP: {e}")
+                return
+
+            received = time.perf_counter()
+            if len(packet) < 8:
+                continue
+            sequence = struct.unpack('!H', packet[6:8])[0]
+
+            for level, kind, data in ancillary:
+                if level != socket.IPPROTO_IP or kind != IP_RECVERR or len(data) < EXTENDED_ERR.size + 8:
+                    continue
+                _, origin, icmp_type, _, _, _, _ = EXTENDED_ERR.unpack_from(data)
+                if origin != SO_EE_ORIGIN_ICMP:
+                    continue
+                # sockaddr_in do roteador logo após a estrutura
+                offender = socket.inet_ntoa(data[EXTENDED_ERR.size + 4:EXTENDED_ERR.size + 8])
+                self.resolve_probe((address[0], sequence), (received, offender, icmp_type))
+
+    def resolve_probe(self, key, result):
+        future = self.pending.get(key)
+        if future and not future.done():
+            future.set_result(result)
+
+    def next_sequence(self, host_ip):
+        """Próximo número de sequência livre para o host"""
+        while True:
+            sequence = next(self.sequence) & 0xffff
+            if sequence and (host_ip, sequence) not in self.pending:
+                return sequence
+
+    async def resolve(self, host):
+        """Resolve nomes DNS para um endereço IPv4"""
+        return await resolve(self.loop, host)
+
+    async def echo(self, host_ip, timeout):
+        """Envia um echo e retorna o RTT em ms, ou None em timeout ou erro ICMP (host inalcançável)"""
+        sequence = self.next_sequence(host_ip)
+        key = (host_ip, sequence)
+        future = self.loop.create_future()
+        self.pending[key] = future
+
+        packet = build_echo_request(self.identifier, sequence, struct.pack('!d', time.time()))
+
+        try:
+            sent = time.perf_counter()
+            try:
+                await self.loop.sock_sendto(self.sock, packet, (host_ip, 0))
+            except (BlockingIOError, InterruptedError):
+                raise
+            except OSError:
+                # Erro ICMP anterior pendente no socket (IP_RECVERR): o envio não ocorreu
+                await self.loop.sock_sendto(self.sock, packet, (host_ip, 0))
+            received, _, icmp_type = await asyncio.wait_for(future, timeout)
+            # Destination Unreachable / Time Exceeded para este echo: o host não respondeu
+            if icmp_type != ICMP_ECHO_REPLY:
+                return None
+            return (received - sent) * 1000
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self.pending.pop(key, None)
+
+    def send_now(self, packet, host_ip):
+        """Envia sem esperar; repete uma vez se o socket devolver um erro ICMP pendente"""
+        try:
+            self.sock.sendto(packet, (host_ip, 0))
+        except (BlockingIOError, InterruptedError):
+            raise
+        except OSError:
+            self.sock.sendto(packet, (host_ip, 0))
+
+    async def probe_ttl(self, host_ip, ttl, timeout):
+        """Echo com TTL limitado: retorna (ip que respondeu, RTT em ms, chegou ao destino)
+
+        Retorna None se ninguém respondeu dentro do timeout.
+        """
+        sequence = self.next_sequence(host_ip)
+        key = (host_ip, sequence)
+        future = self.loop.create_future()
+        self.pending[key] = future
+
+        packet = build_echo_request(self.identifier, sequence, struct.pack('!d', time.time()))
+
+        try:
+            # TTL alterado, envio e restauração sem ceder o event loop, para
+            # não vazar para echos de outras tarefas
+            sent = time.perf_counter()
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_TTL, ttl)
+            try:
+                self.send_now(packet, host_ip)
+            except (BlockingIOError, InterruptedError):
+                return None
+            finally:
+                self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_TTL, 64)
+
+            received, responder, icmp_type = await asyncio.wait_for(future, timeout)
+            reached = icmp_type == ICMP_ECHO_REPLY or responder == host_ip
+            return responder, (received - sent) * 1000, reached
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self.pending.pop(key, None)
+
+    async def trace(self, host_ip, max_hops=30, timeout=2, attempts=2):
+        """Traceroute com todos os saltos sondados em paralelo
+
+        Retorna os saltos {'ttl', 'ip', 'rtt'} até o destino, no mesmo formato
+        de traceroute.parse_traceroute; saltos sem resposta no fim são omitidos.
+        """
+        answers = {}
+        destination_ttl = max_hops
+        for _ in range(attempts):
+            missing = [ttl for ttl in range(1, destination_ttl + 1) if ttl not in answers]
+            if not missing:
+                break
+            replies = await asyncio.gather(*(self.probe_ttl(host_ip, ttl, timeout) for ttl in missing))
+            for ttl, reply in zip(missing, replies):
+                if reply is None:
+                    continue
+                answers[ttl] = reply
+                if reply[2]:
+                    destination_ttl = min(destination_ttl, ttl)
+
+        hops = []
+        for ttl in range(1, destination_ttl + 1):
+            reply = answers.get(ttl)
+            hops.append({'ttl': ttl, 'ip': reply[0] if reply else None, 'rtt': reply[1] if reply else None})
+        while hops and hops[-1]['ip'] is None:
+            hops.pop()
+        return hops
+
+    def close(self):
+        """Libera o socket e cancela echos pendentes"""
+        if not self.loop.is_closed():
+            self.loop.remove_reader(self.sock.fileno())
+        for future in self.pending.values():
+            if not future.done():
+                future.cancel()
+        self.pending.clear()
+        self.sock.close()
@@ -1,111 +1,363 @@
 #!/usr/bin/env python3
+import argparse
 import asyncio
-import json
 import logging
-import schedule
-import time
-from datetime import datetime, timedelta
-import threading
+import os
+import signal
+import subprocess
+import sys
 
 from network_tests import NetworkTester
 from discord_notifier import DiscordNotifier
 from database import DatabaseManager
 from stats_generator import StatsGenerator
+from probe_scheduler import ProbeScheduler
+from retention import RetentionManager
+from alert_manager import AlertManager
+from pipeline import ResultPipeline
+from metrics import REGISTRY, MetricsServer, PROBE_DURATION, observe_result, stats_collector, forget_host
+from query_api import QueryAPI
+from probes import probe_type
+from config_loader import ConfigError, ConfigWatcher, read_config, diff_hosts, diff_settings
+from sharding import ShardMembership
+from task_scheduler import TaskScheduler, seconds_until, seconds_until_aligned
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('/app/data/network_monitor.log'),
-        logging.StreamHandler()
-    ]
-)
+def setup_logging(worker_id=None):
+    """Configura o logging do monitor (arquivo em /app/data e saída padrão)
+
+    Chamado só ao executar o monitor: importar este módulo (benchmarks,
+    testes) não cria o arquivo de log nem mexe no logging de quem importa.
+    """
+    prefix = f'{worker_id} - ' if worker_id else ''
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f'%(asctime)s - {prefix}%(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('/app/data/network_monitor.log'),
+            logging.StreamHandler()
+        ]
+    )
 
 class NetworkMonitor:
-    def __init__(self):
+    def __init__(self, worker_id=None, metrics_port=None, api_port=None):
         self.config = self.load_config()
-        self.db = DatabaseManager()
+        test_config = self.config['test_config']
+        self.db = DatabaseManager(
+            cache_size=test_config.get('db_query_cache_size', 128),
+            cache_bucket_seconds=test_config.get('db_query_cache_bucket_seconds', 60),
+            write_retries=test_config.get('db_write_retries', 3)
+        )
+        self.db.check_query_plans()
+        # Com worker_id os hosts são divididos entre os workers ativos no mesmo banco
+        self.shard = ShardMembership(self.db.db_path, worker_id, test_config)
         self.tester = NetworkTester(self.config)
-        self.notifier = DiscordNotifier()
-        self.stats = StatsGenerator(self.db)
+        self.notifier = DiscordNotifier(
+            max_queue=test_config.get('discord_max_queue', 1000),
+            max_retries=test_config.get('discord_max_retries', 5),
+            coalesce_delay=test_config.get('discord_coalesce_seconds', 0.5),
+            close_timeout=test_config.get('discord_close_timeout_seconds', 10)
+        )
+        self.stats = StatsGenerator(self.db, self.config)
+        self.scheduler = ProbeScheduler(self.config['test_config'])
+        self.retention = RetentionManager(self.db, self.config['test_config'])
+        self.alerts = AlertManager(self.db, self.notifier, self.config)
+        self.pipeline = ResultPipeline(self.db, self.alerts, self.config['test_config'])
+        self.task_scheduler = TaskScheduler()
+        self.metrics_server = MetricsServer(
+            host=test_config.get('metrics_host', '0.0.0.0'),
+            port=metrics_port or test_config.get('metrics_port', 9108)
+        )
+        self.query_api = QueryAPI(
+            self.db, self.config,
+            host=test_config.get('api_host', '0.0.0.0'),
+            port=api_port or test_config.get('api_port', 8080),
+            pool_size=test_config.get('api_pool_size', 4),
+            page_limit=test_config.get('api_page_limit', 1000)
+        )
+        self.config_watcher = ConfigWatcher(
+            self.apply_config,
+            interval=test_config.get('config_reload_interval_seconds', 5)
+        )
+        self.register_metrics()
+        
+    def register_metrics(self):
+        """Expõe no /metrics as estatísticas que os componentes já mantêm em memória"""
+        REGISTRY.add_collector(stats_collector(
+            'netmon_pipeline', 'Etapas do pipeline de resultados', 'stage', self.pipeline.get_stats
+        ))
+        REGISTRY.add_collector(stats_collector(
+            'netmon_discord', 'Fila de envio do Discord', 'webhook', lambda: {'default': self.notifier.get_stats()}
+        ))
+        REGISTRY.add_collector(stats_collector(
+            'netmon_query_cache', 'Cache de consultas do banco', 'cache',
+            lambda: {'db': self.db.query_cache.get_stats()}
+        ))
+        REGISTRY.add_collector(stats_collector(
+            'netmon_task', 'Tarefas agendadas', 'task', lambda: self.task_scheduler.metrics
+        ))
+        REGISTRY.add_collector(stats_collector(
+            'netmon_traceroute', 'Traceroutes por backend', 'backend',
+            lambda: {backend: {'runs': runs} for backend, runs in self.tester.traceroute_runs.items()}
+        ))
         
     def load_config(self):
         try:
-            with open('/app/config/hosts.json', 'r') as f:
-                return json.load(f)
-        except Exception as e:
+            return read_config()
+        except (OSError, ConfigError) as e:
             logging.error(f"Erro ao carregar configuração: {e}")
             return {"hosts": [], "test_config": {}}
 
+    async def apply_config(self, config):
+        """Aplica um hosts.json novo (já validado) sem reiniciar o monitor
+
+        Hosts novos entram no próximo ciclo, removidos saem dele e alterados
+        usam os parâmetros novos no próximo teste; o ciclo em andamento
+        termina com a lista que começou.
+        """
+        added, removed, changed = diff_hosts(self.config['hosts'], config['hosts'])
+        live_keys, restart_keys = diff_settings(self.config['test_config'], config['test_config'])
+        if not (added or removed or changed or live_keys or restart_keys):
+            return
+        
+        for host in removed:
+            self.forget_host(host)
+        for old, new in changed:
+            # Outro tipo de teste: os resultados vão para outro host no banco
+            if probe_type(old) != probe_type(new):
+                self.forget_host(old)
+            # IP novo: a rota e o TTL de referência não valem mais
+            elif old['ip'] != new['ip']:
+                self.tester.traceroute_policy.forget(old['name'])
+                self.alerts.forget_path(old)
+        
+        # Os componentes guardam este mesmo dicionário e leem os parâmetros a cada teste
+        self.config['hosts'] = config['hosts']
+        self.config['test_config'] = config['test_config']
+        
+        if live_keys:
+            test_config = config['test_config']
+            self.scheduler.configure(test_config)
+            self.tester.traceroute_policy.configure(test_config)
+            self.task_scheduler.reschedule('network_tests', test_config.get('test_interval_minutes', 5) * 60)
+            self.task_scheduler.reschedule('hourly_report', test_config.get('report_interval_hours', 1) * 3600)
+        
+        logging.info(
+            f"Configuração recarregada: {len(added)} hosts adicionados, {len(removed)} removidos, "
+            f"{len(changed)} alterados" + (f"; parâmetros: {', '.join(live_keys)}" if live_keys else "")
+        )
+        if restart_keys:
+            logging.warning(f"Alterações que só valem após reiniciar: {', '.join(restart_keys)}")
+
+    def forget_host(self, host):
+        """Descarta o estado em memória de um host removido ou com IP trocado"""
+        self.tester.traceroute_policy.forget(host['name'])
+        self.alerts.forget(host)
+        forget_host(host['name'])
+
     async def run_network_tests(self):
         """Executa testes de rede para todos os hosts"""
         logging.info("Iniciando testes de rede...")
         
-        for host in self.config['hosts']:
-            try:
-                logging.info(f"Testando host: {host['name']} ({host['ip']})")
-                
-                # Executar testes
+        # Divisão atualizada logo antes do ciclo: workers que acabaram de entrar já contam
+        await self.refresh_shard()
+        hosts = [host for host in self.config['hosts'] if self.shard.owns(host)]
+        await self.scheduler.run_cycle(hosts, self.test_single_host)
+        
+        stats = self.pipeline.get_stats()
+        logging.info(
+            "Pipeline: " + ", ".join(
+                f"{name} fila={stage['queue_depth']} latência média={stage['avg_latency']:.2f}s "
+                f"descartados={stage['dropped']}"
+                for name, stage in stats.items()
+            )
+        )
+
+    async def test_single_host(self, host):
+        """Testa um host e entrega o resultado às etapas de gravação e alertas"""
+        try:
+            logging.info(f"Testando host: {host['name']} ({host['ip']})")
+            
+            # Executar testes
+            with PROBE_DURATION.time(probe_type=probe_type(host)):
                 results = await self.tester.test_host(host)
+            observe_result(host, results)
+            
+            # Gravação e alertas seguem em paralelo, sem segurar o próximo teste
+            await self.pipeline.submit(host, results)
                 
-                # Salvar no banco
-                self.db.save_test_result(host, results)
-                
-                # Verificar se há problemas críticos
-                if results['packet_loss'] > 10 or results['avg_latency'] > 1000:
-                    await self.notifier.send_alert(host, results)
-                    
-            except Exception as e:
-                logging.error(f"Erro ao testar host {host['name']}: {e}")
-                await self.notifier.send_error(host['name'], str(e))
+        except Exception as e:
+            logging.error(f"Erro ao testar host {host['name']}: {e}")
+            await self.notifier.send_error(host['name'], str(e))
+
+    async def refresh_shard(self):
+        """Renova o lease do worker e redistribui os hosts se outro worker entrou ou saiu"""
+        before = {host['name'] for host in self.config['hosts'] if self.shard.owns(host)}
+        if not await asyncio.to_thread(self.shard.refresh):
+            return
+        
+        after = {host['name'] for host in self.config['hosts'] if self.shard.owns(host)}
+        for name in before - after:
+            self.forget_host(name)
+        if after - before:
+            # Estado de alerta e rota dos hosts recebidos vêm do banco, gravados pelo dono anterior
+            await asyncio.to_thread(self.alerts.reload)
+        logging.info(f"Worker {self.shard.worker_id}: {len(after)} hosts ({len(after - before)} recebidos, "
+                     f"{len(before - after)} cedidos)")
+
+    async def run_retention(self):
+        """Retenção diária, feita apenas pelo líder"""
+        if self.shard.is_leader:
+            await self.retention.run()
 
     async def generate_hourly_report(self):
         """Gera relatório consolidado a cada hora"""
+        # Com vários workers o líder gera o relatório de todos a partir do banco compartilhado
+        if not self.shard.is_leader:
+            return
+        
         logging.info("Gerando relatório consolidado...")
         
         try:
             # Gerar estatísticas
-            stats_data = self.stats.generate_hourly_stats()
+            stats_data = await asyncio.to_thread(self.stats.generate_hourly_stats)
             
-            # Gerar gráficos
-            chart_path = self.stats.generate_charts()
+            # Gerar gráficos em processo separado
+            chart_path = await self.stats.render_charts()
             
             # Enviar para Discord
             await self.notifier.send_hourly_report(stats_data, chart_path)
             
+            series_path = await self.stats.render_series_charts()
+            if series_path:
+                await self.notifier.send_chart(series_path)
+            
         except Exception as e:
             logging.error(f"Erro ao gerar relatório: {e}")
 
     def schedule_tasks(self):
         """Agenda as tarefas"""
-        test_interval = self.config['test_config'].get('test_interval_minutes', 5)
+        test_config = self.config['test_config']
+        test_interval = test_config.get('test_interval_minutes', 5)
+        report_interval = test_config.get('report_interval_hours', 1)
         
-        # Testes a cada X minutos
-        schedule.every(test_interval).minutes.do(
-            lambda: asyncio.run(self.run_network_tests())
+        # Testes a cada X minutos, começando imediatamente
+        self.task_scheduler.add(
+            'network_tests', test_interval * 60, self.run_network_tests,
+            overlap=test_config.get('cycle_overlap_policy', 'skip')
         )
         
-        # Relatório a cada hora
-        schedule.every().hour.do(
-            lambda: asyncio.run(self.generate_hourly_report())
+        # Relatório a cada hora cheia
+        self.task_scheduler.add(
+            'hourly_report', report_interval * 3600, self.generate_hourly_report,
+            delay=seconds_until_aligned(report_interval * 3600)
+        )
+        
+        if self.shard.enabled:
+            lease_ttl = test_config.get('shard_lease_ttl_seconds', 30)
+            self.task_scheduler.add('shard_heartbeat', lease_ttl / 3, self.refresh_shard, delay=lease_ttl / 3)
+        
+        # Retenção diária dos dados antigos
+        self.task_scheduler.add(
+            'retention', 86400, self.run_retention,
+            delay=seconds_until(test_config.get('retention_time', '03:00'))
         )
 
+    async def main(self):
+        """Executa todas as tarefas em um único event loop até receber SIGTERM/SIGINT"""
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stop.set)
+        loop.add_signal_handler(signal.SIGHUP, self.config_watcher.trigger)
+        
+        await self.refresh_shard()
+        self.pipeline.start()
+        if self.config['test_config'].get('metrics_enabled', True):
+            try:
+                await self.metrics_server.start()
+            except OSError as e:
+                logging.error(f"Erro ao iniciar servidor de métricas: {e}")
+        if self.config['test_config'].get('api_enabled', True):
+            try:
+                await self.query_api.start()
+            except OSError as e:
+                logging.error(f"Erro ao iniciar API de consulta: {e}")
+        self.schedule_tasks()
+        self.task_scheduler.start()
+        self.config_watcher.start()
+        
+        await stop.wait()
+        
+        logging.info("Encerrando Network Monitor...")
+        await self.config_watcher.stop()
+        await self.task_scheduler.stop()
+        await self.pipeline.stop()
+        await self.metrics_server.stop()
+        await self.query_api.stop()
+        await self.notifier.close()
+        await self.tester.close()
+        self.stats.close()
+        await asyncio.to_thread(self.shard.close)
+
     def run(self):
         """Executa o monitor"""
         logging.info("Iniciando Network Monitor...")
         
-        # Executar teste inicial
-        asyncio.run(self.run_network_tests())
-        
-        # Agendar tarefas
-        self.schedule_tasks()
-        
-        # Loop principal
-        while True:
-            schedule.run_pending()
-            time.sleep(30)
+        try:
+            asyncio.run(self.main())
+        finally:
+            # Grava o lote pendente mesmo se o loop terminar com erro
+            self.db.close()
+
+def run_workers(count):
+    """Inicia count workers (worker-0..N-1) no mesmo banco e repassa os sinais a eles
+
+    Cada worker usa as portas de métricas e da API base + índice. Um worker que termina
+    sai da divisão quando o lease dele expira; os outros assumem os hosts.
+    """
+    try:
+        test_config = read_config().get('test_config', {})
+    except (OSError, ConfigError):
+        test_config = {}
+    base_port = test_config.get('metrics_port', 9108)
+    api_port = test_config.get('api_port', 8080)
+    
+    workers = [
+        subprocess.Popen([sys.executable, os.path.abspath(__file__),
+                          '--worker-id', f'worker-{i}', '--metrics-port', str(base_port + i),
+                          '--api-port', str(api_port + i)])
+        for i in range(count)
+    ]
+    
+    def forward(signum, frame):
+        for worker in workers:
+            if worker.poll() is None:
+                worker.send_signal(signum)
+    
+    for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+        signal.signal(signum, forward)
+    
+    logging.info(f"Iniciados {count} workers")
+    for worker in workers:
+        worker.wait()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Network Monitor')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='quantidade de workers que dividem os hosts (processos locais)')
+    parser.add_argument('--worker-id', default=os.environ.get('WORKER_ID'),
+                        help='identificador deste worker; ativa a divisão de hosts pelo banco compartilhado')
+    parser.add_argument('--metrics-port', type=int, help='porta do /metrics deste worker')
+    parser.add_argument('--api-port', type=int, help='porta da API de consulta deste worker')
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    monitor = NetworkMonitor()
-    monitor.run()
+    args = parse_args()
+    if args.workers > 1:
+        setup_logging()
+        run_workers(args.workers)
+    else:
+        setup_logging(args.worker_id)
+        monitor = NetworkMonitor(worker_id=args.worker_id, metrics_port=args.metrics_port,
+                                 api_port=args.api_port)
+        monitor.run()
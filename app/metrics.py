@@ -0,0 +1,269 @@
+import logging
+import threading
+import time
+
+# Limites padrão dos histogramas de duração (s)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(labels):
+    """Rótulos no formato de exposição do Prometheus: {a="1",b="2"}"""
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels) + '}'
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+class Metric:
+    """Métrica em memória, com valores por combinação de rótulos
+
+    Atualizada de qualquer thread; a leitura para o /metrics nunca consulta o banco.
+    """
+
+    kind = 'untyped'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def key(self, labels):
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def remove(self, **labels):
+        with self.lock:
+            self.values.pop(self.key(labels), None)
+
+    def samples(self):
+        """(sufixo, rótulos, valor) de cada série"""
+        with self.lock:
+            return [('', tuple(zip(self.label_names, key)), value) for key, value in self.values.items()]
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                # Contagem por bucket (não acumulada), soma e total
+                counts = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[0][i] += 1
+                    break
+            counts[1] += value
+            counts[2] += 1
+
+    def time(self, **labels):
+        """Context manager que observa a duração do bloco"""
+        return Timer(self, labels)
+
+    def samples(self):
+        with self.lock:
+            snapshot = [(key, list(counts[0]), counts[1], counts[2]) for key, counts in self.values.items()]
+
+        samples = []
+        for key, bucket_counts, total, count in snapshot:
+            labels = tuple(zip(self.label_names, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                samples.append(('_bucket', labels + (('le', format_value(bound)),), cumulative))
+            samples.append(('_sum', labels, total))
+            samples.append(('_count', labels, count))
+        return samples
+
+class Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+class TimedLock:
+    """threading.Lock que registra o tempo de espera para adquiri-lo"""
+
+    def __init__(self, histogram):
+        self.lock = threading.Lock()
+        self.histogram = histogram
+
+    def __enter__(self):
+        start = time.perf_counter()
+        self.lock.acquire()
+        self.histogram.observe(time.perf_counter() - start)
+        return self
+
+    def __exit__(self, *exc):
+        self.lock.release()
+
+class Registry:
+    """Conjunto de métricas e coletores exposto no /metrics"""
+
+    def __init__(self):
+        self.metrics = []
+        # Funções chamadas a cada leitura que devolvem
+        # [(nome, tipo, ajuda, [(rótulos, valor)])] a partir de estado já em memória
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self.register(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self):
+        """Texto no formato de exposição do Prometheus (0.0.4)"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help_text}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for suffix, labels, value in metric.samples():
+                lines.append(f'{metric.name}{suffix}{format_labels(labels)} {format_value(value)}')
+
+        for collector in self.collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                logging.error(f"Erro ao coletar métricas: {e}")
+                continue
+            for name, kind, help_text, samples in families:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{format_labels(tuple(labels.items()))} {format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+# Estado de cada host, do último teste
+HOST_LATENCY = REGISTRY.gauge('netmon_host_latency_ms', 'Latência média do último teste (ms)', ['host'])
+HOST_LATENCY_P95 = REGISTRY.gauge('netmon_host_latency_p95_ms', 'Latência p95 do último teste (ms)', ['host'])
+HOST_JITTER = REGISTRY.gauge('netmon_host_jitter_ms', 'Jitter do último teste (ms)', ['host'])
+HOST_LOSS = REGISTRY.gauge('netmon_host_packet_loss_percent', 'Perda de pacotes do último teste (%)', ['host'])
+HOST_AVAILABLE = REGISTRY.gauge('netmon_host_available', '1 se o host respondeu no último teste', ['host'])
+HOST_LAST_TEST = REGISTRY.gauge('netmon_host_last_test_timestamp_seconds', 'Horário do último teste (epoch)', ['host'])
+HOST_TESTS = REGISTRY.counter('netmon_host_tests_total', 'Testes executados por host', ['host'])
+
+# Tempos internos
+PROBE_DURATION = REGISTRY.histogram('netmon_probe_duration_seconds', 'Duração do teste de um host',
+                                    labels=('probe_type',))
+CYCLE_DURATION = REGISTRY.histogram('netmon_cycle_duration_seconds', 'Duração do ciclo de testes',
+                                    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800))
+CYCLE_OVERRUNS = REGISTRY.counter('netmon_cycle_overruns_total', 'Ciclos que excederam o intervalo de testes')
+DB_WRITE_DURATION = REGISTRY.histogram('netmon_db_write_seconds', 'Duração da gravação de um lote no SQLite')
+DB_WRITE_ROWS = REGISTRY.counter('netmon_db_rows_written_total', 'Resultados gravados no SQLite')
+DB_WRITE_FAILURES = REGISTRY.counter('netmon_db_rows_failed_total',
+                                     'Resultados que não puderam ser gravados e foram separados para inspeção')
+DB_LOCK_WAIT = REGISTRY.histogram('netmon_db_lock_wait_seconds', 'Espera pelo lock do DatabaseManager')
+DISCORD_SEND_DURATION = REGISTRY.histogram('netmon_discord_send_seconds', 'Duração do envio ao webhook do Discord',
+                                           ['kind'])
+CHART_RENDER_DURATION = REGISTRY.histogram('netmon_chart_render_seconds', 'Duração da renderização de um gráfico',
+                                           ['chart'])
+
+def observe_result(host, results):
+    """Atualiza as métricas do host com o resultado do teste"""
+    name = host['name']
+    HOST_LATENCY.set(results['avg_latency'], host=name)
+    HOST_JITTER.set(results['jitter'], host=name)
+    HOST_LOSS.set(results['packet_loss'], host=name)
+    HOST_AVAILABLE.set(1 if results['is_available'] else 0, host=name)
+    HOST_LAST_TEST.set(results['timestamp'], host=name)
+    if results.get('p95_latency') is not None:
+        HOST_LATENCY_P95.set(results['p95_latency'], host=name)
+    HOST_TESTS.inc(host=name)
+
+def forget_host(host_name):
+    """Remove as séries de um host que saiu da configuração"""
+    for metric in (HOST_LATENCY, HOST_LATENCY_P95, HOST_JITTER, HOST_LOSS, HOST_AVAILABLE,
+                   HOST_LAST_TEST, HOST_TESTS):
+        metric.remove(host=host_name)
+
+def stats_collector(prefix, help_text, label, get_stats):
+    """Coletor que expõe dicionários de estatísticas já mantidos pelos componentes
+
+    get_stats() retorna {valor do rótulo: {estatística: número}}; cada
+    estatística numérica vira o gauge {prefix}_{estatística}.
+    """
+    def collect():
+        families = {}
+        for label_value, stats in get_stats().items():
+            for stat, value in stats.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                families.setdefault(stat, []).append(({label: label_value}, value))
+        return [(f'{prefix}_{stat}', 'gauge', f'{help_text}: {stat}', samples)
+                for stat, samples in families.items()]
+    return collect
+
+class MetricsServer:
+    """Servidor HTTP embutido com o endpoint /metrics"""
+
+    def __init__(self, registry=REGISTRY, host='0.0.0.0', port=9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.runner = None
+
+    async def handle_metrics(self, request):
+        from aiohttp import web
+        return web.Response(text=self.registry.render(), content_type='text/plain', charset='utf-8',
+                            headers={'X-Content-Type-Options': 'nosniff'})
+
+    async def start(self):
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle_metrics)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        logging.info(f"Métricas disponíveis em http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
@@ -0,0 +1,331 @@
+import calendar
+import logging
+import time
+
+# Tabelas de agregação mantidas a cada gravação: nome -> largura do bucket (s)
+ROLLUP_GRANULARITIES = (('minute', 60), ('hour', 3600), ('day', 86400))
+
+# Resultados novos vão para uma tabela por dia (UTC): test_results_AAAAMMDD
+PARTITION_PREFIX = 'test_results_'
+PARTITION_SECONDS = 86400
+
+# Colunas acrescentadas pela migração 5 (RTTs brutos e estatísticas derivadas)
+RTT_COLUMNS = [
+    ('rtts', 'BLOB'),
+    ('p50_latency', 'REAL'),
+    ('p95_latency', 'REAL'),
+    ('p99_latency', 'REAL'),
+    ('ipdv_jitter', 'REAL'),
+    ('loss_bursts', 'INTEGER'),
+    ('max_loss_burst', 'INTEGER'),
+    ('mos', 'REAL'),
+]
+
+# Colunas acrescentadas pela migração 6 (rota do traceroute e RTT por salto)
+PATH_COLUMNS = [
+    ('path_id', 'INTEGER REFERENCES traceroute_paths(id)'),
+    ('hop_rtts', 'BLOB'),
+]
+
+# Colunas atuais de test_results e das partições
+RESULT_COLUMNS = [
+    ('id', 'INTEGER PRIMARY KEY AUTOINCREMENT'),
+    ('timestamp', 'REAL'),
+    ('host_id', 'INTEGER REFERENCES hosts(id)'),
+    ('packet_loss', 'REAL'),
+    ('avg_latency', 'REAL'),
+    ('min_latency', 'REAL'),
+    ('max_latency', 'REAL'),
+    ('jitter', 'REAL'),
+    ('is_available', 'BOOLEAN'),
+    ('successful_pings', 'INTEGER'),
+    ('total_pings', 'INTEGER'),
+    # Texto do traceroute, só em resultados anteriores à migração 6
+    ('traceroute', 'TEXT'),
+] + RTT_COLUMNS + PATH_COLUMNS
+
+def partition_name(timestamp):
+    """Nome da partição diária que guarda o timestamp"""
+    return PARTITION_PREFIX + time.strftime('%Y%m%d', time.gmtime(timestamp))
+
+def partition_start(name):
+    """Início (epoch UTC) do dia coberto pela partição"""
+    return calendar.timegm(time.strptime(name[len(PARTITION_PREFIX):], '%Y%m%d'))
+
+def list_partitions(cursor):
+    """Nomes das partições existentes, da mais antiga para a mais nova"""
+    rows = cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB ? ORDER BY name",
+        (PARTITION_PREFIX + '[0-9]' * 8,)
+    )
+    return [row[0] for row in rows]
+
+def create_partition(cursor, name):
+    """Cria a partição com os mesmos índices da tabela principal"""
+    columns = ',\n'.join(f'{column} {definition}' for column, definition in RESULT_COLUMNS)
+    cursor.execute(f'CREATE TABLE IF NOT EXISTS {name} ({columns})')
+    cursor.execute(f'''
+        CREATE INDEX IF NOT EXISTS idx_{name}_host_time
+        ON {name}(host_id, timestamp, is_available, avg_latency, packet_loss)
+    ''')
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{name}_time ON {name}(timestamp)')
+
+def create_initial_schema(cursor):
+    """Tabela de resultados como criada antes do controle de versão"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS test_results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp REAL,
+            host_name TEXT,
+            host_ip TEXT,
+            packet_loss REAL,
+            avg_latency REAL,
+            min_latency REAL,
+            max_latency REAL,
+            jitter REAL,
+            is_available BOOLEAN,
+            successful_pings INTEGER,
+            total_pings INTEGER,
+            traceroute TEXT
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON test_results(timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_host_name ON test_results(host_name)')
+
+def create_rollup_tables(cursor):
+    """Agregados por host e período, populados a partir dos dados existentes"""
+    for name, width in ROLLUP_GRANULARITIES:
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS rollup_{name} (
+                host_name TEXT,
+                host_ip TEXT,
+                bucket INTEGER,
+                samples INTEGER,
+                available INTEGER,
+                latency_sum REAL,
+                latency_sumsq REAL,
+                latency_min REAL,
+                latency_max REAL,
+                loss_sum REAL,
+                jitter_sum REAL,
+                PRIMARY KEY (host_name, host_ip, bucket)
+            )
+        ''')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_rollup_{name}_bucket ON rollup_{name}(bucket)')
+
+        # Bancos anteriores às agregações
+        if cursor.execute(f'SELECT 1 FROM rollup_{name} LIMIT 1').fetchone():
+            continue
+        cursor.execute(f'''
+            INSERT INTO rollup_{name}
+            SELECT host_name, host_ip,
+                   CAST(timestamp / {width} AS INTEGER) * {width} AS bucket,
+                   COUNT(*),
+                   SUM(CASE WHEN is_available THEN 1 ELSE 0 END),
+                   SUM(avg_latency),
+                   SUM(avg_latency * avg_latency),
+                   MIN(min_latency),
+                   MAX(max_latency),
+                   SUM(packet_loss),
+                   SUM(jitter)
+            FROM test_results
+            GROUP BY host_name, host_ip, bucket
+        ''')
+
+def normalize_hosts(cursor):
+    """Troca host_name/host_ip repetidos por host_id e cria índices compostos"""
+    cursor.execute('''
+        CREATE TABLE hosts (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            ip TEXT NOT NULL,
+            UNIQUE (name, ip)
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO hosts (name, ip)
+        SELECT host_name, host_ip FROM test_results
+        UNION
+        SELECT host_name, host_ip FROM rollup_day
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE test_results_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp REAL,
+            host_id INTEGER REFERENCES hosts(id),
+            packet_loss REAL,
+            avg_latency REAL,
+            min_latency REAL,
+            max_latency REAL,
+            jitter REAL,
+            is_available BOOLEAN,
+            successful_pings INTEGER,
+            total_pings INTEGER,
+            traceroute TEXT
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO test_results_new
+        SELECT r.id, r.timestamp, h.id, r.packet_loss, r.avg_latency, r.min_latency,
+               r.max_latency, r.jitter, r.is_available, r.successful_pings,
+               r.total_pings, r.traceroute
+        FROM test_results r
+        JOIN hosts h ON h.name = r.host_name AND h.ip = r.host_ip
+    ''')
+    cursor.execute('DROP TABLE test_results')
+    cursor.execute('ALTER TABLE test_results_new RENAME TO test_results')
+
+    # Histórico por host e SLA ponderado leem só o índice, já na ordem certa
+    cursor.execute('''
+        CREATE INDEX idx_results_host_time
+        ON test_results(host_id, timestamp, is_available, avg_latency, packet_loss)
+    ''')
+    cursor.execute('CREATE INDEX idx_results_time ON test_results(timestamp)')
+
+    for name, _ in ROLLUP_GRANULARITIES:
+        cursor.execute(f'''
+            CREATE TABLE rollup_{name}_new (
+                host_id INTEGER REFERENCES hosts(id),
+                bucket INTEGER,
+                samples INTEGER,
+                available INTEGER,
+                latency_sum REAL,
+                latency_sumsq REAL,
+                latency_min REAL,
+                latency_max REAL,
+                loss_sum REAL,
+                jitter_sum REAL,
+                PRIMARY KEY (host_id, bucket)
+            )
+        ''')
+        cursor.execute(f'''
+            INSERT INTO rollup_{name}_new
+            SELECT h.id, r.bucket, r.samples, r.available, r.latency_sum, r.latency_sumsq,
+                   r.latency_min, r.latency_max, r.loss_sum, r.jitter_sum
+            FROM rollup_{name} r
+            JOIN hosts h ON h.name = r.host_name AND h.ip = r.host_ip
+        ''')
+        cursor.execute(f'DROP TABLE rollup_{name}')
+        cursor.execute(f'ALTER TABLE rollup_{name}_new RENAME TO rollup_{name}')
+        cursor.execute(f'CREATE INDEX idx_rollup_{name}_bucket ON rollup_{name}(bucket)')
+
+def create_alert_state(cursor):
+    """Estado dos alertas por host, para sobreviver a reinícios"""
+    cursor.execute('''
+        CREATE TABLE alert_state (
+            host_id INTEGER PRIMARY KEY REFERENCES hosts(id),
+            state TEXT NOT NULL,
+            since REAL,
+            pending_state TEXT,
+            pending_count INTEGER,
+            flapping BOOLEAN,
+            transitions TEXT
+        )
+    ''')
+
+def add_rtt_columns(cursor):
+    """Vetor de RTTs por teste, percentis e histogramas de latência por host e hora"""
+    for table in ['test_results'] + list_partitions(cursor):
+        for column, definition in RTT_COLUMNS:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+    cursor.execute('''
+        CREATE TABLE latency_histograms (
+            host_id INTEGER REFERENCES hosts(id),
+            bucket INTEGER,
+            counts BLOB,
+            PRIMARY KEY (host_id, bucket)
+        )
+    ''')
+    cursor.execute('CREATE INDEX idx_latency_histograms_bucket ON latency_histograms(bucket)')
+
+def create_traceroute_paths(cursor):
+    """Rotas distintas do traceroute, referenciadas por path_id em cada resultado"""
+    cursor.execute('''
+        CREATE TABLE traceroute_paths (
+            id INTEGER PRIMARY KEY,
+            hash TEXT NOT NULL UNIQUE,
+            hops TEXT NOT NULL,
+            first_seen REAL
+        )
+    ''')
+    for table in ['test_results'] + list_partitions(cursor):
+        for column, definition in PATH_COLUMNS:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+    # Rota atual de cada host, para detectar mudanças entre reinícios
+    cursor.execute('''
+        CREATE TABLE host_paths (
+            host_id INTEGER PRIMARY KEY REFERENCES hosts(id),
+            path_id INTEGER REFERENCES traceroute_paths(id),
+            since REAL
+        )
+    ''')
+
+def create_worker_leases(cursor):
+    """Leases dos workers que dividem os hosts entre si"""
+    cursor.execute('''
+        CREATE TABLE worker_leases (
+            worker_id TEXT PRIMARY KEY,
+            pid INTEGER,
+            started REAL NOT NULL,
+            expires REAL NOT NULL
+        )
+    ''')
+
+def add_probe_type(cursor):
+    """Tipo de teste (icmp, tcp, dns, http) na dimensão de hosts
+
+    O mesmo nome e IP com outro tipo de teste é outro host, com resultados,
+    agregações e alertas próprios; os hosts existentes ficam como icmp.
+    """
+    cursor.execute('''
+        CREATE TABLE hosts_new (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            ip TEXT NOT NULL,
+            probe_type TEXT NOT NULL DEFAULT 'icmp',
+            UNIQUE (name, ip, probe_type)
+        )
+    ''')
+    cursor.execute('INSERT INTO hosts_new (id, name, ip) SELECT id, name, ip FROM hosts')
+    cursor.execute('DROP TABLE hosts')
+    cursor.execute('ALTER TABLE hosts_new RENAME TO hosts')
+
+# Versão do schema (PRAGMA user_version) -> migração que leva a ela
+MIGRATIONS = [
+    (1, 'schema inicial', create_initial_schema),
+    (2, 'tabelas de agregação', create_rollup_tables),
+    (3, 'dimensão de hosts e índices compostos', normalize_hosts),
+    (4, 'estado dos alertas', create_alert_state),
+    (5, 'RTTs por teste e histogramas de latência', add_rtt_columns),
+    (6, 'rotas do traceroute deduplicadas', create_traceroute_paths),
+    (7, 'leases dos workers', create_worker_leases),
+    (8, 'tipo de teste dos hosts', add_probe_type),
+]
+
+def migrate(conn):
+    """Aplica em ordem as migrações pendentes, cada uma em sua transação"""
+    current = conn.execute('PRAGMA user_version').fetchone()[0]
+
+    for version, description, migration in MIGRATIONS:
+        if version <= current:
+            continue
+
+        logging.info(f"Aplicando migração {version}: {description}")
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            # Outro processo pode ter migrado enquanto aguardávamos o lock
+            if cursor.execute('PRAGMA user_version').fetchone()[0] >= version:
+                conn.rollback()
+                continue
+            migration(cursor)
+            cursor.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    return conn.execute('PRAGMA user_version').fetchone()[0]
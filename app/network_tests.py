@@ -1,20 +1,93 @@
 import asyncio
-import subprocess
-import statistics
 import time
-from pythonping import ping
 import logging
 
+from icmp_prober import AsyncICMPProber
+from probes import PROBE_CLASSES, PROBE_SETTINGS, SimulatedProbe, probe_type, resolve
+from simulated_network import SimulatedNetwork, SimulatedProber
+from rtt_stats import summarize
+from traceroute import parse_traceroute, TraceroutePolicy
+
 class NetworkTester:
     def __init__(self, config):
         self.config = config
+        self.prober = None
+        self.prober_available = True
+        # Testes TCP, DNS e HTTP por tipo, criados no primeiro host de cada tipo
+        self.probes = {}
+        self.traceroute_policy = TraceroutePolicy(config['test_config'])
+        # Traceroutes executados por backend e testes em que foi dispensado
+        self.traceroute_runs = {'builtin': 0, 'system': 0, 'skipped': 0}
+
+    def get_prober(self):
+        """Retorna o prober ICMP do event loop atual, criando-o se necessário"""
+        if not self.prober_available:
+            return None
+
+        loop = asyncio.get_running_loop()
+        if self.prober is None or self.prober.loop is not loop:
+            if self.prober is not None:
+                self.prober.close()
+            test_config = self.config['test_config']
+            if test_config.get('probe_backend', 'icmp') == 'simulated':
+                # Rede simulada: benchmarks e testes sem ICMP nem privilégios
+                self.prober = SimulatedProber(
+                    SimulatedNetwork(self.config, seed=test_config.get('simulation_seed', 0)),
+                    loop, delay=test_config.get('simulation_delay', True)
+                )
+                return self.prober
+            try:
+                self.prober = AsyncICMPProber(loop)
+            except OSError as e:
+                logging.warning(f"Socket ICMP indisponível, usando pythonping em threads: {e}")
+                self.prober_available = False
+                self.prober = None
+        return self.prober
+        
+    async def get_probe(self, kind):
+        """Retorna o teste do tipo para o event loop atual, criando-o se necessário"""
+        loop = asyncio.get_running_loop()
+        probe = self.probes.get(kind)
+        if probe is None or probe.loop is not loop:
+            if probe is not None:
+                await probe.close()
+            if self.config['test_config'].get('probe_backend', 'icmp') == 'simulated':
+                probe = SimulatedProbe(self.get_prober())
+            else:
+                probe = PROBE_CLASSES[kind](loop)
+            self.probes[kind] = probe
+        return probe
+        
+    async def close(self):
+        """Libera os sockets e conexões dos testes"""
+        for probe in self.probes.values():
+            await probe.close()
+        self.probes.clear()
+        if self.prober is not None:
+            self.prober.close()
+            self.prober = None
+        
+    def probe_settings(self, host):
+        """Parâmetros do teste do host: test_config < test_config.probe_defaults[tipo] < host.probe"""
+        test_config = self.config['test_config']
+        settings = {
+            'ping_count': test_config.get('ping_count', 50),
+            'ping_interval': test_config.get('ping_interval', 0.1),
+            'timeout': test_config.get('timeout', 5)
+        }
+        settings.update(PROBE_SETTINGS.get(probe_type(host), {}))
+        settings.update(test_config.get('probe_defaults', {}).get(probe_type(host), {}))
+        settings.update(host.get('probe', {}))
+        return settings
         
     async def test_host(self, host):
         """Executa todos os testes para um host"""
+        kind = probe_type(host)
         results = {
             'timestamp': time.time(),
             'host_name': host['name'],
             'host_ip': host['ip'],
+            'probe_type': kind,
             'ping_results': {},
             'traceroute': [],
             'packet_loss': 0,
@@ -25,78 +98,147 @@ class NetworkTester:
             'is_available': False
         }
         
-        # Teste de ping
-        ping_results = await self.run_ping_test(host['ip'])
+        # Ping, ou o teste TCP/DNS/HTTP do host
+        if kind == 'icmp':
+            ping_results = await self.run_ping_test(host['ip'], self.probe_settings(host))
+        else:
+            ping_results = await self.run_probe_test(host['ip'], kind, self.probe_settings(host))
         results.update(ping_results)
         
-        # Traceroute (apenas se o host estiver disponível)
-        if results['is_available']:
-            traceroute_results = await self.run_traceroute(host['ip'])
-            results['traceroute'] = traceroute_results
+        # Traceroute (apenas no ping, com o host disponível e se a política pedir)
+        if kind == 'icmp' and results['is_available']:
+            prober = self.get_prober()
+            reply_ttl = first_hop = None
+            if prober:
+                target_ip = await prober.resolve(host['ip'])
+                reply_ttl = prober.reply_ttls.get(target_ip)
+                first_hop = await self.first_hop(prober, target_ip)
+            
+            reason = self.traceroute_policy.check(host['name'], results, reply_ttl, first_hop)
+            if reason:
+                logging.info(f"Traceroute para {host['name']}: {reason}")
+                results['traceroute'] = await self.run_traceroute(host['ip'])
+                self.traceroute_policy.record(host['name'], results['timestamp'], results['traceroute'], reply_ttl)
+            else:
+                self.traceroute_runs['skipped'] += 1
             
         return results
     
-    async def run_ping_test(self, host_ip):
+    async def run_ping_test(self, host_ip, settings):
         """Executa teste de ping"""
-        ping_count = self.config['test_config'].get('ping_count', 50)
-        timeout = self.config['test_config'].get('timeout', 5)
+        ping_count = settings['ping_count']
+        timeout = settings['timeout']
         
         try:
-            # Executar pings
-            response_times = []
-            successful_pings = 0
-            
-            for i in range(ping_count):
-                try:
-                    response = ping(host_ip, timeout=timeout, count=1)
-                    if response.success():
-                        response_times.append(response.rtt_avg_ms)
-                        successful_pings += 1
-                except:
-                    pass
-                    
-                # Pequena pausa entre pings
-                await asyncio.sleep(0.1)
-            
-            # Calcular estatísticas
-            packet_loss = ((ping_count - successful_pings) / ping_count) * 100
+            ping_interval = settings['ping_interval']
+            prober = self.get_prober()
             
-            if response_times:
-                avg_latency = statistics.mean(response_times)
-                min_latency = min(response_times)
-                max_latency = max(response_times)
-                jitter = statistics.stdev(response_times) if len(response_times) > 1 else 0
-                is_available = True
+            if prober:
+                target_ip = await prober.resolve(host_ip)
+                probe = lambda: prober.echo(target_ip, timeout)
             else:
-                avg_latency = min_latency = max_latency = jitter = 0
-                is_available = False
+                probe = lambda: asyncio.to_thread(self.blocking_ping, host_ip, timeout)
             
-            return {
-                'packet_loss': packet_loss,
-                'avg_latency': avg_latency,
-                'min_latency': min_latency,
-                'max_latency': max_latency,
-                'jitter': jitter,
-                'is_available': is_available,
-                'successful_pings': successful_pings,
-                'total_pings': ping_count
-            }
+            return await self.run_series(probe, ping_count, ping_interval)
             
         except Exception as e:
             logging.error(f"Erro no teste de ping para {host_ip}: {e}")
-            return {
-                'packet_loss': 100,
-                'avg_latency': 0,
-                'min_latency': 0,
-                'max_latency': 0,
-                'jitter': 0,
-                'is_available': False,
-                'successful_pings': 0,
-                'total_pings': ping_count
-            }
+            return self.failed_results(ping_count)
+    
+    async def run_probe_test(self, host_ip, kind, settings):
+        """Executa ping_count tentativas do teste TCP, DNS ou HTTP
+        
+        Cada tentativa bem-sucedida conta como um ping respondido, com o
+        tempo medido (handshake, resposta DNS ou primeiro byte) como RTT;
+        falhas e timeouts contam como perdas.
+        """
+        try:
+            probe = await self.get_probe(kind)
+            # No HTTP a URL pode ter um nome; o aiohttp resolve
+            target_ip = host_ip if kind == 'http' else await resolve(probe.loop, host_ip)
+            return await self.run_series(lambda: probe.measure(target_ip, settings),
+                                         settings['ping_count'], settings['ping_interval'])
+            
+        except Exception as e:
+            logging.error(f"Erro no teste {kind} para {host_ip}: {e}")
+            return self.failed_results(settings['ping_count'])
+    
+    @staticmethod
+    async def run_series(probe, count, interval):
+        """Executa count tentativas espaçadas pelo intervalo e resume os RTTs"""
+        # Tentativas espaçadas pelo intervalo, mas sem esperar a resposta da anterior
+        tasks = []
+        for i in range(count):
+            if i:
+                await asyncio.sleep(interval)
+            tasks.append(asyncio.ensure_future(probe()))
+        
+        rtts = await asyncio.gather(*tasks, return_exceptions=True)
+        
+        # Vetor na ordem de envio, None para perdas: percentis, jitter
+        # RFC 3550 e rajadas de perda saem dele
+        return summarize([rtt if isinstance(rtt, (int, float)) else None for rtt in rtts])
+    
+    @staticmethod
+    def failed_results(count):
+        return {
+            'packet_loss': 100,
+            'avg_latency': 0,
+            'min_latency': 0,
+            'max_latency': 0,
+            'jitter': 0,
+            'is_available': False,
+            'successful_pings': 0,
+            'total_pings': count
+        }
+    
+    @staticmethod
+    def blocking_ping(host_ip, timeout):
+        """Ping síncrono com pythonping, executado fora do event loop"""
+        from pythonping import ping
+        response = ping(host_ip, timeout=timeout, count=1)
+        if response.success():
+            return response.rtt_avg_ms
+        return None
+
+    async def first_hop(self, prober, target_ip):
+        """Roteador do primeiro salto até o host (um único echo com TTL 1)"""
+        timeout = self.config['test_config'].get('traceroute_timeout', 2)
+        try:
+            reply = await prober.probe_ttl(target_ip, 1, timeout)
+            return reply[0] if reply else None
+        except OSError as e:
+            logging.debug(f"Erro ao sondar primeiro salto de {target_ip}: {e}")
+            return None
     
     async def run_traceroute(self, host_ip):
-        """Executa traceroute"""
+        """Executa traceroute e retorna os saltos {'ttl', 'ip', 'rtt'}
+        
+        Usa o traceroute próprio sobre o socket ICMP, com todos os saltos em
+        paralelo; o binário do sistema fica para quando o socket não está
+        disponível ou traceroute_backend = "system".
+        """
+        test_config = self.config['test_config']
+        prober = self.get_prober()
+        if prober and test_config.get('traceroute_backend', 'builtin') == 'builtin':
+            try:
+                target_ip = await prober.resolve(host_ip)
+                hops = await prober.trace(
+                    target_ip,
+                    max_hops=test_config.get('traceroute_max_hops', 30),
+                    timeout=test_config.get('traceroute_timeout', 2)
+                )
+                self.traceroute_runs['builtin'] += 1
+                return hops
+            except OSError as e:
+                logging.error(f"Erro no traceroute para {host_ip}: {e}")
+                return []
+        
+        self.traceroute_runs['system'] += 1
+        return await self.run_system_traceroute(host_ip)
+    
+    async def run_system_traceroute(self, host_ip):
+        """Executa o traceroute do sistema"""
         try:
             process = await asyncio.create_subprocess_exec(
                 'traceroute', '-n', '-w', '3', host_ip,
@@ -107,10 +249,11 @@ class NetworkTester:
             stdout, stderr = await process.communicate()
             
             if process.returncode == 0:
-                return stdout.decode().strip().split('\n')
+                return parse_traceroute(stdout.decode().strip().split('\n'))
             else:
-                return [f"Erro no traceroute: {stderr.decode()}"]
+                logging.error(f"Erro no traceroute para {host_ip}: {stderr.decode().strip()}")
+                return []
                 
         except Exception as e:
             logging.error(f"Erro no traceroute para {host_ip}: {e}")
-            return [f"Erro no traceroute: {str(e)}"]
+            return []
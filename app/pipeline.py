@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import time
+import zlib
+
+# O que fazer quando a fila da etapa está cheia
+OVERFLOW_POLICIES = ('block', 'drop_oldest')
+
+class Stage:
+    """Etapa do pipeline: filas limitadas, workers e métricas
+
+    Cada worker tem a sua fila e os itens são distribuídos pela chave, então
+    itens de mesma chave (host) são processados em ordem.
+    """
+
+    def __init__(self, name, handler, workers=1, queue_size=1000, overflow='block', batch_size=1, linger=0):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Política de fila cheia inválida: {overflow}")
+
+        self.name = name
+        # handler(itens) recebe a lista de itens retirados da fila de uma vez
+        self.handler = handler
+        self.overflow = overflow
+        self.batch_size = max(1, batch_size)
+        # Tempo que o worker espera por mais itens para completar o lote
+        self.linger = linger
+        self.queues = [asyncio.Queue(max(1, queue_size)) for _ in range(max(1, workers))]
+        self.workers = []
+        self.metrics = {
+            'processed': 0,
+            'failures': 0,
+            'dropped': 0,
+            'batches': 0,
+            'max_queue_depth': 0,
+            'blocked_time': 0.0,
+            'total_latency': 0.0,
+            'max_latency': 0.0,
+            'total_service_time': 0.0,
+            'max_service_time': 0.0
+        }
+
+    def queue_depth(self):
+        return sum(queue.qsize() for queue in self.queues)
+
+    async def put(self, item, key=''):
+        """Enfileira o item; com a fila cheia espera (block) ou descarta o mais antigo"""
+        queue = self.queues[zlib.crc32(key.encode()) % len(self.queues)]
+
+        if queue.full():
+            if self.overflow == 'drop_oldest':
+                queue.get_nowait()
+                queue.task_done()
+                self.metrics['dropped'] += 1
+            else:
+                start = time.monotonic()
+                await queue.put((time.monotonic(), item))
+                self.metrics['blocked_time'] += time.monotonic() - start
+                self.update_depth()
+                return
+
+        queue.put_nowait((time.monotonic(), item))
+        self.update_depth()
+
+    def update_depth(self):
+        self.metrics['max_queue_depth'] = max(self.metrics['max_queue_depth'], self.queue_depth())
+
+    async def worker(self, queue):
+        """Retira até batch_size itens por vez e entrega ao handler"""
+        while True:
+            batch = [await queue.get()]
+            deadline = time.monotonic() + self.linger
+            while len(batch) < self.batch_size:
+                if not queue.empty():
+                    batch.append(queue.get_nowait())
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            start = time.monotonic()
+            try:
+                await self.handler([item for _, item in batch])
+                self.metrics['processed'] += len(batch)
+            except Exception as e:
+                # O handler pode informar quantos itens do lote falharam (ResultWriteError)
+                failed = min(len(batch), getattr(e, 'failed', len(batch)))
+                self.metrics['processed'] += len(batch) - failed
+                self.metrics['failures'] += failed
+                logging.error(f"Erro na etapa {self.name}: {e}")
+            finally:
+                finished = time.monotonic()
+                service_time = finished - start
+                self.metrics['batches'] += 1
+                self.metrics['total_service_time'] += service_time
+                self.metrics['max_service_time'] = max(self.metrics['max_service_time'], service_time)
+                for enqueued, _ in batch:
+                    latency = finished - enqueued
+                    self.metrics['total_latency'] += latency
+                    self.metrics['max_latency'] = max(self.metrics['max_latency'], latency)
+                    queue.task_done()
+
+    def start(self):
+        if not self.workers:
+            self.workers = [asyncio.create_task(self.worker(queue)) for queue in self.queues]
+
+    async def join(self):
+        """Espera as filas esvaziarem"""
+        await asyncio.gather(*(queue.join() for queue in self.queues))
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def get_stats(self):
+        """Métricas da etapa, com médias e profundidade atual das filas"""
+        metrics = self.metrics
+        done = metrics['processed'] + metrics['failures']
+        return dict(
+            metrics,
+            queue_depth=self.queue_depth(),
+            avg_latency=metrics['total_latency'] / done if done else 0,
+            avg_service_time=metrics['total_service_time'] / metrics['batches'] if metrics['batches'] else 0
+        )
+
+class ResultPipeline:
+    """Resultados dos testes seguem por etapas independentes: gravação e alertas
+
+    O teste só enfileira o resultado; gravar no SQLite ou esperar o Discord
+    não atrasa o próximo teste. A gravação bloqueia quando a fila enche
+    (não perde dados); os alertas descartam a amostra mais antiga, já que
+    a próxima amostra do host atualiza o estado de qualquer forma.
+    """
+
+    def __init__(self, db, alerts, test_config):
+        self.db = db
+        self.alerts = alerts
+        queue_size = test_config.get('pipeline_queue_size', 1000)
+
+        self.writer = Stage(
+            'writer', self.write,
+            queue_size=queue_size,
+            overflow=test_config.get('pipeline_writer_overflow', 'block'),
+            batch_size=test_config.get('pipeline_writer_batch', 500),
+            linger=test_config.get('pipeline_writer_linger_seconds', 1.0)
+        )
+        self.alerter = Stage(
+            'alerts', self.evaluate,
+            workers=test_config.get('pipeline_alert_workers', 4),
+            queue_size=queue_size,
+            overflow=test_config.get('pipeline_alert_overflow', 'drop_oldest')
+        )
+        self.stages = [self.writer, self.alerter]
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    async def submit(self, host, results):
+        """Entrega o resultado às etapas de gravação e de alertas"""
+        await self.writer.put((host, results), host['name'])
+        await self.alerter.put((host, results), host['name'])
+
+    async def write(self, items):
+        # Uma transação por lote, fora do event loop
+        await asyncio.to_thread(self.db.save_test_results, items)
+
+    async def evaluate(self, items):
+        for host, results in items:
+            await self.alerts.evaluate(host, results)
+            await self.alerts.evaluate_path(host, results)
+
+    async def stop(self, timeout=30):
+        """Processa o que está nas filas (até timeout segundos) e encerra as etapas"""
+        try:
+            await asyncio.wait_for(asyncio.gather(*(stage.join() for stage in self.stages)), timeout)
+        except asyncio.TimeoutError:
+            logging.warning(
+                f"Pipeline encerrado com itens pendentes: "
+                f"{', '.join(f'{stage.name}={stage.queue_depth()}' for stage in self.stages)}"
+            )
+        for stage in self.stages:
+            await stage.stop()
+
+    def get_stats(self):
+        return {stage.name: stage.get_stats() for stage in self.stages}
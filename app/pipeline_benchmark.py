@@ -0,0 +1,222 @@
+"""Benchmark do caminho de monitoramento sobre a rede e o webhook simulados
+
+Para cada quantidade de hosts: gera o histórico (dias de resultados com
+os RTTs da SimulatedNetwork) medindo linhas gravadas por segundo, roda um
+ciclo de testes completo (ProbeScheduler → NetworkTester → ResultPipeline →
+AlertManager → DiscordNotifier contra o WebhookSimulator) e mede as
+consultas dos relatórios. Tudo em um banco temporário. Uso:
+
+    python app/pipeline_benchmark.py --hosts 1000,10000 --days 30
+    python app/pipeline_benchmark.py --hosts 100000 --days 7 --history-interval 86400 --json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+from alert_manager import AlertManager
+from database import DatabaseManager
+from discord_notifier import DiscordNotifier
+from network_tests import NetworkTester
+from pipeline import ResultPipeline
+from probe_scheduler import ProbeScheduler
+from rtt_stats import summarize
+from simulated_network import SimulatedNetwork
+from webhook_simulator import WebhookSimulator
+
+def simulated_hosts(count):
+    return [{'name': f'sim-{i:06d}', 'ip': f'10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}'}
+            for i in range(count)]
+
+def peak_rss_mb():
+    # ru_maxrss em KB no Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def timed(function, *args, runs=3):
+    """Mediana do tempo de execução (s)"""
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function(*args)
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+def backfill(db, network, hosts, days, interval, ping_count, batch=5000):
+    """Grava o histórico simulado; retorna (linhas, segundos gastos gravando)"""
+    now = time.time()
+    start = now - days * 86400
+    rows = 0
+    write_time = 0.0
+    items = []
+
+    def write():
+        nonlocal write_time
+        began = time.perf_counter()
+        db.save_test_results(items)
+        write_time += time.perf_counter() - began
+        items.clear()
+
+    timestamp = start
+    while timestamp < now:
+        for host in hosts:
+            results = summarize(network.sample(host['ip'], ping_count, timestamp))
+            results['timestamp'] = timestamp
+            # A rota entra uma vez por dia em cada host, como o traceroute adaptativo
+            results['traceroute'] = []
+            if int(timestamp - start) % 86400 < interval:
+                results['traceroute'] = [{'ttl': ttl, 'ip': None if ip == '*' else ip, 'rtt': None}
+                                         for ttl, ip in enumerate(network.path(host['ip'], timestamp), 1)]
+            items.append((host, results))
+            rows += 1
+            if len(items) >= batch:
+                write()
+        timestamp += interval
+    if items:
+        write()
+    return rows, write_time
+
+def timed_queries(db, host_name, days, runs=3):
+    """Tempo das consultas dos relatórios"""
+    return {
+        'get_hourly_stats_1h': timed(db.get_hourly_stats, 1, runs=runs),
+        'get_hourly_stats_24h': timed(db.get_hourly_stats, 24, runs=runs),
+        'get_historical_data_24h': timed(db.get_historical_data, host_name, 24, runs=runs),
+        f'get_historical_data_{days}d': timed(db.get_historical_data, host_name, days * 24, runs=runs)
+    }
+
+async def run_cycle(db, config, webhook):
+    """Um ciclo completo de testes; retorna as medições do ciclo e da entrega"""
+    test_config = config['test_config']
+    notifier = DiscordNotifier(close_timeout=600)
+    notifier.webhook_url = webhook.url
+    tester = NetworkTester(config)
+    alerts = AlertManager(db, notifier, config)
+    pipeline = ResultPipeline(db, alerts, test_config)
+    scheduler = ProbeScheduler(test_config)
+
+    async def probe(host):
+        await pipeline.submit(host, await tester.test_host(host))
+
+    pipeline.start()
+    cycle = await scheduler.run_cycle(config['hosts'], probe)
+    start = time.perf_counter()
+    await pipeline.stop(timeout=600)
+    drain_time = time.perf_counter() - start
+    await tester.close()
+
+    start = time.perf_counter()
+    await notifier.close()
+    notify_time = time.perf_counter() - start
+    return {
+        'cycle_seconds': cycle['wall_time'],
+        'pipeline_drain_seconds': drain_time,
+        'writer': pipeline.get_stats()['writer'],
+        'discord_drain_seconds': notify_time,
+        'discord': notifier.get_stats()
+    }
+
+async def benchmark(count, args, db_dir):
+    hosts = simulated_hosts(count)
+    config = {
+        'hosts': hosts,
+        'test_config': {
+            'probe_backend': 'simulated',
+            'simulation_seed': args.seed,
+            'simulation_delay': not args.no_delay,
+            'simulation': {'outages_per_day': args.outages_per_day},
+            'ping_count': args.ping_count,
+            'ping_interval': args.ping_interval,
+            'timeout': 1,
+            'max_concurrent_probes': args.concurrency,
+            'max_concurrent_per_subnet': args.concurrency,
+            'traceroute_timeout': 1,
+            'alert_defaults': {'trigger_samples': 1}
+        }
+    }
+    # Sem cache: as consultas medidas vão sempre ao SQLite
+    db_path = os.path.join(db_dir, f'benchmark_{count}.db')
+    db = DatabaseManager(db_path=db_path, cache_size=0)
+    network = SimulatedNetwork(config, seed=args.seed)
+
+    rows, write_time = backfill(db, network, hosts, args.days, args.history_interval, args.ping_count)
+    result = {
+        'hosts': count,
+        'history_rows': rows,
+        'rows_per_second': rows / write_time if write_time else 0
+    }
+
+    webhook = WebhookSimulator(limit=args.webhook_limit, window=args.webhook_window,
+                               announce=not args.webhook_hide_limits)
+    await webhook.start()
+    try:
+        result.update(await run_cycle(db, config, webhook))
+    finally:
+        await webhook.stop()
+    result['webhook'] = dict(webhook.stats)
+
+    result['queries'] = timed_queries(db, hosts[0]['name'], args.days)
+    db.close()
+    # Mesmas consultas com o cache de leitura, depois de uma execução para aquecê-lo
+    cached_db = DatabaseManager(db_path=db_path)
+    timed_queries(cached_db, hosts[0]['name'], args.days, runs=1)
+    result['cached_queries'] = timed_queries(cached_db, hosts[0]['name'], args.days)
+    cached_db.close()
+    result['db_size_mb'] = os.path.getsize(db.db_path) / 1024 / 1024
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+def report(result):
+    print(f"\n{result['hosts']} hosts")
+    print(f"  histórico   {result['history_rows']} linhas, {result['rows_per_second']:.0f} linhas/s, "
+          f"banco {result['db_size_mb']:.1f} MB")
+    print(f"  ciclo       {result['cycle_seconds']:.2f} s, gravação pendente {result['pipeline_drain_seconds']:.2f} s "
+          f"(lotes {result['writer']['batches']}, latência média {result['writer']['avg_latency']:.2f} s)")
+    discord = result['discord']
+    print(f"  discord     {discord['embeds_sent']} embeds em {discord['messages_sent']} mensagens, "
+          f"{result['webhook']['rate_limited']} respostas 429, fila esvaziada em {result['discord_drain_seconds']:.2f} s")
+    for name, seconds in result['queries'].items():
+        cached = result['cached_queries'][name]
+        print(f"  {name:<26} {seconds * 1000:9.1f} ms  (com cache {cached * 1000:.2f} ms)")
+    print(f"  pico de RSS {result['peak_rss_mb']:.0f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do pipeline de monitoramento (rede simulada)')
+    parser.add_argument('--hosts', default='1000', help='quantidades de hosts, separadas por vírgula')
+    parser.add_argument('--days', type=int, default=30, help='dias de histórico')
+    parser.add_argument('--history-interval', type=int, default=3600,
+                        help='intervalo entre resultados do histórico (s)')
+    parser.add_argument('--ping-count', type=int, default=10)
+    parser.add_argument('--ping-interval', type=float, default=0.01)
+    parser.add_argument('--concurrency', type=int, default=1024, help='testes simultâneos')
+    parser.add_argument('--outages-per-day', type=float, default=2, help='quedas simuladas por host e dia')
+    parser.add_argument('--webhook-limit', type=int, default=5, help='mensagens por janela no webhook simulado')
+    parser.add_argument('--webhook-window', type=float, default=2.0)
+    parser.add_argument('--webhook-hide-limits', action='store_true',
+                        help='webhook sem cabeçalhos X-RateLimit-*: o limite só aparece como 429')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-delay', action='store_true', help='não esperar os RTTs simulados')
+    parser.add_argument('--db-dir', help='diretório dos bancos (padrão: temporário)')
+    parser.add_argument('--json', action='store_true', help='saída em JSON')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = [asyncio.run(benchmark(int(count), args, args.db_dir or tmp))
+                   for count in args.hosts.split(',')]
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        for result in results:
+            report(result)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+import asyncio
+import ipaddress
+import logging
+import time
+import zlib
+from collections import defaultdict
+
+from metrics import CYCLE_DURATION, CYCLE_OVERRUNS
+
+class ProbeScheduler:
+    """Executa os testes dos hosts em paralelo com limites de concorrência"""
+
+    def __init__(self, test_config):
+        self.configure(test_config)
+        self.last_cycle = {}
+        # Estado ao vivo do ciclo em andamento: hosts esperando vaga e em teste
+        self.queue_depth = 0
+        self.in_flight = 0
+
+    def configure(self, test_config):
+        """Aplica os limites do test_config; um ciclo em andamento usa os novos a partir daqui"""
+        self.max_concurrent = max(1, int(test_config.get('max_concurrent_probes', 64)))
+        self.max_per_subnet = max(1, int(test_config.get('max_concurrent_per_subnet', 8)))
+        self.subnet_prefix_v4 = int(test_config.get('subnet_prefix_length', 24))
+        self.subnet_prefix_v6 = int(test_config.get('subnet_prefix_length_v6', 64))
+        self.interval_seconds = test_config.get('test_interval_minutes', 5) * 60
+        # Espalha o início dos testes no ciclo; cada host mantém sempre o mesmo deslocamento
+        self.jitter_seconds = min(float(test_config.get('probe_jitter_seconds', 0)), self.interval_seconds / 2)
+
+    def subnet_key(self, host_ip):
+        """Retorna a sub-rede usada para limitar a concorrência do host"""
+        try:
+            address = ipaddress.ip_address(host_ip)
+        except ValueError:
+            # Nomes DNS não têm sub-rede conhecida; cada nome é um grupo
+            return host_ip
+
+        prefix = self.subnet_prefix_v4 if address.version == 4 else self.subnet_prefix_v6
+        return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+
+    def start_offset(self, host):
+        """Deslocamento fixo do host dentro do ciclo, derivado do nome"""
+        if not self.jitter_seconds:
+            return 0
+        return (zlib.crc32(host['name'].encode()) % 1000) / 1000 * self.jitter_seconds
+
+    async def run_cycle(self, hosts, probe):
+        """Executa probe(host) para todos os hosts e retorna as métricas do ciclo"""
+        start = time.monotonic()
+
+        global_slots = asyncio.Semaphore(self.max_concurrent)
+        subnet_slots = defaultdict(lambda: asyncio.Semaphore(self.max_per_subnet))
+
+        self.queue_depth = 0
+        self.in_flight = 0
+        state = {
+            'max_queue_depth': 0,
+            'max_in_flight': 0,
+            'total_wait': 0.0,
+            'max_wait': 0.0,
+            'completed': 0,
+            'failed': 0
+        }
+
+        async def worker(host):
+            await asyncio.sleep(self.start_offset(host))
+            enqueued = time.monotonic()
+            subnet = subnet_slots[self.subnet_key(host['ip'])]
+            self.queue_depth += 1
+            # Só conta a fila quando o host realmente vai esperar por uma vaga
+            if subnet.locked() or global_slots.locked():
+                state['max_queue_depth'] = max(state['max_queue_depth'], self.queue_depth)
+            # Sub-rede primeiro, para não ocupar uma vaga global enquanto espera
+            async with subnet:
+                async with global_slots:
+                    wait = time.monotonic() - enqueued
+                    state['total_wait'] += wait
+                    state['max_wait'] = max(state['max_wait'], wait)
+                    self.queue_depth -= 1
+                    self.in_flight += 1
+                    state['max_in_flight'] = max(state['max_in_flight'], self.in_flight)
+                    try:
+                        await probe(host)
+                        state['completed'] += 1
+                    except Exception as e:
+                        state['failed'] += 1
+                        logging.error(f"Erro não tratado no teste de {host['name']}: {e}")
+                    finally:
+                        self.in_flight -= 1
+
+        await asyncio.gather(*(worker(host) for host in hosts))
+
+        wall_time = time.monotonic() - start
+        self.last_cycle = {
+            'hosts': len(hosts),
+            'completed': state['completed'],
+            'failed': state['failed'],
+            'wall_time': wall_time,
+            'max_queue_depth': state['max_queue_depth'],
+            'max_in_flight': state['max_in_flight'],
+            'avg_queue_wait': state['total_wait'] / len(hosts) if hosts else 0,
+            'max_queue_wait': state['max_wait'],
+            'overrun': wall_time > self.interval_seconds
+        }
+
+        CYCLE_DURATION.observe(wall_time)
+        if self.last_cycle['overrun']:
+            CYCLE_OVERRUNS.inc()
+
+        logging.info(
+            f"Ciclo concluído: {len(hosts)} hosts em {wall_time:.1f}s "
+            f"(simultâneos máx: {state['max_in_flight']}, fila máx: {state['max_queue_depth']}, "
+            f"espera máx na fila: {state['max_wait']:.1f}s)"
+        )
+        if self.last_cycle['overrun']:
+            logging.warning(
+                f"Ciclo de testes ({wall_time:.1f}s) excedeu o intervalo de {self.interval_seconds}s"
+            )
+
+        return self.last_cycle
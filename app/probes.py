@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import random
+import socket
+import struct
+import time
+
+# Tipos de teste aceitos em host.probe_type; icmp é o ping do NetworkTester
+PROBE_TYPES = ('icmp', 'tcp', 'dns', 'http')
+DEFAULT_PROBE_TYPE = 'icmp'
+
+# Parâmetros padrão de cada tipo; no tcp a porta é obrigatória em host.probe
+PROBE_SETTINGS = {
+    'dns': {'port': 53, 'query': 'example.com', 'query_type': 'A'},
+    'http': {'port': 80, 'method': 'GET'}
+}
+
+# Parâmetros próprios dos testes TCP, DNS e HTTP (texto, exceto a porta)
+PROBE_OPTIONS = ('port', 'query', 'query_type', 'url', 'method')
+
+DNS_QUERY_TYPES = {'A': 1, 'NS': 2, 'CNAME': 5, 'SOA': 6, 'MX': 15, 'TXT': 16, 'AAAA': 28}
+# NOERROR e NXDOMAIN: o resolvedor respondeu; SERVFAIL, REFUSED etc. contam como falha
+DNS_OK_RCODES = (0, 3)
+
+def probe_type(host):
+    return host.get('probe_type', DEFAULT_PROBE_TYPE)
+
+async def resolve(loop, host):
+    """Resolve nomes DNS para um endereço IPv4"""
+    try:
+        socket.inet_aton(host)
+        return host
+    except OSError:
+        infos = await loop.getaddrinfo(host, None, family=socket.AF_INET)
+        return infos[0][4][0]
+
+class TcpProbe:
+    """Tempo do handshake TCP (SYN até o SYN-ACK) até host:port
+
+    A conexão é fechada com RST (SO_LINGER 0) logo após o handshake, então
+    os testes não acumulam sockets em TIME_WAIT.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+
+    async def measure(self, host_ip, settings):
+        """Retorna o tempo de conexão em ms, ou None se recusada ou sem resposta"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+        try:
+            sent = time.perf_counter()
+            await asyncio.wait_for(self.loop.sock_connect(sock, (host_ip, settings['port'])), settings['timeout'])
+            return (time.perf_counter() - sent) * 1000
+        except (OSError, asyncio.TimeoutError):
+            return None
+        finally:
+            sock.close()
+
+    async def close(self):
+        pass
+
+def build_dns_query(query_id, name, query_type):
+    """Mensagem DNS com uma pergunta e recursão pedida (RFC 1035)"""
+    header = struct.pack('!HHHHHH', query_id, 0x0100, 1, 0, 0, 0)
+    labels = b''.join(bytes([len(part)]) + part.encode('idna') for part in name.strip('.').split('.') if part)
+    return header + labels + b'\x00' + struct.pack('!HH', DNS_QUERY_TYPES[query_type], 1)
+
+class DnsProbe:
+    """Tempo de resposta do host como resolvedor DNS, sem dig
+
+    Um único socket UDP não bloqueante para todos os hosts; as respostas
+    são casadas com as consultas pelo endereço de origem e pelo id da
+    mensagem, como os echos no AsyncICMPProber.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.sock.bind(('0.0.0.0', 0))
+        # (ip, id da consulta) -> future resolvido com (instante, rcode)
+        self.pending = {}
+        self.loop.add_reader(self.sock.fileno(), self.on_readable)
+
+    def on_readable(self):
+        while True:
+            try:
+                data, (address, _) = self.sock.recvfrom(4096)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                logging.debug(f"Erro ao ler socket DNS: {e}")
+                return
+            received = time.perf_counter()
+            if len(data) < 12:
+                continue
+            query_id, flags = struct.unpack('!HH', data[:4])
+            future = self.pending.get((address, query_id))
+            # Só respostas (bit QR) a consultas pendentes
+            if future is not None and flags & 0x8000 and not future.done():
+                future.set_result((received, flags & 0x000f))
+
+    def new_id(self, host_ip):
+        while True:
+            query_id = random.getrandbits(16)
+            if (host_ip, query_id) not in self.pending:
+                return query_id
+
+    async def measure(self, host_ip, settings):
+        """Retorna o tempo da resposta em ms, ou None sem resposta ou com erro do servidor"""
+        query_id = self.new_id(host_ip)
+        key = (host_ip, query_id)
+        future = self.loop.create_future()
+        self.pending[key] = future
+        packet = build_dns_query(query_id, settings['query'], settings['query_type'])
+        try:
+            sent = time.perf_counter()
+            try:
+                self.sock.sendto(packet, (host_ip, settings['port']))
+            except OSError as e:
+                logging.debug(f"Erro ao enviar consulta DNS para {host_ip}: {e}")
+                return None
+            try:
+                received, rcode = await asyncio.wait_for(future, settings['timeout'])
+            except asyncio.TimeoutError:
+                return None
+            if rcode not in DNS_OK_RCODES:
+                return None
+            return (received - sent) * 1000
+        finally:
+            self.pending.pop(key, None)
+
+    async def close(self):
+        """Libera o socket e cancela consultas pendentes"""
+        if not self.loop.is_closed():
+            self.loop.remove_reader(self.sock.fileno())
+        for future in self.pending.values():
+            if not future.done():
+                future.cancel()
+        self.pending.clear()
+        self.sock.close()
+
+class HttpProbe:
+    """Tempo até o primeiro byte (cabeçalhos da resposta) de uma requisição HTTP
+
+    Uma sessão aiohttp compartilhada por todos os hosts mantém as conexões
+    abertas entre as requisições (keep-alive), então só a primeira de cada
+    host paga o handshake TCP/TLS. Respostas 4xx/5xx contam como falha.
+    """
+
+    def __init__(self, loop, max_connections=100):
+        import aiohttp
+
+        self.loop = loop
+        self.aiohttp = aiohttp
+        self.connector = aiohttp.TCPConnector(limit=max_connections, ttl_dns_cache=300)
+        self.session = aiohttp.ClientSession(connector=self.connector, headers={'User-Agent': 'network-monitor'})
+
+    async def measure(self, host_ip, settings):
+        """Retorna o tempo até a resposta em ms, ou None em erro, timeout ou status >= 400"""
+        url = settings.get('url') or f"http://{host_ip}:{settings['port']}/"
+        timeout = self.aiohttp.ClientTimeout(total=settings['timeout'])
+        try:
+            sent = time.perf_counter()
+            async with self.session.request(settings['method'], url, timeout=timeout,
+                                            allow_redirects=False) as response:
+                ttfb = (time.perf_counter() - sent) * 1000
+                # Lê o corpo para a conexão voltar ao pool
+                await response.read()
+            if response.status >= 400:
+                return None
+            return ttfb
+        except (self.aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            logging.debug(f"Erro na requisição HTTP para {url}: {e}")
+            return None
+
+    async def close(self):
+        """Fecha a sessão e as conexões do pool"""
+        if self.loop.is_closed():
+            # O loop da sessão já terminou e levou os sockets junto: só solta a sessão
+            self.session.detach()
+            return
+        await self.session.close()
+
+class SimulatedProbe:
+    """Qualquer tipo de teste respondido pela rede simulada (probe_backend = "simulated")"""
+
+    def __init__(self, prober):
+        self.loop = prober.loop
+        self.prober = prober
+
+    async def measure(self, host_ip, settings):
+        return await self.prober.echo(host_ip, settings['timeout'])
+
+    async def close(self):
+        pass
+
+PROBE_CLASSES = {
+    'tcp': TcpProbe,
+    'dns': DnsProbe,
+    'http': HttpProbe
+}
@@ -0,0 +1,433 @@
+import asyncio
+import base64
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from database import plan_problems
+from migrations import ROLLUP_GRANULARITIES, PARTITION_SECONDS, list_partitions, partition_start
+
+# Colunas de test_results devolvidas pelo histórico e pela exportação
+RESULT_FIELDS = ('packet_loss', 'avg_latency', 'min_latency', 'max_latency', 'jitter', 'is_available',
+                 'successful_pings', 'total_pings', 'p50_latency', 'p95_latency', 'p99_latency',
+                 'ipdv_jitter', 'loss_bursts', 'max_loss_burst', 'mos')
+
+MAX_PAGE_LIMIT = 10000
+# Linhas lidas por consulta durante a exportação em streaming
+EXPORT_CHUNK = 5000
+
+class ReadOnlyPool:
+    """Conexões somente leitura ao banco em WAL, fora do lock do DatabaseManager
+
+    Em WAL leitores não bloqueiam o escritor nem esperam por ele; cada
+    consulta enxerga o último commit anterior ao seu início.
+    """
+
+    def __init__(self, db_path, size=4):
+        self.db_path = db_path
+        self.size = size
+        self.idle = queue.LifoQueue()
+        self.created = 0
+        self.lock = threading.Lock()
+
+    def connect(self):
+        conn = sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True, timeout=30, check_same_thread=False)
+        conn.execute('PRAGMA query_only = ON')
+        return conn
+
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            if self.created < self.size:
+                self.created += 1
+                return self.connect()
+        return self.idle.get()
+
+    def run(self, function, *args):
+        """Executa function(conn, *args) com uma conexão do pool (chamar fora do event loop)"""
+        conn = self.acquire()
+        try:
+            return function(conn, *args)
+        finally:
+            self.idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+class BadRequest(ValueError):
+    """Parâmetro inválido na requisição (resposta 400)"""
+
+class HostNotFound(LookupError):
+    """Host pedido não existe no banco (resposta 404)"""
+
+def parse_time(value, default):
+    """Epoch em segundos ou data ISO 8601"""
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise BadRequest(f"data inválida: {value}")
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def decode_cursor(cursor):
+    """Chave (tempo, host_id) da última linha da página anterior"""
+    if not cursor:
+        return None
+    try:
+        timestamp, host_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(timestamp), int(host_id)
+    except (ValueError, TypeError):
+        raise BadRequest("cursor inválido")
+
+def result_tables(conn, start, end):
+    """Tabelas com resultados em [start, end), em ordem cronológica
+
+    test_results só tem os dados anteriores ao particionamento, então vem
+    antes das partições diárias, que não se sobrepõem.
+    """
+    tables = ['test_results']
+    for name in list_partitions(conn):
+        day_start = partition_start(name)
+        if day_start + PARTITION_SECONDS > start and day_start < end:
+            tables.append(name)
+    return tables
+
+def host_ids(conn, host_name):
+    ids = [row[0] for row in conn.execute('SELECT id FROM hosts WHERE name = ?', (host_name,))]
+    if not ids:
+        raise HostNotFound(host_name)
+    return ids
+
+def host_filter(host_count):
+    """Filtro por host_id com host_count parâmetros, vazio sem filtro"""
+    if not host_count:
+        return ''
+    return f"AND r.host_id IN ({', '.join('?' * host_count)})"
+
+def results_page_query(table, host_count=0):
+    """Consulta de uma página de resultados da tabela a partir da chave (timestamp, host_id)"""
+    columns = ', '.join(f'r.{field}' for field in RESULT_FIELDS)
+    return f'''
+        SELECT r.timestamp, r.host_id, h.name, {columns}
+        FROM {table} r
+        JOIN hosts h ON h.id = r.host_id
+        WHERE r.timestamp >= ? AND r.timestamp < ? {host_filter(host_count)}
+          AND (r.timestamp > ? OR (r.timestamp = ? AND r.host_id > ?))
+        ORDER BY r.timestamp, r.host_id
+        LIMIT ?
+    '''
+
+def rollups_page_query(granularity, host_count=0):
+    """Consulta de uma página de agregações a partir da chave (bucket, host_id)"""
+    return f'''
+        SELECT r.bucket, r.host_id, h.name, r.samples, r.available, r.latency_sum, r.latency_sumsq,
+               r.latency_min, r.latency_max, r.loss_sum, r.jitter_sum
+        FROM rollup_{granularity} r
+        JOIN hosts h ON h.id = r.host_id
+        WHERE r.bucket >= ? AND r.bucket < ? {host_filter(host_count)}
+          AND (r.bucket > ? OR (r.bucket = ? AND r.host_id > ?))
+        ORDER BY r.bucket, r.host_id
+        LIMIT ?
+    '''
+
+def status_query(table):
+    """Último resultado de cada host na tabela, uma busca no índice (host_id, timestamp) por host"""
+    return f'''
+        SELECT h.name, h.ip, h.probe_type, r.timestamp, r.packet_loss, r.avg_latency, r.jitter,
+               r.is_available, r.p95_latency, r.mos
+        FROM hosts h
+        JOIN {table} r ON r.id = (
+            SELECT id FROM {table} WHERE host_id = h.id ORDER BY timestamp DESC LIMIT 1
+        )
+        ORDER BY h.name
+    '''
+
+STATUS_ALERT_QUERY = '''
+    SELECT h.name, a.state, a.since, a.flapping
+    FROM alert_state a
+    JOIN hosts h ON h.id = a.host_id
+'''
+
+def results_page(conn, start, end, limit, after=None, host_name=None):
+    """Página de resultados ordenada por (timestamp, host_id), a partir da chave after
+
+    Cada tabela é lida pelo índice de tempo (ou de host e tempo) só a partir
+    da chave, então o custo de uma página não depende de quantas já foram lidas.
+    """
+    params = ()
+    if host_name is not None:
+        params = tuple(host_ids(conn, host_name))
+
+    after_time, after_host = after if after else (start, -1)
+    rows = []
+    for table in result_tables(conn, max(start, after_time), end):
+        cursor = conn.execute(
+            results_page_query(table, len(params)),
+            (max(start, after_time), end) + params + (after_time, after_time, after_host, limit - len(rows))
+        )
+        rows.extend(cursor)
+        if len(rows) >= limit:
+            break
+
+    items = [dict(zip(('timestamp', 'host_id', 'host_name') + RESULT_FIELDS, row)) for row in rows]
+    next_key = (rows[-1][0], rows[-1][1]) if len(rows) >= limit else None
+    return items, next_key
+
+def rollups_page(conn, granularity, start, end, limit, after=None, host_name=None):
+    """Página de agregações (minute/hour/day) ordenada por (bucket, host_id)"""
+    if granularity not in dict(ROLLUP_GRANULARITIES):
+        raise BadRequest(f"granularidade inválida: {granularity}")
+
+    params = ()
+    if host_name is not None:
+        params = tuple(host_ids(conn, host_name))
+
+    after_bucket, after_host = after if after else (start, -1)
+    cursor = conn.execute(
+        rollups_page_query(granularity, len(params)),
+        (max(start, after_bucket), end) + params + (after_bucket, after_bucket, after_host, limit)
+    )
+    rows = cursor.fetchall()
+
+    items = []
+    for bucket, host_id, name, samples, available, latency_sum, latency_sumsq, \
+            latency_min, latency_max, loss_sum, jitter_sum in rows:
+        mean = latency_sum / samples
+        items.append({
+            'bucket': bucket,
+            'host_id': host_id,
+            'host_name': name,
+            'samples': samples,
+            'availability': available * 100.0 / samples,
+            'avg_latency': mean,
+            'latency_stdev': max(0.0, latency_sumsq / samples - mean * mean) ** 0.5,
+            'min_latency': latency_min,
+            'max_latency': latency_max,
+            'packet_loss': loss_sum / samples,
+            'jitter': jitter_sum / samples
+        })
+    next_key = (rows[-1][0], rows[-1][1]) if len(rows) >= limit else None
+    return items, next_key
+
+def latest_status(conn):
+    """Último resultado e estado de alerta de cada host
+
+    Lê só as duas partições mais novas (hoje e ontem, em UTC), com uma busca
+    no índice (host_id, timestamp) por host em vez de percorrer o dia inteiro.
+    """
+    tables = (list_partitions(conn)[-2:] or ['test_results'])[::-1]
+    latest = {}
+    for table in tables:
+        for row in conn.execute(status_query(table)):
+            if row[0] not in latest:
+                latest[row[0]] = dict(zip(('host_name', 'host_ip', 'probe_type', 'timestamp', 'packet_loss',
+                                           'avg_latency', 'jitter', 'is_available', 'p95_latency', 'mos'), row))
+
+    for name, state, since, flapping in conn.execute(STATUS_ALERT_QUERY):
+        if name in latest:
+            latest[name].update(alert_state=state, alert_since=since, flapping=bool(flapping))
+    return sorted(latest.values(), key=lambda status: status['host_name'])
+
+def check_query_plans(conn):
+    """Verifica no EXPLAIN QUERY PLAN as consultas da API, como DatabaseManager.check_query_plans
+
+    Usa a partição mais nova (ou test_results, antes do particionamento).
+    Retorna {consulta: problemas encontrados}; vazio se tudo ok.
+    """
+    table = (list_partitions(conn)[-1:] or ['test_results'])[0]
+    now = time.time()
+    page = (now - 86400, now, now - 86400, now - 86400, -1, 100)
+    host_page = page[:2] + (1,) + page[2:]
+    # consulta -> (sql e parâmetros, trechos obrigatórios no plano, trechos proibidos);
+    # o plano mostra o apelido e não a tabela, então 'SCAN r' entra nos proibidos
+    expectations = {
+        'history': ((results_page_query(table), page),
+                    ['SEARCH r USING INDEX', 'SEARCH h USING INTEGER PRIMARY KEY'],
+                    ['SCAN r', 'TEMP B-TREE FOR ORDER BY']),
+        'history_host': ((results_page_query(table, 1), host_page),
+                         ['_host_time (host_id=? AND timestamp>? AND timestamp<?)'], ['SCAN r', 'TEMP B-TREE']),
+        'status': ((status_query(table), ()),
+                   ['SCAN h USING COVERING INDEX', 'SEARCH r USING INTEGER PRIMARY KEY', '_host_time (host_id=?)'],
+                   ['SCAN r', 'TEMP B-TREE']),
+        'status_alerts': ((STATUS_ALERT_QUERY, ()), ['SEARCH h USING INTEGER PRIMARY KEY'], []),
+    }
+    for granularity, _ in ROLLUP_GRANULARITIES:
+        expectations[f'rollups_{granularity}'] = (
+            (rollups_page_query(granularity), page),
+            [f'SEARCH r USING INDEX idx_rollup_{granularity}_bucket'], ['SCAN r', 'TEMP B-TREE FOR ORDER BY'])
+        expectations[f'rollups_{granularity}_host'] = (
+            (rollups_page_query(granularity, 1), host_page),
+            ['(host_id=? AND bucket>? AND bucket<?)'], ['SCAN r', 'TEMP B-TREE'])
+    return plan_problems(conn, expectations)
+
+class QueryAPI:
+    """API HTTP somente leitura (JSON) sobre o banco de resultados
+
+    GET /api/status                        último resultado e alerta de cada host
+    GET /api/hosts/{nome}/history          resultados do host, paginados
+    GET /api/rollups?granularity=hour      agregações por minuto, hora ou dia, paginadas
+    GET /api/sla?days=30                   SLA de cada host contra o sla_target
+    GET /api/export                        resultados em NDJSON, em streaming
+
+    Parâmetros: start/end (epoch ou ISO 8601), host, limit e cursor (o
+    "next" da página anterior). As consultas usam o ReadOnlyPool e nunca
+    o lock do DatabaseManager.
+    """
+
+    def __init__(self, db, config, host='0.0.0.0', port=8080, pool_size=4, page_limit=1000):
+        self.db = db
+        self.config = config
+        self.host = host
+        self.port = port
+        self.page_limit = page_limit
+        self.pool = ReadOnlyPool(db.db_path, pool_size)
+        self.runner = None
+
+    async def query(self, function, *args):
+        return await asyncio.to_thread(self.pool.run, function, *args)
+
+    def window(self, request, default_hours=24):
+        now = time.time()
+        end = parse_time(request.query.get('end'), now)
+        start = parse_time(request.query.get('start'), end - default_hours * 3600)
+        if start >= end:
+            raise BadRequest("start deve ser anterior a end")
+        return start, end
+
+    def limit(self, request):
+        try:
+            limit = int(request.query.get('limit', self.page_limit))
+        except ValueError:
+            raise BadRequest("limit inválido")
+        return max(1, min(limit, MAX_PAGE_LIMIT))
+
+    @staticmethod
+    def page(items, next_key):
+        return {'items': items, 'next': encode_cursor(next_key) if next_key else None}
+
+    async def handle_status(self, request):
+        return await self.query(latest_status)
+
+    async def handle_history(self, request):
+        start, end = self.window(request)
+        items, next_key = await self.query(
+            results_page, start, end, self.limit(request),
+            decode_cursor(request.query.get('cursor')), request.match_info['name']
+        )
+        return self.page(items, next_key)
+
+    async def handle_rollups(self, request):
+        start, end = self.window(request, default_hours=24 * 7)
+        items, next_key = await self.query(
+            rollups_page, request.query.get('granularity', 'hour'), start, end, self.limit(request),
+            decode_cursor(request.query.get('cursor')), request.query.get('host')
+        )
+        return self.page(items, next_key)
+
+    async def handle_sla(self, request):
+        try:
+            days = float(request.query.get('days', self.config['test_config'].get('sla_period_days', 30)))
+        except ValueError:
+            raise BadRequest("days inválido")
+
+        def sla(conn):
+            return conn.execute(*self.db.window_query(time.time() - days * 86400, conn=conn)).fetchall()
+
+        targets = {host['name']: host.get('sla_target') for host in self.config['hosts']}
+        report = []
+        for name, ip, samples, available, *_ in await self.query(sla):
+            value = available * 100.0 / samples if samples else 0
+            target = targets.get(name)
+            report.append({
+                'host_name': name,
+                'host_ip': ip,
+                'samples': samples,
+                'sla': value,
+                'sla_target': target,
+                'sla_met': target is None or value >= target
+            })
+        return {'period_days': days, 'hosts': report}
+
+    async def handle_export(self, request):
+        """NDJSON em streaming: uma consulta por bloco de linhas, sem montar o período em memória"""
+        from aiohttp import web
+        start, end = self.window(request)
+        host_name = request.query.get('host')
+        after = decode_cursor(request.query.get('cursor'))
+
+        # Valida o host antes de começar a resposta
+        items, after = await self.query(results_page, start, end, EXPORT_CHUNK, after, host_name)
+
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+        try:
+            while True:
+                await response.write(''.join(json.dumps(item) + '\n' for item in items).encode())
+                if after is None:
+                    break
+                items, after = await self.query(results_page, start, end, EXPORT_CHUNK, after, host_name)
+        except sqlite3.Error as e:
+            # Cabeçalhos já enviados: não cabe mais uma resposta de erro. A conexão
+            # é fechada sem o fim do chunked, e o cliente vê a exportação truncada
+            logging.error(f"Exportação interrompida ({request.path}): {e}")
+            request.transport.close()
+            return response
+        await response.write_eof()
+        return response
+
+    def route(self, handler):
+        """Converte o retorno em JSON e os erros em respostas 400/404/500"""
+        from aiohttp import web
+
+        async def wrapped(request):
+            try:
+                result = await handler(request)
+            except BadRequest as e:
+                return web.json_response({'error': str(e)}, status=400)
+            except HostNotFound as e:
+                return web.json_response({'error': f"host não encontrado: {e.args[0]}"}, status=404)
+            except sqlite3.Error as e:
+                logging.error(f"Erro na consulta da API ({request.path}): {e}")
+                return web.json_response({'error': 'erro ao consultar o banco'}, status=500)
+            if isinstance(result, web.StreamResponse):
+                return result
+            return web.json_response(result)
+        return wrapped
+
+    async def start(self):
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get('/api/status', self.route(self.handle_status))
+        app.router.add_get('/api/hosts/{name}/history', self.route(self.handle_history))
+        app.router.add_get('/api/rollups', self.route(self.handle_rollups))
+        app.router.add_get('/api/sla', self.route(self.handle_sla))
+        app.router.add_get('/api/export', self.route(self.handle_export))
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        logging.info(f"API de consulta disponível em http://{self.host}:{self.port}/api")
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+        self.pool.close()
@@ -0,0 +1,53 @@
+from collections import OrderedDict
+
+# Marca de ausência (None é um resultado válido)
+MISSING = object()
+
+class QueryCache:
+    """LRU dos resultados de leitura do DatabaseManager
+
+    Todas as entradas valem para uma versão dos dados; quando a versão
+    muda (gravação ou remoção em qualquer conexão) o cache inteiro é
+    descartado, então um resultado antigo nunca é devolvido. Sem lock
+    próprio: usado sempre com o lock do DatabaseManager.
+    """
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.version = None
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'invalidations': 0
+        }
+
+    def get(self, key, version):
+        if version != self.version:
+            if self.entries:
+                self.stats['invalidations'] += 1
+            self.entries.clear()
+            self.version = version
+
+        value = self.entries.get(key, MISSING)
+        if value is MISSING:
+            self.stats['misses'] += 1
+        else:
+            self.stats['hits'] += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.version = None
+
+    def get_stats(self):
+        return dict(self.stats, entries=len(self.entries))
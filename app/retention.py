@@ -0,0 +1,58 @@
+import asyncio
+import logging
+import time
+
+from archive import PartitionArchiver
+
+class RetentionManager:
+    """Executa a retenção de dados em passos curtos, sem travar o event loop"""
+
+    def __init__(self, db, test_config):
+        self.db = db
+        self.days_to_keep = test_config.get('retention_days', 30)
+        self.rollup_days_to_keep = test_config.get('rollup_retention_days', 400)
+        self.chunk_size = test_config.get('retention_chunk_size', 5000)
+        # Pausa entre lotes para gravações e leituras pegarem o lock
+        self.pause = test_config.get('retention_pause_seconds', 0.05)
+        # Partições expiradas vão para arquivos compactados antes de sair do banco
+        self.archiver = None
+        if test_config.get('archive_enabled', False):
+            self.archiver = PartitionArchiver(
+                test_config.get('archive_dir', '/app/data/archive'),
+                fmt=test_config.get('archive_format', 'parquet'),
+                compression=test_config.get('archive_compression', 'zstd'),
+                chunk_size=test_config.get('archive_chunk_size', 50000)
+            )
+        self.last_report = None
+
+    async def run(self):
+        """Remove dados expirados e retorna o relatório da execução"""
+        logging.info("Iniciando retenção de dados...")
+        start = time.monotonic()
+
+        steps = self.db.iter_retention(self.days_to_keep, self.rollup_days_to_keep, self.chunk_size,
+                                       archiver=self.archiver)
+        report = None
+        try:
+            while True:
+                # Cada passo roda em uma thread; o loop segue atendendo os testes
+                step = await asyncio.to_thread(next, steps, None)
+                if step is None:
+                    break
+                report = step
+                await asyncio.sleep(self.pause)
+        except Exception as e:
+            logging.error(f"Erro na retenção de dados: {e}")
+            return None
+
+        report = dict(report or {}, duration=time.monotonic() - start)
+        self.last_report = report
+
+        logging.info(
+            f"Retenção concluída em {report['duration']:.1f}s: "
+            f"{report.get('rows_deleted', 0)} registros removidos, "
+            f"{report.get('partitions_dropped', 0)} partições descartadas "
+            f"({report.get('partitions_archived', 0)} arquivadas), "
+            f"{report.get('bytes_reclaimed', 0) / 1048576:.1f} MB liberados"
+        )
+        return report
@@ -0,0 +1,121 @@
+import numpy as np
+
+# Limites dos buckets do histograma de latência (ms): escala logarítmica de
+# 0,1 ms a 10 s, com ~6% de erro relativo nos percentis estimados
+HISTOGRAM_EDGES = np.geomspace(0.1, 10000, 201)
+# Um bucket abaixo do primeiro limite e um acima do último
+HISTOGRAM_BUCKETS = len(HISTOGRAM_EDGES) + 1
+
+PERCENTILES = (50, 95, 99)
+
+def pack_rtts(rtts):
+    """Converte os RTTs (None para perdas) em blob float32, com NaN nas perdas"""
+    return np.array([np.nan if rtt is None else rtt for rtt in rtts], dtype=np.float32).tobytes()
+
+def unpack_rtts(blob):
+    """Vetor float32 de RTTs gravado por pack_rtts"""
+    return np.frombuffer(blob, dtype=np.float32)
+
+def rfc3550_jitter(received):
+    """Jitter entre chegadas da RFC 3550: J += (|D| - J) / 16, sem laço em Python
+
+    Com J0 = 0 o filtro é a soma de |D_k| ponderada por (1/16)(15/16)^(n-k).
+    """
+    if len(received) < 2:
+        return 0.0
+    deltas = np.abs(np.diff(received))
+    weights = (1 / 16) * (15 / 16) ** np.arange(len(deltas) - 1, -1, -1)
+    return float(np.dot(weights, deltas))
+
+def loss_bursts(lost):
+    """Quantidade de rajadas de perda e tamanho da maior, a partir da máscara de perdas"""
+    if not lost.any():
+        return 0, 0
+    # Início e fim de cada sequência de True
+    edges = np.diff(np.concatenate(([0], lost.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return len(starts), int((ends - starts).max())
+
+def mos_score(latency, jitter, loss):
+    """MOS estimado pelo E-model simplificado (ITU-T G.107) para voz"""
+    effective = latency + 2 * jitter + 10
+    if effective < 160:
+        r = 93.2 - effective / 40
+    else:
+        r = 93.2 - (effective - 120) / 10
+    r -= 2.5 * loss
+    if r <= 0:
+        return 1.0
+    return float(min(4.5, 1 + 0.035 * r + 7e-6 * r * (r - 60) * (100 - r)))
+
+def summarize(rtts):
+    """Estatísticas do teste a partir dos RTTs na ordem de envio (None = perdido)"""
+    samples = np.array([np.nan if rtt is None else rtt for rtt in rtts], dtype=np.float64)
+    lost = np.isnan(samples)
+    received = samples[~lost]
+    bursts, max_burst = loss_bursts(lost)
+    packet_loss = lost.mean() * 100 if len(samples) else 100
+
+    summary = {
+        'rtts': pack_rtts(rtts),
+        'packet_loss': float(packet_loss),
+        'successful_pings': int(len(received)),
+        'total_pings': int(len(samples)),
+        'loss_bursts': bursts,
+        'max_loss_burst': max_burst,
+        'is_available': bool(len(received))
+    }
+
+    if len(received):
+        p50, p95, p99 = np.percentile(received, PERCENTILES)
+        ipdv = rfc3550_jitter(received)
+        summary.update(
+            avg_latency=float(received.mean()),
+            min_latency=float(received.min()),
+            max_latency=float(received.max()),
+            jitter=float(received.std(ddof=1)) if len(received) > 1 else 0.0,
+            p50_latency=float(p50),
+            p95_latency=float(p95),
+            p99_latency=float(p99),
+            ipdv_jitter=ipdv,
+            mos=mos_score(float(received.mean()), ipdv, packet_loss)
+        )
+    else:
+        summary.update(
+            avg_latency=0, min_latency=0, max_latency=0, jitter=0,
+            p50_latency=None, p95_latency=None, p99_latency=None,
+            ipdv_jitter=None, mos=None
+        )
+    return summary
+
+def histogram(rtts):
+    """Contagem dos RTTs recebidos em cada bucket de HISTOGRAM_EDGES"""
+    received = rtts[~np.isnan(rtts)]
+    return np.bincount(np.searchsorted(HISTOGRAM_EDGES, received), minlength=HISTOGRAM_BUCKETS)
+
+def encode_histogram(counts):
+    """Blob esparso: índices (uint16) e contagens (uint32) dos buckets não vazios"""
+    nonzero = np.flatnonzero(counts)
+    return nonzero.astype(np.uint16).tobytes() + counts[nonzero].astype(np.uint32).tobytes()
+
+def decode_histogram(blob):
+    """Histograma completo a partir do blob de encode_histogram"""
+    size = len(blob) // 6
+    counts = np.zeros(HISTOGRAM_BUCKETS, dtype=np.int64)
+    counts[np.frombuffer(blob[:size * 2], dtype=np.uint16)] = np.frombuffer(blob[size * 2:], dtype=np.uint32)
+    return counts
+
+def histogram_percentiles(counts, percentiles=PERCENTILES):
+    """Percentis estimados de um histograma (ou da soma de vários)
+
+    O valor é o centro geométrico do bucket onde o percentil cai.
+    """
+    total = counts.sum()
+    if not total:
+        return {p: None for p in percentiles}
+
+    edges = np.concatenate(([HISTOGRAM_EDGES[0]], HISTOGRAM_EDGES, [HISTOGRAM_EDGES[-1]]))
+    centers = np.sqrt(edges[:-1] * edges[1:])
+    positions = np.searchsorted(np.cumsum(counts), np.array(percentiles) / 100 * total)
+    return {p: float(centers[min(i, HISTOGRAM_BUCKETS - 1)]) for p, i in zip(percentiles, positions)}
@@ -0,0 +1,118 @@
+import bisect
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+
+def ring_hash(key):
+    return int(hashlib.md5(key.encode()).hexdigest()[:16], 16)
+
+class HashRing:
+    """Hash consistente: cada worker ocupa replicas pontos do anel
+
+    Quando um worker entra ou sai, só os hosts dos pontos dele mudam de dono.
+    """
+
+    def __init__(self, workers, replicas=100):
+        self.workers = sorted(workers)
+        points = sorted((ring_hash(f'{worker}#{i}'), worker) for worker in self.workers for i in range(replicas))
+        self.hashes = [point for point, _ in points]
+        self.owners = [worker for _, worker in points]
+
+    def owner(self, key):
+        if not self.owners:
+            return None
+        i = bisect.bisect(self.hashes, ring_hash(key)) % len(self.hashes)
+        return self.owners[i]
+
+class LeaseCoordinator:
+    """Membros ativos registrados na tabela worker_leases do banco compartilhado
+
+    Cada worker renova o próprio lease periodicamente; quem não renova
+    até expires sai da lista na próxima renovação de qualquer outro.
+    """
+
+    def __init__(self, db_path, worker_id, ttl=30):
+        self.worker_id = worker_id
+        self.ttl = ttl
+        # Conexão própria, em autocommit, para não disputar o lock do DatabaseManager
+        self.conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+
+    def heartbeat(self):
+        """Renova o lease e retorna os workers ativos [(worker_id, started)]"""
+        now = time.time()
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            self.conn.execute('''
+                INSERT INTO worker_leases (worker_id, pid, started, expires) VALUES (?, ?, ?, ?)
+                ON CONFLICT (worker_id) DO UPDATE SET pid = excluded.pid, expires = excluded.expires
+            ''', (self.worker_id, os.getpid(), now, now + self.ttl))
+            self.conn.execute('DELETE FROM worker_leases WHERE expires < ?', (now,))
+            workers = self.conn.execute(
+                'SELECT worker_id, started FROM worker_leases ORDER BY started, worker_id'
+            ).fetchall()
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        return workers
+
+    def release(self):
+        """Libera o lease ao encerrar, para os outros assumirem os hosts sem esperar o ttl"""
+        self.conn.execute('DELETE FROM worker_leases WHERE worker_id = ?', (self.worker_id,))
+
+    def close(self):
+        self.conn.close()
+
+class ShardMembership:
+    """Parte dos hosts que cabe a este worker e se ele é o líder
+
+    Sem worker_id o monitor roda sozinho: testa todos os hosts e é líder.
+    O líder (lease mais antigo) gera os relatórios e roda a retenção.
+    """
+
+    def __init__(self, db_path, worker_id=None, test_config=None):
+        test_config = test_config or {}
+        self.worker_id = worker_id
+        self.replicas = test_config.get('shard_replicas', 100)
+        self.coordinator = None
+        if worker_id is not None:
+            self.coordinator = LeaseCoordinator(db_path, worker_id, test_config.get('shard_lease_ttl_seconds', 30))
+        self.workers = [worker_id]
+        self.ring = HashRing(self.workers, self.replicas)
+        self.is_leader = True
+
+    @property
+    def enabled(self):
+        return self.coordinator is not None
+
+    def refresh(self):
+        """Renova o lease; retorna True se os workers ativos mudaram (chamar fora do event loop)"""
+        if not self.enabled:
+            return False
+
+        active = self.coordinator.heartbeat()
+        workers = sorted(worker for worker, _ in active)
+        self.is_leader = bool(active) and active[0][0] == self.worker_id
+        if workers == self.workers:
+            return False
+
+        logging.info(
+            f"Workers ativos: {', '.join(workers)} ({self.worker_id}"
+            f"{', líder' if self.is_leader else ''}); redistribuindo hosts"
+        )
+        self.workers = workers
+        self.ring = HashRing(workers, self.replicas)
+        return True
+
+    def owns(self, host):
+        return not self.enabled or self.ring.owner(host['name']) == self.worker_id
+
+    def close(self):
+        if self.enabled:
+            try:
+                self.coordinator.release()
+            except sqlite3.Error as e:
+                logging.error(f"Erro ao liberar lease do worker {self.worker_id}: {e}")
+            self.coordinator.close()
@@ -0,0 +1,185 @@
+import asyncio
+import math
+import random
+import time
+import zlib
+
+# Perfil usado quando nem o host nem test_config.simulation definem o parâmetro;
+# rtt_ms, jitter_ms e hops, se ausentes, saem do hash do IP
+DEFAULT_PROFILE = {
+    # normal, lognormal ou uniform
+    'distribution': 'lognormal',
+    'rtt_ms': None,
+    'jitter_ms': None,
+    # Perda independente por pacote (%)
+    'loss': 0.5,
+    # Quedas aleatórias: média por dia e duração de cada uma
+    'outages_per_day': 0,
+    'outage_minutes': 5,
+    # Quedas fixas: [[início (epoch), duração (s)], ...]
+    'outages': [],
+    'hops': None,
+    # A rota muda a cada tantas horas (0 = nunca)
+    'path_change_hours': 0,
+    # Fração de roteadores intermediários que não respondem ao traceroute
+    'silent_hop_ratio': 0.1
+}
+
+class SimulatedNetwork:
+    """Rede simulada determinística para testes e benchmarks sem ICMP
+
+    O mesmo seed gera sempre as mesmas amostras: cada RTT depende só de
+    (seed, IP, chave da amostra) e cada queda e rota, de (seed, IP, janela
+    de tempo). Parâmetros por host em host.simulation, com padrão em
+    test_config.simulation.
+    """
+
+    def __init__(self, config, seed=0):
+        self.config = config
+        self.seed = seed
+        self.profiles = {}
+        self.profiles_source = None
+
+    def profile(self, ip):
+        """Perfil do host com esse IP (recalculado se a lista de hosts mudar)"""
+        hosts = self.config['hosts']
+        if hosts is not self.profiles_source:
+            self.profiles = {}
+            self.profiles_source = hosts
+
+        profile = self.profiles.get(ip)
+        if profile is None:
+            rng = random.Random(zlib.crc32(f'{self.seed}:{ip}'.encode()))
+            rtt = round(rng.uniform(5, 150), 1)
+            profile = dict(DEFAULT_PROFILE, rtt_ms=rtt, jitter_ms=round(rtt * rng.uniform(0.02, 0.15), 2),
+                           hops=rng.randint(4, 15))
+            profile.update(self.config['test_config'].get('simulation', {}))
+            for host in hosts:
+                if host['ip'] == ip:
+                    profile.update(host.get('simulation', {}))
+                    break
+            self.profiles[ip] = profile
+        return profile
+
+    def in_outage(self, ip, profile, now):
+        for start, duration in profile['outages']:
+            if start <= now < start + duration:
+                return True
+        if profile['outages_per_day']:
+            window = profile['outage_minutes'] * 60
+            slot = int(now // window)
+            chance = profile['outages_per_day'] * window / 86400
+            return random.Random(f'{self.seed}:{ip}:queda:{slot}').random() < chance
+        return False
+
+    def draw(self, rng, profile):
+        mean = profile['rtt_ms']
+        spread = profile['jitter_ms']
+        if profile['distribution'] == 'normal':
+            value = rng.gauss(mean, spread)
+        elif profile['distribution'] == 'uniform':
+            value = rng.uniform(mean - spread, mean + spread)
+        else:
+            # Parâmetros da lognormal com a média e o desvio pedidos
+            sigma = math.sqrt(math.log(1 + (spread / mean) ** 2))
+            value = rng.lognormvariate(math.log(mean) - sigma * sigma / 2, sigma)
+        return max(0.05, value)
+
+    def rtt(self, ip, key, now):
+        """RTT em ms da amostra identificada por key, ou None se perdida"""
+        profile = self.profile(ip)
+        if self.in_outage(ip, profile, now):
+            return None
+        rng = random.Random(f'{self.seed}:{ip}:{key}')
+        if rng.random() * 100 < profile['loss']:
+            return None
+        return self.draw(rng, profile)
+
+    def sample(self, ip, count, now):
+        """RTTs de um teste inteiro no instante now (para gerar histórico)"""
+        return [self.rtt(ip, f'{int(now)}:{i}', now) for i in range(count)]
+
+    def path(self, ip, now):
+        """Roteadores até o host ('*' = não responde); o último é o próprio host"""
+        profile = self.profile(ip)
+        epoch = int(now // (profile['path_change_hours'] * 3600)) if profile['path_change_hours'] else 0
+        rng = random.Random(f'{self.seed}:{ip}:rota:{epoch}')
+        # O gateway não muda com a rota
+        gateway = f'192.168.{zlib.crc32(ip.encode()) % 256}.1'
+
+        ips = [gateway]
+        for _ in range(max(0, profile['hops'] - 2)):
+            router = f'10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}'
+            ips.append('*' if rng.random() < profile['silent_hop_ratio'] else router)
+        ips.append(ip)
+        return ips
+
+class SimulatedProber:
+    """Mesma interface do AsyncICMPProber, respondendo a partir da SimulatedNetwork
+
+    Com delay, cada resposta espera o RTT simulado (e a perda, o timeout),
+    então a concorrência do ciclo se comporta como na rede real.
+    """
+
+    def __init__(self, network, loop=None, delay=True):
+        self.network = network
+        self.loop = loop or asyncio.get_running_loop()
+        self.delay = delay
+        self.sequences = {}
+        self.reply_ttls = {}
+
+    def next_sequence(self, host_ip):
+        sequence = self.sequences.get(host_ip, 0) + 1
+        self.sequences[host_ip] = sequence
+        return sequence
+
+    async def wait(self, seconds):
+        if self.delay:
+            await asyncio.sleep(seconds)
+
+    async def resolve(self, host):
+        return host
+
+    async def echo(self, host_ip, timeout):
+        rtt = self.network.rtt(host_ip, self.next_sequence(host_ip), time.time())
+        if rtt is None or rtt > timeout * 1000:
+            await self.wait(timeout)
+            return None
+        await self.wait(rtt / 1000)
+        self.reply_ttls[host_ip] = 64 - (len(self.network.path(host_ip, time.time())) - 1)
+        return rtt
+
+    def hop_reply(self, host_ip, ips, ttl):
+        """(ip, RTT, chegou) do salto ttl, ou None se não respondeu"""
+        if ttl > len(ips):
+            ttl = len(ips)
+        responder = ips[ttl - 1]
+        if responder == '*':
+            return None
+        rtt = self.network.rtt(host_ip, self.next_sequence(host_ip), time.time())
+        if rtt is None:
+            return None
+        return responder, rtt * ttl / len(ips), responder == host_ip
+
+    async def probe_ttl(self, host_ip, ttl, timeout):
+        reply = self.hop_reply(host_ip, self.network.path(host_ip, time.time()), ttl)
+        await self.wait(timeout if reply is None else reply[1] / 1000)
+        return reply
+
+    async def trace(self, host_ip, max_hops=30, timeout=2, attempts=2):
+        ips = self.network.path(host_ip, time.time())[:max_hops]
+        replies = [self.hop_reply(host_ip, ips, ttl) for ttl in range(1, len(ips) + 1)]
+        # Saltos sondados em paralelo: dura o maior RTT, ou o timeout se algum não respondeu
+        if any(reply is None for reply in replies):
+            await self.wait(timeout * attempts)
+        else:
+            await self.wait(max(reply[1] for reply in replies) / 1000)
+
+        hops = [{'ttl': ttl, 'ip': reply[0] if reply else None, 'rtt': reply[1] if reply else None}
+                for ttl, reply in enumerate(replies, 1)]
+        while hops and hops[-1]['ip'] is None:
+            hops.pop()
+        return hops
+
+    def close(self):
+        pass
@@ -0,0 +1,77 @@
+"""Mede o custo de inicialização do monitor: tempo de import e memória residente
+
+Cada cenário roda em um interpretador novo, para que módulos já carregados
+não contaminem a medição. Uso:
+
+    python app/startup_benchmark.py [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Bibliotecas pesadas que não devem ser carregadas antes do primeiro teste.
+# numpy fica de fora: as estatísticas de RTT de cada teste dependem dele
+HEAVY_MODULES = ('matplotlib', 'pandas', 'plotly')
+
+SCENARIOS = {
+    # Caminho do processo de monitoramento até o primeiro teste; importar main
+    # não configura o logging (setup_logging só roda ao executar o monitor)
+    'monitor': 'import main',
+    # Custo que a geração de relatórios adiciona quando é carregada
+    'relatorios': 'import main, chart_renderer; chart_renderer.pyplot(); import pandas, plotly.graph_objects',
+}
+
+PROBE = '''
+import json, resource, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+rss_kb = 0
+with open('/proc/self/status') as status:
+    for line in status:
+        if line.startswith('VmRSS:'):
+            rss_kb = int(line.split()[1])
+print(json.dumps({{
+    'import_seconds': elapsed,
+    'rss_mb': (rss_kb or resource.getrusage(resource.RUSAGE_SELF).ru_maxrss) / 1024,
+    'heavy_loaded': [name for name in {heavy!r} if name in sys.modules]
+}}))
+'''
+
+def measure(statement):
+    """Executa o cenário em um processo novo e retorna as medições"""
+    code = PROBE.format(statement=statement, heavy=HEAVY_MODULES)
+    output = subprocess.run(
+        [sys.executable, '-c', code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de inicialização do Network Monitor')
+    parser.add_argument('--runs', type=int, default=5, help='execuções por cenário')
+    args = parser.parse_args()
+
+    failed = False
+    for name, statement in SCENARIOS.items():
+        runs = [measure(statement) for _ in range(args.runs)]
+        import_time = statistics.median(run['import_seconds'] for run in runs)
+        rss = statistics.median(run['rss_mb'] for run in runs)
+        heavy = runs[0]['heavy_loaded']
+
+        print(f"{name:<12} import {import_time * 1000:8.1f} ms   RSS {rss:7.1f} MB   "
+              f"pesados: {', '.join(heavy) or 'nenhum'}")
+
+        if name == 'monitor' and heavy:
+            failed = True
+
+    if failed:
+        print("ERRO: o caminho de monitoramento carrega bibliotecas de relatório")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
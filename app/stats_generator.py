@@ -1,18 +1,64 @@
-import matplotlib.pyplot as plt
-import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
 from datetime import datetime, timedelta
+import asyncio
+import concurrent.futures
 import logging
+import multiprocessing
 import os
+import time
+
+# matplotlib, pandas e plotly são importados só na geração dos relatórios,
+# para o processo de monitoramento não carregá-los na inicialização
+import chart_renderer
+from archive import ArchiveReader, merge_window_stats
+from metrics import CHART_RENDER_DURATION
 
 class StatsGenerator:
-    def __init__(self, db_manager):
+    def __init__(self, db_manager, config=None):
         self.db = db_manager
+        self.config = config or {"hosts": [], "test_config": {}}
+        
+        test_config = self.config['test_config']
+        self.chart_dpi = test_config.get('chart_dpi', 300)
+        self.chart_format = test_config.get('chart_format', 'png')
+        # Processo dedicado aos gráficos, criado no primeiro relatório
+        # Pontos por host no gráfico de séries, independente do tamanho da janela
+        self.series_points = test_config.get('chart_series_points', 1000)
+        self.chart_pool = None
+        # caminho do gráfico -> assinatura (geração de escrita do banco, bucket de tempo, parâmetros) da última imagem
+        self.last_charts = {}
+        # Partições arquivadas pela retenção, para relatórios além das agregações
+        self.archive = None
+        if test_config.get('archive_enabled', False):
+            self.archive = ArchiveReader(test_config.get('archive_dir', '/app/data/archive'))
+    
+    def chart_path(self):
+        return f'/app/reports/network_stats.{self.chart_format}'
+    
+    def series_chart_path(self):
+        return f'/app/reports/network_series.{self.chart_format}'
         
     def generate_hourly_stats(self):
         """Gera estatísticas da última hora"""
-        return self.db.get_hourly_stats(1)
+        stats = self.db.get_hourly_stats(1)
+        
+        # Acrescenta o SLA do período configurado e a meta de cada host
+        sla_report = {row['host_name']: row for row in self.calculate_sla_report()}
+        for host_stats in stats:
+            sla = sla_report.get(host_stats['host_name'])
+            if sla:
+                host_stats['sla'] = sla['sla']
+                host_stats['sla_target'] = sla['sla_target']
+                host_stats['sla_met'] = sla['sla_met']
+        
+        # Percentis a partir dos histogramas de latência da hora
+        percentiles = self.db.get_latency_percentiles(1)
+        for host_stats in stats:
+            host_percentiles = percentiles.get(host_stats['host_name'])
+            if host_percentiles and host_percentiles[95] is not None:
+                host_stats['p95_latency'] = host_percentiles[95]
+                host_stats['p99_latency'] = host_percentiles[99]
+        
+        return stats
     
     def generate_charts(self):
         """Gera gráficos de monitoramento"""
@@ -24,61 +70,108 @@ class StatsGenerator:
                 logging.warning("Sem dados para gerar gráficos")
                 return None
             
-            # Criar figura com subplots
-            fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(15, 12))
-            fig.suptitle('Network Monitor - Últimas 24 Horas', fontsize=16)
-            
-            hosts = [stat['host_name'] for stat in stats]
-            
-            # Gráfico 1: Disponibilidade
-            availability = [stat['availability'] for stat in stats]
-            bars1 = ax1.bar(hosts, availability, color=['green' if a >= 99 else 'orange' if a >= 95 else 'red' for a in availability])
-            ax1.set_title('Disponibilidade por Host (%)')
-            ax1.set_ylabel('Disponibilidade (%)')
-            ax1.set_ylim(0, 100)
-            ax1.tick_params(axis='x', rotation=45)
-            
-            # Adicionar valores nas barras
-            for bar, value in zip(bars1, availability):
-                ax1.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 1, 
-                        f'{value:.1f}%', ha='center', va='bottom')
-            
-            # Gráfico 2: Latência Média
-            latencies = [stat['avg_latency'] for stat in stats]
-            bars2 = ax2.bar(hosts, latencies, color='blue', alpha=0.7)
-            ax2.set_title('Latência Média por Host (ms)')
-            ax2.set_ylabel('Latência (ms)')
-            ax2.tick_params(axis='x', rotation=45)
-            
-            # Gráfico 3: Perda de Pacotes
-            packet_loss = [stat['packet_loss'] for stat in stats]
-            bars3 = ax3.bar(hosts, packet_loss, color='red', alpha=0.7)
-            ax3.set_title('Perda de Pacotes por Host (%)')
-            ax3.set_ylabel('Perda de Pacotes (%)')
-            ax3.tick_params(axis='x', rotation=45)
-            
-            # Gráfico 4: Jitter
-            jitter = [stat['jitter'] for stat in stats]
-            bars4 = ax4.bar(hosts, jitter, color='purple', alpha=0.7)
-            ax4.set_title('Jitter por Host (ms)')
-            ax4.set_ylabel('Jitter (ms)')
-            ax4.tick_params(axis='x', rotation=45)
-            
-            plt.tight_layout()
-            
-            # Salvar gráfico
-            chart_path = '/app/reports/network_stats.png'
-            os.makedirs(os.path.dirname(chart_path), exist_ok=True)
-            plt.savefig(chart_path, dpi=300, bbox_inches='tight')
-            plt.close()
-            
-            logging.info(f"Gráfico salvo em: {chart_path}")
-            return chart_path
+            return chart_renderer.render_summary_chart(stats, self.chart_path(), self.chart_dpi, self.chart_format)
             
         except Exception as e:
             logging.error(f"Erro ao gerar gráficos: {e}")
             return None
     
+    async def render_charts(self):
+        """Gera os gráficos em um processo separado, sem bloquear o event loop
+        
+        Se nada foi gravado desde a última imagem e a janela não andou de
+        bucket, ela é reaproveitada sem consultar o banco nem renderizar de novo.
+        """
+        try:
+            signature = self.chart_signature()
+            if self.chart_unchanged(self.chart_path(), signature):
+                return self.chart_path()
+            
+            stats = await asyncio.to_thread(self.db.get_hourly_stats, 24)
+            
+            if not stats:
+                logging.warning("Sem dados para gerar gráficos")
+                return None
+            
+            return await self.render_in_worker(
+                chart_renderer.render_summary_chart, self.chart_path(), signature, stats
+            )
+            
+        except Exception as e:
+            logging.error(f"Erro ao gerar gráficos: {e}")
+            return None
+    
+    async def render_series_charts(self, hours_back=24):
+        """Gera o gráfico de séries temporais de todos os hosts no processo de gráficos"""
+        try:
+            signature = self.chart_signature(hours_back)
+            if self.chart_unchanged(self.series_chart_path(), signature):
+                return self.series_chart_path()
+            
+            series = await asyncio.to_thread(self.db.get_series, hours_back, self.series_points)
+            
+            if not series:
+                logging.warning("Sem dados para gerar gráfico de séries")
+                return None
+            
+            return await self.render_in_worker(
+                chart_renderer.render_series_chart, self.series_chart_path(), signature, series, hours_back
+            )
+            
+        except Exception as e:
+            logging.error(f"Erro ao gerar gráfico de séries: {e}")
+            return None
+    
+    def chart_signature(self, *args):
+        """Assinatura do gráfico: muda a cada gravação no banco, com outros parâmetros
+        ou quando a janela "últimas N horas" passa para outro bucket de tempo
+        
+        O bucket é o mesmo do cache de consultas do banco: dentro dele a
+        consulta devolveria os mesmos dados. Lida antes da consulta, então uma
+        gravação durante a renderização faz o próximo relatório desenhar de novo.
+        """
+        bucket = int(time.time() // self.db.cache_bucket_seconds)
+        return (self.db.write_generation, bucket, args, self.chart_dpi, self.chart_format)
+    
+    def chart_unchanged(self, chart_path, signature):
+        """Se a imagem em chart_path foi desenhada com a mesma assinatura"""
+        if self.last_charts.get(chart_path) == signature and os.path.exists(chart_path):
+            logging.info("Dados e janela iguais aos do último gráfico, renderização ignorada")
+            return True
+        return False
+    
+    async def render_in_worker(self, render, chart_path, signature, *data):
+        """Executa render(*data, chart_path, ...) no processo de gráficos
+        
+        signature (de chart_signature) fica registrada para chart_path.
+        """
+        if self.chart_pool is None:
+            # spawn: o processo filho não herda threads nem o estado do event loop
+            self.chart_pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context('spawn')
+            )
+        
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            chart_path = await loop.run_in_executor(
+                self.chart_pool, render, data[0], chart_path, *data[1:],
+                self.chart_dpi, self.chart_format
+            )
+        except concurrent.futures.process.BrokenProcessPool:
+            self.chart_pool = None
+            raise
+        
+        CHART_RENDER_DURATION.observe(time.perf_counter() - start, chart=render.__name__)
+        self.last_charts[chart_path] = signature
+        return chart_path
+    
+    def close(self):
+        """Encerra o processo de renderização"""
+        if self.chart_pool is not None:
+            self.chart_pool.shutdown(wait=False, cancel_futures=True)
+            self.chart_pool = None
+    
     def generate_interactive_dashboard(self):
         """Gera dashboard interativo com Plotly"""
         try:
@@ -87,6 +180,9 @@ class StatsGenerator:
             if not stats:
                 return None
             
+            import pandas as pd
+            import plotly.graph_objects as go
+            
             df = pd.DataFrame(stats)
             
             # Criar dashboard interativo
@@ -137,21 +233,80 @@ class StatsGenerator:
             logging.error(f"Erro ao gerar dashboard: {e}")
             return None
     
-    def calculate_sla(self, host_name, period_days=30):
+    def calculate_sla(self, host_name, period_days=None, time_weighted=None):
         """Calcula SLA de um host"""
+        return self.calculate_all_sla(period_days, time_weighted, host_name).get(host_name, 0)
+    
+    def calculate_all_sla(self, period_days=None, time_weighted=None, host_name=None):
+        """Calcula o SLA de todos os hosts em uma única consulta
+        
+        Por padrão o SLA é a fração de testes com o host disponível. Com
+        time_weighted, cada teste disponível vale o tempo até o próximo (no
+        máximo dois intervalos de teste), e lacunas sem testes contam como
+        indisponibilidade.
+        """
+        test_config = self.config['test_config']
+        if period_days is None:
+            period_days = test_config.get('sla_period_days', 30)
+        if time_weighted is None:
+            time_weighted = test_config.get('sla_time_weighted', False)
+        
         try:
-            historical_data = self.db.get_historical_data(host_name, period_days * 24)
-            
-            if not historical_data:
-                return 0
-            
-            total_tests = len(historical_data)
-            successful_tests = sum(1 for data in historical_data if data[3])  # is_available
+            if time_weighted:
+                max_gap = test_config.get('test_interval_minutes', 5) * 60 * 2
+                rows = self.db.get_uptime_stats(period_days * 24, max_gap, host_name)
+                return {
+                    row['host_name']: (row['uptime'] / row['observed']) * 100 if row['observed'] > 0 else 0
+                    for row in rows
+                }
             
-            sla = (successful_tests / total_tests) * 100 if total_tests > 0 else 0
+            totals = {}
+            for row in self.get_window_stats(period_days * 24, host_name):
+                total, successful = totals.get(row['host_name'], (0, 0))
+                totals[row['host_name']] = (total + row['samples'], successful + row['available'])
             
-            return sla
+            return {
+                name: (successful / total) * 100 if total > 0 else 0
+                for name, (total, successful) in totals.items()
+            }
             
         except Exception as e:
             logging.error(f"Erro ao calcular SLA: {e}")
-            return 0
+            return {}
+    
+    def get_window_stats(self, hours_back, host_name=None):
+        """Totais por host das últimas horas, completados com o arquivo
+        
+        O banco responde a partir do dia mais antigo das agregações diárias;
+        o trecho anterior, que a retenção já removeu, vem dos arquivos das
+        partições. Sem arquivo é o mesmo que DatabaseManager.get_window_stats.
+        """
+        now = time.time()
+        cutoff_time = now - hours_back * 3600
+        rollup_start = self.db.get_rollup_start() if self.archive is not None else None
+        if rollup_start is None or cutoff_time >= rollup_start:
+            return self.db.get_window_stats(hours_back, host_name)
+        
+        # Janela começando logo antes de um limite de dia: só rollup_day entra
+        live = self.db.get_window_stats((now - rollup_start + 1) / 3600, host_name)
+        archived = self.archive.window_stats(cutoff_time, rollup_start, host_name)
+        return merge_window_stats(archived, live)
+    
+    def calculate_sla_report(self, period_days=None, time_weighted=None):
+        """Compara o SLA de cada host configurado com seu sla_target"""
+        sla_by_host = self.calculate_all_sla(period_days, time_weighted)
+        
+        report = []
+        for host in self.config['hosts']:
+            if host['name'] not in sla_by_host:
+                continue
+            sla = sla_by_host[host['name']]
+            target = host.get('sla_target')
+            report.append({
+                'host_name': host['name'],
+                'sla': sla,
+                'sla_target': target,
+                'sla_met': target is None or sla >= target
+            })
+        
+        return report
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+
+# O que fazer quando chega a hora e a execução anterior ainda não terminou
+OVERLAP_POLICIES = ('skip', 'queue', 'cancel')
+
+def seconds_until(time_of_day):
+    """Segundos até o próximo horário HH:MM (hora local)"""
+    hour, minute = (int(part) for part in time_of_day.split(':'))
+    now = datetime.now()
+    target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return (target - now).total_seconds()
+
+def seconds_until_aligned(interval):
+    """Segundos até o próximo múltiplo do intervalo no relógio (ex.: hora cheia)"""
+    now = time.time()
+    return interval - (now % interval)
+
+class TaskScheduler:
+    """Agendador de tarefas periódicas sobre um único event loop persistente
+
+    Os horários são calculados a partir do início (início + n * intervalo),
+    então atrasos de uma execução não se acumulam nas seguintes.
+    """
+
+    def __init__(self, late_tolerance=1.0):
+        # Atraso (s) acima do qual uma execução conta como atrasada
+        self.late_tolerance = late_tolerance
+        self.tasks = {}
+        self.runners = {}
+        self.metrics = {}
+
+    def add(self, name, interval, job, overlap='skip', delay=0):
+        """Registra job() para rodar a cada interval segundos, a partir de delay"""
+        if overlap not in OVERLAP_POLICIES:
+            raise ValueError(f"Política de sobreposição inválida: {overlap}")
+
+        self.tasks[name] = {
+            'interval': interval,
+            'job': job,
+            'overlap': overlap,
+            'delay': delay,
+            # Sinaliza ao laço da tarefa que o intervalo mudou
+            'changed': asyncio.Event()
+        }
+        self.metrics[name] = {
+            'runs': 0,
+            'failures': 0,
+            'skipped': 0,
+            'cancelled': 0,
+            'queued': 0,
+            'missed': 0,
+            'late_runs': 0,
+            'max_lateness': 0.0,
+            'last_duration': 0.0
+        }
+
+    def reschedule(self, name, interval):
+        """Troca o intervalo da tarefa sem interromper a execução em andamento
+
+        A próxima execução passa a ser um intervalo novo após a última.
+        """
+        task = self.tasks[name]
+        if task['interval'] != interval:
+            task['interval'] = interval
+            task['changed'].set()
+
+    def start(self):
+        """Inicia todas as tarefas registradas no event loop atual"""
+        for name in self.tasks:
+            if name not in self.runners:
+                self.runners[name] = asyncio.create_task(self.run_periodic(name))
+
+    async def stop(self):
+        """Cancela as tarefas e as execuções em andamento"""
+        for runner in self.runners.values():
+            runner.cancel()
+        await asyncio.gather(*self.runners.values(), return_exceptions=True)
+        self.runners.clear()
+
+    async def execute(self, name):
+        """Executa o job registrando duração e falhas"""
+        metrics = self.metrics[name]
+        start = time.monotonic()
+        try:
+            await self.tasks[name]['job']()
+            metrics['runs'] += 1
+        except asyncio.CancelledError:
+            metrics['cancelled'] += 1
+            raise
+        except Exception as e:
+            metrics['failures'] += 1
+            logging.error(f"Erro na tarefa {name}: {e}")
+        finally:
+            metrics['last_duration'] = time.monotonic() - start
+
+    async def run_periodic(self, name):
+        """Laço de uma tarefa: espera o horário, aplica a política e dispara"""
+        loop = asyncio.get_running_loop()
+        task = self.tasks[name]
+        metrics = self.metrics[name]
+        interval = task['interval']
+
+        start = loop.time() + task['delay']
+        slot = 0
+        current = None
+
+        try:
+            while True:
+                scheduled = start + slot * interval
+                try:
+                    await asyncio.wait_for(task['changed'].wait(), max(0, scheduled - loop.time()))
+                except asyncio.TimeoutError:
+                    pass
+                else:
+                    task['changed'].clear()
+                    if slot:
+                        start, slot = start + (slot - 1) * interval, 1
+                    interval = task['interval']
+                    logging.info(f"Tarefa {name} reagendada a cada {interval:.0f}s")
+                    continue
+
+                if current is not None and not current.done():
+                    if task['overlap'] == 'skip':
+                        metrics['skipped'] += 1
+                        logging.warning(f"Tarefa {name} ainda em execução, rodada ignorada")
+                        slot += 1
+                        continue
+                    if task['overlap'] == 'cancel':
+                        logging.warning(f"Tarefa {name} excedeu o intervalo, execução anterior cancelada")
+                        current.cancel()
+                        await asyncio.gather(current, return_exceptions=True)
+                    else:
+                        metrics['queued'] += 1
+                        await asyncio.gather(current, return_exceptions=True)
+
+                lateness = loop.time() - scheduled
+                metrics['max_lateness'] = max(metrics['max_lateness'], lateness)
+                if lateness > self.late_tolerance:
+                    metrics['late_runs'] += 1
+                    logging.warning(f"Tarefa {name} iniciada com {lateness:.1f}s de atraso")
+
+                current = asyncio.create_task(self.execute(name))
+
+                # Horários que já passaram enquanto esperávamos não são recuperados
+                slot += 1
+                behind = int((loop.time() - (start + slot * interval)) // interval) + 1
+                if behind > 0:
+                    metrics['missed'] += behind
+                    slot += behind
+        finally:
+            if current is not None and not current.done():
+                current.cancel()
+                await asyncio.gather(current, return_exceptions=True)
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import re
+
+# Linha de salto do `traceroute -n`: número do salto e o restante
+HOP_LINE = re.compile(r'^\s*(\d+)\s+(.*)$')
+# Endereço (v4 ou v6) seguido das medições " 0.512 ms"
+HOP_REPLY = re.compile(r'([0-9a-fA-F.:]+(?:%\w+)?)((?:\s+(?:[\d.]+\s+ms|\*|![A-Za-z0-9]*))+)')
+REPLY_RTT = re.compile(r'([\d.]+)\s+ms')
+
+def parse_traceroute(lines):
+    """Converte a saída do `traceroute -n` em saltos {'ttl', 'ip', 'rtt'}
+
+    Salto sem resposta tem ip e rtt None; com mais de um roteador no
+    mesmo salto fica o primeiro, com o menor RTT medido para ele.
+    """
+    hops = []
+    for line in lines:
+        match = HOP_LINE.match(line)
+        if not match:
+            continue
+
+        ip = rtt = None
+        reply = HOP_REPLY.search(match.group(2))
+        if reply and ('.' in reply.group(1) or ':' in reply.group(1)):
+            ip = reply.group(1)
+            rtts = [float(value) for value in REPLY_RTT.findall(reply.group(2))]
+            rtt = min(rtts) if rtts else None
+
+        hops.append({'ttl': int(match.group(1)), 'ip': ip, 'rtt': rtt})
+    return hops
+
+def path_ips(hops):
+    """Sequência de roteadores da rota, '*' onde o salto não respondeu"""
+    return [hop['ip'] or '*' for hop in hops]
+
+def path_hash(ips):
+    """Identificador estável da rota (não depende dos RTTs)"""
+    return hashlib.sha1(json.dumps(ips).encode()).hexdigest()[:16]
+
+def paths_differ(old_ips, new_ips):
+    """Compara duas rotas ignorando saltos sem resposta em qualquer uma delas
+
+    Roteadores que limitam respostas ICMP aparecem como '*' de forma
+    intermitente; isso não é mudança de rota.
+    """
+    if len(old_ips) != len(new_ips):
+        return True
+    return any(old != new for old, new in zip(old_ips, new_ips) if old != '*' and new != '*')
+
+def describe_path(ips, limit=15):
+    """Rota em uma linha para mensagens"""
+    text = ' → '.join(ips[:limit])
+    if len(ips) > limit:
+        text += f' → … ({len(ips)} saltos)'
+    return text
+
+class TraceroutePolicy:
+    """Decide quando rodar o traceroute de cada host
+
+    Em condições normais traça a cada traceroute_interval_minutes; antes
+    disso, somente se a latência ou a perda saltarem em relação à média
+    recente, ou se o TTL da resposta ou o primeiro salto mudarem desde o
+    último traceroute (respeitando traceroute_min_interval_minutes).
+    """
+
+    def __init__(self, test_config):
+        self.configure(test_config)
+        self.hosts = {}
+
+    def configure(self, test_config):
+        self.base_interval = test_config.get('traceroute_interval_minutes', 60) * 60
+        self.min_interval = test_config.get('traceroute_min_interval_minutes', 10) * 60
+        # Salto de latência: acima de média * fator e de média + ms
+        self.latency_jump = test_config.get('traceroute_latency_jump', 1.5)
+        self.latency_jump_ms = test_config.get('traceroute_latency_jump_ms', 20)
+        # Salto de perda, em pontos percentuais sobre a média
+        self.loss_jump = test_config.get('traceroute_loss_jump', 10)
+
+    def check(self, host_name, results, reply_ttl=None, first_hop=None):
+        """Motivo para traçar a rota do host agora, ou None"""
+        state = self.hosts.get(host_name)
+        if state is None:
+            self.hosts[host_name] = {
+                'last_trace': None,
+                'reply_ttl': reply_ttl,
+                'first_hop': first_hop,
+                'latency': results['avg_latency'],
+                'loss': results['packet_loss']
+            }
+            return 'primeira medição'
+
+        reason = None
+        elapsed = (results['timestamp'] - state['last_trace']
+                   if state['last_trace'] is not None else self.base_interval)
+        if elapsed >= self.base_interval:
+            reason = 'intervalo base'
+        elif elapsed >= self.min_interval:
+            latency = results['avg_latency']
+            if reply_ttl is not None and state['reply_ttl'] is not None and reply_ttl != state['reply_ttl']:
+                reason = f"TTL da resposta mudou ({state['reply_ttl']} -> {reply_ttl})"
+            elif first_hop is not None and state['first_hop'] is not None and first_hop != state['first_hop']:
+                reason = f"primeiro salto mudou ({state['first_hop']} -> {first_hop})"
+            elif (latency > state['latency'] * self.latency_jump and
+                    latency > state['latency'] + self.latency_jump_ms):
+                reason = f"latência subiu ({state['latency']:.1f} -> {latency:.1f} ms)"
+            elif results['packet_loss'] > state['loss'] + self.loss_jump:
+                reason = f"perda subiu ({state['loss']:.1f} -> {results['packet_loss']:.1f}%)"
+
+        # Médias móveis para a próxima comparação
+        state['latency'] += 0.2 * (results['avg_latency'] - state['latency'])
+        state['loss'] += 0.2 * (results['packet_loss'] - state['loss'])
+        return reason
+
+    def forget(self, host_name):
+        """Descarta a referência do host (removido ou com IP trocado)"""
+        self.hosts.pop(host_name, None)
+
+    def record(self, host_name, timestamp, hops, reply_ttl=None):
+        """Registra o traceroute feito: TTL e primeiro salto passam a ser a referência"""
+        state = self.hosts[host_name]
+        state['last_trace'] = timestamp
+        state['reply_ttl'] = reply_ttl
+        if hops and hops[0]['ip']:
+            state['first_hop'] = hops[0]['ip']
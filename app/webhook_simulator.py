@@ -0,0 +1,134 @@
+"""Servidor local que imita o webhook do Discord, para testar o DiscordNotifier
+
+Aceita POST em qualquer caminho, conta mensagens, embeds e arquivos e
+aplica um rate limit por janela como o do Discord (429 com Retry-After e
+retry_after no corpo). Uso avulso:
+
+    python app/webhook_simulator.py --port 8099 --limit 5 --window 2
+    DISCORD_WEBHOOK_URL=http://127.0.0.1:8099/webhook python app/main.py
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+
+from aiohttp import web
+
+class WebhookSimulator:
+    def __init__(self, host='127.0.0.1', port=0, limit=5, window=2.0, failure_rate=0, seed=0, announce=True):
+        self.host = host
+        self.port = port
+        # Mensagens aceitas por janela antes de responder 429
+        self.limit = limit
+        self.window = window
+        # Fração de requisições respondidas com 500
+        self.failure_rate = failure_rate
+        # Sem os cabeçalhos X-RateLimit-* o cliente só descobre o limite pelo 429
+        # (como no limite global do Discord)
+        self.announce = announce
+        self.random = random.Random(seed)
+        self.window_start = 0
+        self.window_count = 0
+        self.runner = None
+        self.stats = {
+            'requests': 0,
+            'messages': 0,
+            'embeds': 0,
+            'files': 0,
+            'rate_limited': 0,
+            'server_errors': 0
+        }
+
+    @property
+    def url(self):
+        return f'http://{self.host}:{self.port}/webhook'
+
+    def rate_limit_headers(self, remaining, reset_after):
+        if not self.announce:
+            return {}
+        return {
+            'X-RateLimit-Limit': str(self.limit),
+            'X-RateLimit-Remaining': str(remaining),
+            'X-RateLimit-Reset-After': f'{reset_after:.3f}'
+        }
+
+    async def handle(self, request):
+        self.stats['requests'] += 1
+        now = time.monotonic()
+        if now - self.window_start >= self.window:
+            self.window_start = now
+            self.window_count = 0
+        reset_after = self.window - (now - self.window_start)
+
+        if self.window_count >= self.limit:
+            self.stats['rate_limited'] += 1
+            headers = self.rate_limit_headers(0, reset_after)
+            headers['Retry-After'] = f'{reset_after:.3f}'
+            return web.json_response(
+                {'message': 'You are being rate limited.', 'retry_after': reset_after, 'global': False},
+                status=429, headers=headers
+            )
+
+        if self.failure_rate and self.random.random() < self.failure_rate:
+            self.stats['server_errors'] += 1
+            return web.Response(status=500)
+
+        if request.content_type == 'multipart/form-data':
+            reader = await request.multipart()
+            while await reader.next() is not None:
+                self.stats['files'] += 1
+        else:
+            body = await request.json()
+            self.stats['embeds'] += len(body.get('embeds', []))
+
+        self.window_count += 1
+        self.stats['messages'] += 1
+        return web.Response(status=204, headers=self.rate_limit_headers(self.limit - self.window_count, reset_after))
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post('/{tail:.*}', self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        # Porta 0: o sistema escolhe uma livre
+        self.port = self.runner.addresses[0][1]
+        return self.url
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+async def serve(args):
+    simulator = WebhookSimulator(args.host, args.port, args.limit, args.window, args.failure_rate,
+                                 announce=not args.hide_limits)
+    url = await simulator.start()
+    logging.info(f"Webhook simulado em {url}")
+    try:
+        while True:
+            await asyncio.sleep(10)
+            logging.info(json.dumps(simulator.stats))
+    finally:
+        await simulator.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description='Webhook do Discord simulado')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--limit', type=int, default=5, help='mensagens por janela')
+    parser.add_argument('--window', type=float, default=2.0, help='duração da janela (s)')
+    parser.add_argument('--failure-rate', type=float, default=0, help='fração de respostas 500')
+    parser.add_argument('--hide-limits', action='store_true', help='não enviar os cabeçalhos X-RateLimit-*')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
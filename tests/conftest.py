@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Os módulos do monitor ficam em app/ e se importam pelo nome, como no container
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
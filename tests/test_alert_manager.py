@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+
+from alert_manager import AlertManager, host_key
+from database import DatabaseManager
+
+HOST = {'name': 'gateway', 'ip': '192.0.2.1'}
+MINUTE = 60
+
+def sample(timestamp, level='ok'):
+    return {
+        'timestamp': timestamp,
+        'packet_loss': {'ok': 0.0, 'degraded': 20.0, 'down': 100.0}[level],
+        'avg_latency': 10.0,
+        'is_available': level != 'down'
+    }
+
+class RecordingNotifier:
+    def __init__(self):
+        self.sent = []
+
+    async def send_alert(self, host, results):
+        self.sent.append(('alert', results['timestamp']))
+
+    async def send_recovery(self, host, results, duration):
+        self.sent.append(('recovery', results['timestamp'], duration))
+
+    async def send_flapping(self, host, transitions, window_minutes):
+        self.sent.append(('flapping', transitions))
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(db_path=str(tmp_path / 'monitor.db'))
+    yield db
+    db.close()
+
+@pytest.fixture
+def manager(db):
+    config = {'test_config': {'alert_defaults': {'flap_threshold': 4, 'flap_window_minutes': 60}}}
+    return AlertManager(db, RecordingNotifier(), config)
+
+def feed(manager, levels, start=0, step=5 * MINUTE):
+    """Avalia uma amostra por nível, a cada step segundos; retorna o último timestamp"""
+    async def main():
+        timestamp = start
+        for index, level in enumerate(levels):
+            timestamp = start + index * step
+            await manager.evaluate(HOST, sample(timestamp, level))
+        return timestamp
+    return asyncio.run(main())
+
+def kinds(manager):
+    return [sent[0] for sent in manager.notifier.sent]
+
+def test_down_and_recovery(manager):
+    feed(manager, ['ok', 'down', 'down', 'ok', 'ok', 'ok'])
+    assert kinds(manager) == ['alert', 'recovery']
+    # Recupera na segunda amostra ok: 15 min fora
+    assert manager.notifier.sent[1][2] == 15 * MINUTE
+    assert manager.states[host_key(HOST)]['state'] == 'ok'
+
+def test_single_good_sample_does_not_recover(manager):
+    feed(manager, ['down', 'ok', 'down', 'ok', 'down'])
+    assert kinds(manager) == ['alert']
+    assert manager.states[host_key(HOST)]['state'] == 'down'
+
+def test_hysteresis_keeps_degraded(manager):
+    # 9% de perda: abaixo do limite de 10%, mas acima de 10% * clear_ratio
+    async def main():
+        await manager.evaluate(HOST, sample(0, 'degraded'))
+        for timestamp in (300, 600, 900):
+            await manager.evaluate(HOST, dict(sample(timestamp), packet_loss=9.0))
+    asyncio.run(main())
+    assert kinds(manager) == ['alert']
+    assert manager.states[host_key(HOST)]['state'] == 'degraded'
+
+def test_flapping_suppresses_alerts(manager):
+    feed(manager, ['down', 'ok', 'ok', 'down', 'ok', 'ok', 'down'])
+    assert kinds(manager) == ['alert', 'recovery', 'alert', 'flapping']
+    assert manager.states[host_key(HOST)]['flapping']
+
+def test_flapping_then_stable_down_alerts(manager):
+    # 4 transições em 30 min e depois fora de vez
+    last = feed(manager, ['down', 'ok', 'ok', 'down', 'ok', 'ok', 'down'] + ['down'] * 12)
+    state = manager.states[host_key(HOST)]
+    assert not state['flapping']
+    assert state['state'] == 'down'
+    assert kinds(manager) == ['alert', 'recovery', 'alert', 'flapping', 'alert']
+    # O aviso sai quando as transições antigas saem da janela, sem esperar outra mudança
+    assert manager.notifier.sent[-1][1] < last
+    assert len(state['transitions']) <= 2
+
+def test_flapping_then_stable_up_recovers(manager):
+    last = feed(manager, ['down', 'ok', 'ok', 'down', 'ok', 'ok', 'down', 'ok', 'ok'] + ['ok'] * 12)
+    state = manager.states[host_key(HOST)]
+    assert not state['flapping']
+    assert state['state'] == 'ok'
+    assert kinds(manager) == ['alert', 'recovery', 'alert', 'flapping', 'recovery']
+    assert manager.notifier.sent[-1][1] < last
+    # Duração desde a primeira transição ainda na janela até estabilizar
+    assert manager.notifier.sent[-1][2] > 0
+
+def test_flapping_does_not_repeat_while_stable(manager):
+    feed(manager, ['down', 'ok', 'ok', 'down', 'ok', 'ok', 'down'] + ['down'] * 30)
+    assert kinds(manager).count('flapping') == 1
+    assert kinds(manager).count('alert') == 3
+
+def test_state_survives_restart(db, manager):
+    feed(manager, ['down', 'down'])
+    restarted = AlertManager(db, RecordingNotifier(), manager.config)
+    assert restarted.states[host_key(HOST)]['state'] == 'down'
+    asyncio.run(restarted.evaluate(HOST, sample(600, 'down')))
+    assert restarted.notifier.sent == []
+
+def test_state_is_kept_per_probe_type(db, manager):
+    feed(manager, ['down'])
+    tcp = dict(HOST, probe_type='tcp')
+    asyncio.run(manager.evaluate(tcp, sample(0, 'degraded')))
+    restarted = AlertManager(db, RecordingNotifier(), manager.config)
+    assert restarted.states[host_key(HOST)]['state'] == 'down'
+    assert restarted.states[host_key(tcp)]['state'] == 'degraded'
+    # Trocar o tipo de teste começa do zero: nada de herdar o alerta do icmp
+    asyncio.run(restarted.evaluate(dict(HOST, probe_type='http'), sample(300, 'ok')))
+    assert restarted.notifier.sent == []
+
+def test_path_is_kept_per_probe_type(db, manager):
+    def traced(timestamp, hops):
+        return dict(sample(timestamp), traceroute=[{'hop': index + 1, 'ip': ip} for index, ip in enumerate(hops)])
+
+    async def main():
+        await manager.evaluate_path(HOST, traced(0, ['10.0.0.1', '192.0.2.1']))
+        await manager.evaluate_path(dict(HOST, probe_type='tcp'), traced(0, ['10.0.0.9', '192.0.2.1']))
+    asyncio.run(main())
+    restarted = AlertManager(db, RecordingNotifier(), manager.config)
+    assert restarted.paths[host_key(HOST)][0] == ['10.0.0.1', '192.0.2.1']
+    assert restarted.paths[('gateway', 'tcp')][0] == ['10.0.0.9', '192.0.2.1']
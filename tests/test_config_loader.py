@@ -0,0 +1,123 @@
+import asyncio
+import json
+
+import pytest
+
+from config_loader import ConfigError, ConfigWatcher, diff_hosts, diff_settings, read_config, validate_config
+
+def config(*hosts, **test_config):
+    return {'hosts': [dict(host) for host in hosts], 'test_config': test_config}
+
+GATEWAY = {'name': 'gateway', 'ip': '192.0.2.1'}
+DNS = {'name': 'dns', 'ip': '192.0.2.53', 'probe_type': 'dns'}
+
+def write(path, data):
+    path.write_text(json.dumps(data))
+
+def test_valid_config(tmp_path):
+    path = tmp_path / 'hosts.json'
+    write(path, {'hosts': [GATEWAY]})
+    assert read_config(str(path)) == {'hosts': [GATEWAY], 'test_config': {}}
+
+def test_all_problems_are_reported():
+    bad = config(GATEWAY, GATEWAY, {'name': 'web', 'ip': '192.0.2.80', 'probe_type': 'tcp'},
+                 {'name': 'sla', 'ip': '192.0.2.9', 'sla_target': 120}, ping_count=0)
+    with pytest.raises(ConfigError) as error:
+        validate_config(bad)
+    message = str(error.value)
+    for problem in ('host duplicado: gateway', "web: teste tcp sem 'probe.port'",
+                    "sla: 'sla_target'", 'test_config.ping_count'):
+        assert problem in message
+
+def test_invalid_json(tmp_path):
+    path = tmp_path / 'hosts.json'
+    path.write_text('{"hosts": [')
+    with pytest.raises(ConfigError):
+        read_config(str(path))
+
+def test_diff_hosts():
+    moved = dict(GATEWAY, ip='192.0.2.2')
+    added, removed, changed = diff_hosts([GATEWAY, DNS], [moved, {'name': 'web', 'ip': '192.0.2.80'}])
+    assert [host['name'] for host in added] == ['web']
+    assert removed == [DNS]
+    assert changed == [(GATEWAY, moved)]
+
+def test_diff_settings_splits_restart_keys():
+    live, restart = diff_settings({'ping_count': 4, 'db_write_retries': 3, 'discord_max_queue': 1000},
+                                  {'ping_count': 5, 'db_write_retries': 5, 'test_interval_minutes': 1,
+                                   'discord_max_queue': 1000})
+    assert live == ['ping_count', 'test_interval_minutes']
+    assert restart == ['db_write_retries']
+
+def watch(path, steps, interval=0.02):
+    """Roda um ConfigWatcher sobre path executando steps(watcher); retorna (watcher, configs aplicadas)"""
+    applied = []
+
+    async def on_change(new_config):
+        applied.append(new_config)
+
+    async def main():
+        watcher = ConfigWatcher(on_change, path=str(path), interval=interval)
+        watcher.start()
+        try:
+            await steps(watcher)
+        finally:
+            await watcher.stop()
+        return watcher
+
+    return asyncio.run(main()), applied
+
+def test_changed_file_is_applied(tmp_path):
+    path = tmp_path / 'hosts.json'
+    write(path, config(GATEWAY))
+
+    async def steps(watcher):
+        await asyncio.sleep(0.05)
+        write(path, config(GATEWAY, DNS, ping_count=5))
+        await asyncio.sleep(0.1)
+
+    watcher, applied = watch(path, steps)
+    assert len(applied) == 1
+    assert [host['name'] for host in applied[0]['hosts']] == ['gateway', 'dns']
+    assert watcher.reloads == 1 and watcher.failures == 0
+
+def test_invalid_file_is_rejected_until_fixed(tmp_path):
+    path = tmp_path / 'hosts.json'
+    write(path, config(GATEWAY))
+
+    async def steps(watcher):
+        write(path, config(GATEWAY, GATEWAY))
+        await asyncio.sleep(0.1)
+        write(path, config(GATEWAY, DNS))
+        await asyncio.sleep(0.1)
+
+    watcher, applied = watch(path, steps)
+    # O arquivo inválido é lido uma vez só e não chega ao monitor
+    assert watcher.failures == 1
+    assert len(applied) == 1 and len(applied[0]['hosts']) == 2
+
+def test_failure_applying_keeps_running(tmp_path):
+    path = tmp_path / 'hosts.json'
+    write(path, config(GATEWAY))
+
+    async def on_change(new_config):
+        raise RuntimeError('falhou')
+
+    async def main():
+        watcher = ConfigWatcher(on_change, path=str(path), interval=0)
+        return watcher, await watcher.reload()
+
+    watcher, applied = asyncio.run(main())
+    assert applied is False
+    assert watcher.failures == 1
+
+def test_sighup_reloads_without_file_change(tmp_path):
+    path = tmp_path / 'hosts.json'
+    write(path, config(GATEWAY))
+
+    async def steps(watcher):
+        watcher.trigger()
+        await asyncio.sleep(0.05)
+
+    watcher, applied = watch(path, steps, interval=0)
+    assert len(applied) == 1
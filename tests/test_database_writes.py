@@ -0,0 +1,106 @@
+import json
+import sqlite3
+import time
+
+import pytest
+
+from database import DatabaseManager, ResultWriteError
+
+def result(timestamp, latency=10.0):
+    return {
+        'timestamp': timestamp,
+        'packet_loss': 0.0,
+        'avg_latency': latency,
+        'min_latency': latency,
+        'max_latency': latency,
+        'jitter': 0.0,
+        'is_available': True,
+        'successful_pings': 4,
+        'total_pings': 4,
+        'traceroute': None
+    }
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(db_path=str(tmp_path / 'monitor.db'), write_retry_delay=0)
+    yield db
+    db.close()
+
+def stored_rows(db):
+    return sum(len(db.get_historical_data(name, 24)) for name in ('a', 'b', 'c'))
+
+def failed_lines(db):
+    with open(db.failed_results_path) as f:
+        return [json.loads(line) for line in f]
+
+def test_batch_is_written(db):
+    now = time.time()
+    db.save_test_results([({'name': name, 'ip': '10.0.0.1'}, result(now)) for name in ('a', 'b', 'c')])
+    assert stored_rows(db) == 3
+
+def test_bad_row_is_set_aside_and_reported(db):
+    now = time.time()
+    items = [
+        ({'name': 'a', 'ip': '10.0.0.1'}, result(now)),
+        ({'name': 'b', 'ip': '10.0.0.2'}, result(now, latency='x')),
+        ({'name': 'c', 'ip': '10.0.0.3'}, result(now))
+    ]
+    with pytest.raises(ResultWriteError) as error:
+        db.save_test_results(items)
+
+    assert error.value.failed == 1
+    assert stored_rows(db) == 2
+    lines = failed_lines(db)
+    assert [line['host']['name'] for line in lines] == ['b']
+    assert 'TypeError' in lines[0]['error']
+
+def test_incomplete_result_is_set_aside(db):
+    incomplete = result(time.time())
+    del incomplete['jitter']
+    with pytest.raises(ResultWriteError) as error:
+        db.save_test_results([({'name': 'a', 'ip': '10.0.0.1'}, incomplete)])
+
+    assert error.value.failed == 1
+    assert failed_lines(db)[0]['host']['name'] == 'a'
+
+def test_transient_error_is_retried(db, monkeypatch):
+    write_rows = db.write_rows
+    calls = []
+
+    def flaky(rows):
+        calls.append(len(rows))
+        if len(calls) < 3:
+            raise sqlite3.OperationalError('database is locked')
+        write_rows(rows)
+
+    monkeypatch.setattr(db, 'write_rows', flaky)
+    db.save_test_results([({'name': 'a', 'ip': '10.0.0.1'}, result(time.time()))])
+    assert calls == [1, 1, 1]
+    assert stored_rows(db) == 1
+
+def test_retries_are_capped(db, monkeypatch):
+    calls = []
+
+    def locked(rows):
+        calls.append(len(rows))
+        raise sqlite3.OperationalError('database is locked')
+
+    monkeypatch.setattr(db, 'write_rows', locked)
+    items = [({'name': name, 'ip': '10.0.0.1'}, result(time.time())) for name in ('a', 'b')]
+    with pytest.raises(ResultWriteError) as error:
+        db.save_test_results(items)
+
+    # Lote inteiro: 1 tentativa + write_retries; depois uma tentativa por linha
+    assert calls == [2] * (db.write_retries + 1) + [1, 1]
+    assert error.value.failed == 2
+    assert len(failed_lines(db)) == 2
+
+def test_failed_write_does_not_linger(db):
+    now = time.time()
+    with pytest.raises(ResultWriteError):
+        db.save_test_results([({'name': 'a', 'ip': '10.0.0.1'}, result(now, latency='x'))])
+
+    # O resultado com problema não volta a ser gravado nem bloqueia os próximos
+    db.save_test_results([({'name': 'b', 'ip': '10.0.0.2'}, result(now))])
+    assert stored_rows(db) == 1
+    assert len(failed_lines(db)) == 1
@@ -0,0 +1,51 @@
+import asyncio
+import time
+
+from discord_notifier import DiscordNotifier
+from webhook_simulator import WebhookSimulator
+
+def embed(index):
+    return {'title': f'alerta {index}', 'description': 'teste'}
+
+async def send(notifier, simulator, count):
+    notifier.webhook_url = await simulator.start()
+    for index in range(count):
+        await notifier.send_message(embed(index))
+
+def test_close_delivers_queued_messages():
+    async def main():
+        simulator = WebhookSimulator(limit=100, window=1)
+        notifier = DiscordNotifier(coalesce_delay=0.01)
+        try:
+            await send(notifier, simulator, 15)
+            await notifier.close()
+        finally:
+            await simulator.stop()
+        return notifier, simulator
+
+    notifier, simulator = asyncio.run(main())
+    # Até 10 embeds por mensagem
+    assert simulator.stats['embeds'] == 15
+    assert simulator.stats['messages'] == 2
+    assert notifier.session is None and notifier.sender_task is None
+
+def test_close_is_bounded_when_rate_limited():
+    async def main():
+        # Sem vagas na janela: todo POST volta 429 com Retry-After de 60s
+        simulator = WebhookSimulator(limit=0, window=60)
+        notifier = DiscordNotifier(coalesce_delay=0.01, close_timeout=0.5)
+        try:
+            await send(notifier, simulator, 25)
+            start = time.monotonic()
+            await notifier.close()
+            elapsed = time.monotonic() - start
+        finally:
+            await simulator.stop()
+        return notifier, simulator, elapsed
+
+    notifier, simulator, elapsed = asyncio.run(main())
+    assert elapsed < 2
+    assert simulator.stats['embeds'] == 0
+    # O lote em envio e o que restou na fila não foram entregues
+    assert notifier.get_stats()['dropped'] >= 15
+    assert notifier.session is None and notifier.sender_task is None
@@ -0,0 +1,146 @@
+import asyncio
+import time
+
+from database import DatabaseManager, ResultWriteError
+from pipeline import ResultPipeline, Stage
+
+def result(timestamp, latency=10.0):
+    return {
+        'timestamp': timestamp,
+        'packet_loss': 0.0,
+        'avg_latency': latency,
+        'min_latency': latency,
+        'max_latency': latency,
+        'jitter': 0.0,
+        'is_available': True,
+        'successful_pings': 4,
+        'total_pings': 4,
+        'traceroute': None
+    }
+
+class RecordingAlerts:
+    def __init__(self):
+        self.samples = []
+
+    async def evaluate(self, host, results):
+        self.samples.append((host['name'], results['timestamp']))
+
+    async def evaluate_path(self, host, results):
+        pass
+
+def test_stage_batches_items():
+    batches = []
+
+    async def handler(items):
+        batches.append(items)
+
+    async def main():
+        stage = Stage('teste', handler, batch_size=3, linger=0.05)
+        for index in range(7):
+            await stage.put(index)
+        stage.start()
+        await stage.join()
+        await stage.stop()
+        return stage.get_stats()
+
+    stats = asyncio.run(main())
+    assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+    assert stats['processed'] == 7
+    assert stats['batches'] == 3
+
+def test_stage_drop_oldest_when_full():
+    seen = []
+
+    async def handler(items):
+        seen.extend(items)
+
+    async def main():
+        stage = Stage('teste', handler, queue_size=2, overflow='drop_oldest')
+        for index in range(5):
+            await stage.put(index)
+        stage.start()
+        await stage.join()
+        await stage.stop()
+        return stage.get_stats()
+
+    stats = asyncio.run(main())
+    assert seen == [3, 4]
+    assert stats['dropped'] == 3
+
+def test_stage_counts_handler_failures():
+    async def handler(items):
+        raise RuntimeError('falha')
+
+    async def main():
+        stage = Stage('teste', handler, batch_size=10)
+        for index in range(4):
+            await stage.put(index)
+        stage.start()
+        await stage.join()
+        await stage.stop()
+        return stage.get_stats()
+
+    stats = asyncio.run(main())
+    assert (stats['processed'], stats['failures']) == (0, 4)
+
+def test_stage_counts_partial_failures():
+    async def handler(items):
+        raise ResultWriteError('1 de 4 resultados não gravados', 1)
+
+    async def main():
+        stage = Stage('teste', handler, batch_size=10)
+        for index in range(4):
+            await stage.put(index)
+        stage.start()
+        await stage.join()
+        await stage.stop()
+        return stage.get_stats()
+
+    stats = asyncio.run(main())
+    assert (stats['processed'], stats['failures']) == (3, 1)
+
+def test_same_key_stays_in_order_across_workers():
+    seen = []
+
+    async def handler(items):
+        for key, index in items:
+            await asyncio.sleep(0)
+            seen.append((key, index))
+
+    async def main():
+        stage = Stage('teste', handler, workers=4)
+        stage.start()
+        for index in range(20):
+            for key in ('a', 'b', 'c'):
+                await stage.put((key, index), key)
+        await stage.join()
+        await stage.stop()
+
+    asyncio.run(main())
+    for key in ('a', 'b', 'c'):
+        assert [index for item_key, index in seen if item_key == key] == list(range(20))
+
+def test_pipeline_writes_every_result_and_alerts(tmp_path):
+    db = DatabaseManager(db_path=str(tmp_path / 'monitor.db'))
+    alerts = RecordingAlerts()
+    now = time.time()
+    hosts = [{'name': f'host{index}', 'ip': f'10.0.0.{index}'} for index in range(3)]
+
+    async def main():
+        pipeline = ResultPipeline(db, alerts, {'pipeline_writer_batch': 4, 'pipeline_writer_linger_seconds': 0.01})
+        pipeline.start()
+        for step in range(5):
+            for host in hosts:
+                await pipeline.submit(host, result(now - step))
+        await pipeline.stop()
+        return pipeline.get_stats()
+
+    stats = asyncio.run(main())
+    assert stats['writer']['processed'] == 15
+    assert stats['alerts']['processed'] == 15
+    assert len(alerts.samples) == 15
+
+    # Gravado na hora, sem lote pendente no DatabaseManager
+    history = db.get_historical_data('host0', 1)
+    assert len(history) == 5
+    db.close()
@@ -0,0 +1,76 @@
+import asyncio
+
+from probe_scheduler import ProbeScheduler
+
+def hosts(count, subnet='10.0.0'):
+    return [{'name': f'{subnet}.{index}', 'ip': f'{subnet}.{index}'} for index in range(count)]
+
+def run(scheduler, hosts, probe):
+    return asyncio.run(scheduler.run_cycle(hosts, probe))
+
+def tracking_probe(state, delay=0.01):
+    async def probe(host):
+        state['running'] += 1
+        state['peak'] = max(state['peak'], state['running'])
+        await asyncio.sleep(delay)
+        state['running'] -= 1
+    return probe
+
+def test_global_limit():
+    scheduler = ProbeScheduler({'max_concurrent_probes': 4, 'max_concurrent_per_subnet': 100})
+    state = {'running': 0, 'peak': 0}
+    cycle = run(scheduler, hosts(10, '10.0.0') + hosts(10, '10.0.1'), tracking_probe(state))
+
+    assert state['peak'] == 4
+    assert cycle['max_in_flight'] == 4
+    assert cycle['completed'] == 20
+
+def test_subnet_limit():
+    scheduler = ProbeScheduler({'max_concurrent_probes': 100, 'max_concurrent_per_subnet': 2})
+    state = {'running': 0, 'peak': 0}
+    cycle = run(scheduler, hosts(10), tracking_probe(state))
+
+    assert state['peak'] == 2
+    assert cycle['max_in_flight'] == 2
+
+def test_queue_depth_counts_hosts_waiting_for_a_slot():
+    scheduler = ProbeScheduler({'max_concurrent_probes': 3, 'max_concurrent_per_subnet': 100})
+    cycle = run(scheduler, hosts(10), tracking_probe({'running': 0, 'peak': 0}))
+
+    # Três hosts pegam as vagas na hora; os outros sete esperam
+    assert cycle['max_queue_depth'] == 7
+    assert scheduler.queue_depth == 0
+    assert scheduler.in_flight == 0
+
+def test_no_backlog_when_limits_are_not_reached():
+    scheduler = ProbeScheduler({'max_concurrent_probes': 100, 'max_concurrent_per_subnet': 100,
+                                'probe_jitter_seconds': 0.5})
+
+    async def probe(host):
+        pass
+
+    cycle = run(scheduler, hosts(5), probe)
+    assert cycle['max_queue_depth'] == 0
+    assert cycle['completed'] == 5
+
+def test_failures_are_counted():
+    scheduler = ProbeScheduler({})
+
+    async def probe(host):
+        if host['name'].endswith('.1'):
+            raise RuntimeError('falha')
+
+    cycle = run(scheduler, hosts(3), probe)
+    assert (cycle['completed'], cycle['failed']) == (2, 1)
+
+def test_start_offset_is_stable_and_bounded():
+    scheduler = ProbeScheduler({'probe_jitter_seconds': 30, 'test_interval_minutes': 5})
+    offsets = [scheduler.start_offset(host) for host in hosts(50)]
+
+    assert offsets == [scheduler.start_offset(host) for host in hosts(50)]
+    assert all(0 <= offset < 30 for offset in offsets)
+    assert len(set(offsets)) > 1
+
+def test_jitter_is_capped_at_half_the_interval():
+    scheduler = ProbeScheduler({'probe_jitter_seconds': 600, 'test_interval_minutes': 1})
+    assert scheduler.jitter_seconds == 30
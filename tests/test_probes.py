@@ -0,0 +1,51 @@
+import asyncio
+import warnings
+
+from aiohttp import web
+
+from probes import HttpProbe
+
+SETTINGS = {'method': 'GET', 'port': 80, 'timeout': 5}
+
+async def serve(status):
+    async def handler(request):
+        return web.Response(status=status, text='ok')
+
+    app = web.Application()
+    app.router.add_get('/', handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    return runner, f'http://127.0.0.1:{runner.addresses[0][1]}/'
+
+def probe_once(status):
+    async def main():
+        runner, url = await serve(status)
+        probe = HttpProbe(asyncio.get_running_loop())
+        try:
+            return await probe.measure('127.0.0.1', dict(SETTINGS, url=url)), probe
+        finally:
+            await probe.close()
+            await runner.cleanup()
+    return asyncio.run(main())
+
+def test_http_probe_measures_and_closes():
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        ttfb, probe = probe_once(200)
+    assert ttfb is not None and ttfb > 0
+    assert probe.session.closed
+    assert probe.connector.closed
+
+def test_http_probe_error_status_is_failure():
+    ttfb, probe = probe_once(503)
+    assert ttfb is None
+    assert probe.connector.closed
+
+def test_http_probe_close_after_loop_ended():
+    async def create():
+        return HttpProbe(asyncio.get_running_loop())
+    probe = asyncio.run(create())
+    # O loop de quem criou já terminou: fechar num loop novo não pode falhar
+    asyncio.run(probe.close())
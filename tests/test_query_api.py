@@ -0,0 +1,91 @@
+import asyncio
+import json
+import sqlite3
+import time
+
+import aiohttp
+import pytest
+
+import query_api
+from database import DatabaseManager
+from query_api import QueryAPI
+
+def result(timestamp, latency=10.0):
+    return {
+        'timestamp': timestamp,
+        'packet_loss': 0.0,
+        'avg_latency': latency,
+        'min_latency': latency,
+        'max_latency': latency,
+        'jitter': 0.0,
+        'is_available': True,
+        'successful_pings': 4,
+        'total_pings': 4,
+        'traceroute': None
+    }
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(db_path=str(tmp_path / 'monitor.db'))
+    now = time.time()
+    db.save_test_results([({'name': 'gateway', 'ip': '192.0.2.1'}, result(now - index * 60))
+                          for index in range(30)])
+    yield db
+    db.close()
+
+def get(db, path):
+    """Sobe a API numa porta livre, faz o GET e devolve (status, corpo)"""
+    async def main():
+        api = QueryAPI(db, {'hosts': [], 'test_config': {}}, host='127.0.0.1', port=0)
+        await api.start()
+        port = api.runner.addresses[0][1]
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f'http://127.0.0.1:{port}{path}') as response:
+                    try:
+                        return response.status, await response.read()
+                    except aiohttp.ClientPayloadError:
+                        return response.status, None
+        finally:
+            await api.stop()
+    return asyncio.run(main())
+
+def test_history(db):
+    status, body = get(db, '/api/hosts/gateway/history?limit=10')
+    page = json.loads(body)
+    assert status == 200
+    assert len(page['items']) == 10 and page['next']
+
+def test_unknown_host_is_404(db):
+    status, body = get(db, '/api/hosts/nenhum/history')
+    assert status == 404
+    assert 'nenhum' in json.loads(body)['error']
+
+def test_other_key_errors_are_not_404(db, monkeypatch):
+    def broken(conn):
+        return {}['host_name']
+    monkeypatch.setattr(query_api, 'latest_status', broken)
+    status, _ = get(db, '/api/status')
+    assert status == 500
+
+def test_export(db):
+    status, body = get(db, '/api/export')
+    assert status == 200
+    assert len(body.decode().splitlines()) == 30
+
+def test_export_failure_after_headers_truncates(db, monkeypatch):
+    monkeypatch.setattr(query_api, 'EXPORT_CHUNK', 10)
+    calls = []
+    results_page = query_api.results_page
+
+    def failing(conn, *args):
+        calls.append(args)
+        if len(calls) > 1:
+            raise sqlite3.OperationalError('disk I/O error')
+        return results_page(conn, *args)
+    monkeypatch.setattr(query_api, 'results_page', failing)
+
+    status, body = get(db, '/api/export')
+    # 200 já enviado: nada de JSON de erro no meio do NDJSON, só a resposta incompleta
+    assert status == 200
+    assert body is None
@@ -0,0 +1,104 @@
+import time
+
+import pytest
+
+import database
+from database import DatabaseManager
+from query_cache import MISSING, QueryCache
+
+HOST = {'name': 'gateway', 'ip': '192.0.2.1'}
+
+def result(timestamp):
+    return {
+        'timestamp': timestamp,
+        'packet_loss': 0.0,
+        'avg_latency': 10.0,
+        'min_latency': 9.0,
+        'max_latency': 11.0,
+        'jitter': 0.5,
+        'is_available': True,
+        'successful_pings': 4,
+        'total_pings': 4,
+        'traceroute': None
+    }
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(db_path=str(tmp_path / 'monitor.db'))
+    db.save_test_results([(HOST, result(time.time() - 60))])
+    yield db
+    db.close()
+
+def samples(db):
+    return db.get_window_stats(1)[0]['samples']
+
+def test_lru_eviction():
+    cache = QueryCache(max_entries=2)
+    for key in ('a', 'b'):
+        cache.get(key, 1)
+        cache.put(key, key.upper())
+    assert cache.get('a', 1) == 'A'
+    cache.put('c', 'C')
+    # 'b' era o menos usado
+    assert cache.get('b', 1) is MISSING
+    assert cache.get('a', 1) == 'A'
+    assert cache.get_stats()['evictions'] == 1
+
+def test_new_version_discards_everything():
+    cache = QueryCache()
+    cache.get('a', 1)
+    cache.put('a', None)
+    assert cache.get('a', 1) is None
+    assert cache.get('a', 2) is MISSING
+    assert cache.get_stats()['invalidations'] == 1
+
+def test_repeated_read_is_a_hit(db):
+    samples(db)
+    hits = db.query_cache.stats['hits']
+    samples(db)
+    assert db.query_cache.stats['hits'] == hits + 1
+
+def test_write_invalidates(db):
+    assert samples(db) == 1
+    db.save_test_results([(HOST, result(time.time() - 30))])
+    assert samples(db) == 2
+
+def test_write_from_another_connection_invalidates(db):
+    assert samples(db) == 1
+    # Outro worker no mesmo banco: só o data_version do SQLite muda
+    other = DatabaseManager(db_path=db.db_path)
+    try:
+        other.save_test_results([(HOST, result(time.time() - 30))])
+    finally:
+        other.close()
+    assert samples(db) == 2
+
+def test_retention_invalidates(db):
+    db.save_test_results([(HOST, result(time.time() - 40 * 86400))])
+    db.get_historical_data(HOST['name'], 24 * 60)
+    assert len(db.get_historical_data(HOST['name'], 24 * 60)) == 2
+    db.cleanup_old_data(days_to_keep=30)
+    assert len(db.get_historical_data(HOST['name'], 24 * 60)) == 1
+
+def test_window_moves_with_the_clock(db, monkeypatch):
+    now = [time.time()]
+    monkeypatch.setattr(database.time, 'time', lambda: now[0])
+    samples(db)
+    misses = db.query_cache.stats['misses']
+    samples(db)
+    assert db.query_cache.stats['misses'] == misses
+    # Próximo bucket de tempo: a janela "última hora" andou e a consulta roda de novo
+    now[0] += db.cache_bucket_seconds
+    samples(db)
+    assert db.query_cache.stats['misses'] == misses + 1
+
+def test_cache_can_be_disabled(tmp_path):
+    db = DatabaseManager(db_path=str(tmp_path / 'monitor.db'), cache_size=0)
+    try:
+        db.save_test_results([(HOST, result(time.time() - 60))])
+        samples(db)
+        samples(db)
+        assert db.query_cache.get_stats() == {'hits': 0, 'misses': 0, 'evictions': 0,
+                                               'invalidations': 0, 'entries': 0}
+    finally:
+        db.close()
@@ -0,0 +1,47 @@
+import time
+
+import pytest
+
+from database import DatabaseManager
+import query_api
+
+def result(timestamp, latency):
+    return {
+        'timestamp': timestamp,
+        'packet_loss': 0.0,
+        'avg_latency': latency,
+        'min_latency': latency,
+        'max_latency': latency,
+        'jitter': 0.0,
+        'is_available': True,
+        'successful_pings': 4,
+        'total_pings': 4,
+        'traceroute': None
+    }
+
+@pytest.fixture
+def db(tmp_path):
+    """Banco novo criado pelo init_database, com resultados de hoje em alguns hosts"""
+    db = DatabaseManager(db_path=str(tmp_path / 'monitor.db'))
+    now = time.time()
+    hosts = [{'name': f'host{index}', 'ip': f'10.0.0.{index}'} for index in range(5)]
+    db.save_test_results([(host, result(now - step * 60, 10.0 + index))
+                          for step in range(10) for index, host in enumerate(hosts)])
+    db.save_alert_state(hosts[0], {'state': 'up', 'since': now, 'pending_state': None,
+                                   'pending_count': 0, 'flapping': False, 'transitions': []})
+    db.save_host_path(hosts[0], ['10.0.0.254', hosts[0]['ip']], now)
+    yield db
+    db.close()
+
+def test_database_query_plans(db):
+    assert db.check_query_plans() == {}
+
+def test_query_api_query_plans(db):
+    with db.lock:
+        assert query_api.check_query_plans(db.conn) == {}
+
+def test_latest_status_uses_newest_result(db):
+    status = {row['host_name']: row for row in query_api.latest_status(db.conn)}
+    assert len(status) == 5
+    assert status['host0']['avg_latency'] == 10.0
+    assert status['host0']['alert_state'] == 'up'
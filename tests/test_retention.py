@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+import pytest
+
+from database import DatabaseManager
+from migrations import list_partitions
+from retention import RetentionManager
+
+HOST = {'name': 'gateway', 'ip': '192.0.2.1'}
+DAY = 86400
+
+def result(timestamp):
+    return {
+        'timestamp': timestamp,
+        'packet_loss': 0.0,
+        'avg_latency': 10.0,
+        'min_latency': 9.0,
+        'max_latency': 11.0,
+        'jitter': 0.5,
+        'is_available': True,
+        'successful_pings': 4,
+        'total_pings': 4,
+        'traceroute': None
+    }
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(db_path=str(tmp_path / 'monitor.db'))
+    now = time.time()
+    # Resultados de 40, 35, 2 e 1 dia atrás, 6 por dia, em partições diárias
+    db.save_test_results([(HOST, result(now - days * DAY + index * 60))
+                          for days in (40, 35, 2, 1) for index in range(6)])
+    # Linhas antigas na tabela de antes do particionamento
+    host_id = db.get_host_id(HOST['name'], HOST['ip'])
+    with db.conn:
+        db.conn.executemany('INSERT INTO test_results (timestamp, host_id, avg_latency) VALUES (?, ?, 10)',
+                            [(now - 60 * DAY + index, host_id) for index in range(25)])
+    yield db
+    db.close()
+
+def raw_rows(db):
+    tables = ['test_results'] + list_partitions(db.conn)
+    return sum(db.conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] for table in tables)
+
+def test_expired_data_is_removed(db):
+    partitions = len(list_partitions(db.conn))
+    report = db.cleanup_old_data(days_to_keep=30)
+    assert report['partitions_dropped'] == 2
+    assert report['rows_deleted'] == 12 + 25
+    assert raw_rows(db) == 12
+    assert len(list_partitions(db.conn)) == partitions - 2
+
+def test_steps_are_short_and_release_the_lock(db):
+    steps = 0
+    for report in db.iter_retention(days_to_keep=30, chunk_size=10):
+        steps += 1
+        # Entre os passos gravações e leituras conseguem o lock
+        assert db.lock.lock.acquire(blocking=False)
+        db.lock.lock.release()
+    # 2 partições, 3 lotes de test_results (10 + 10 + 5) e ao menos um passo por tabela e do vacuum
+    assert steps >= 2 + 3 + 4 + 1
+    assert report['rows_deleted'] == 12 + 25
+
+def test_rollups_outlive_raw_data(db):
+    db.cleanup_old_data(days_to_keep=30)
+    count = lambda table: db.conn.execute(f'SELECT SUM(samples) FROM {table}').fetchone()[0]
+    # Minuto segue a retenção dos dados brutos; hora e dia, rollup_retention_days
+    assert count('rollup_minute') == 12
+    assert count('rollup_hour') == 24
+    assert count('rollup_day') == 24
+
+def test_partition_is_kept_when_archive_is_incomplete(db):
+    class ShortArchiver:
+        def iter_archive(self, db, name):
+            yield (name, 5)
+
+    report = None
+    for report in db.iter_retention(days_to_keep=30, archiver=ShortArchiver()):
+        pass
+    assert report['partitions_dropped'] == 0
+    assert report['partitions_archived'] == 0
+    assert raw_rows(db) == 24
+
+def test_retention_manager_runs_off_the_loop(db):
+    manager = RetentionManager(db, {'retention_days': 30, 'retention_chunk_size': 10,
+                                    'retention_pause_seconds': 0})
+    report = asyncio.run(manager.run())
+    assert report['rows_deleted'] == 37
+    assert report['duration'] >= 0
+    assert manager.last_report is report
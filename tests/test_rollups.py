@@ -0,0 +1,98 @@
+import random
+import time
+
+import pytest
+
+from database import DatabaseManager
+
+HOSTS = [{'name': 'gateway', 'ip': '192.0.2.1'}, {'name': 'dns', 'ip': '192.0.2.53'}]
+
+def result(timestamp, rng):
+    latency = rng.uniform(1, 200)
+    available = rng.random() > 0.1
+    return {
+        'timestamp': timestamp,
+        'packet_loss': 0.0 if available else 100.0,
+        'avg_latency': latency,
+        'min_latency': latency * 0.8,
+        'max_latency': latency * 1.3,
+        'jitter': rng.uniform(0, 5),
+        'is_available': available,
+        'successful_pings': 4 if available else 0,
+        'total_pings': 4,
+        'traceroute': None
+    }
+
+@pytest.fixture(scope='module')
+def samples(tmp_path_factory):
+    """Banco com ~50h de resultados irregulares de dois hosts e a lista do que foi gravado"""
+    db = DatabaseManager(db_path=str(tmp_path_factory.mktemp('rollups') / 'monitor.db'))
+    rng = random.Random(4)
+    now = time.time()
+    written = []
+    timestamp = now - 50 * 3600
+    while timestamp < now:
+        batch = [(host, result(timestamp + rng.uniform(0, 30), rng)) for host in HOSTS]
+        db.save_test_results(batch)
+        written.extend(batch)
+        timestamp += rng.uniform(120, 600)
+    yield db, written
+    db.close()
+
+def expected(written, cutoff, host_name=None):
+    """Totais por host calculados direto dos resultados gravados"""
+    totals = {}
+    for host, res in written:
+        if res['timestamp'] <= cutoff or (host_name and host['name'] != host_name):
+            continue
+        agg = totals.setdefault(host['name'], [0, 0, 0.0, 0.0, float('inf'), float('-inf'), 0.0, 0.0])
+        agg[0] += 1
+        agg[1] += 1 if res['is_available'] else 0
+        agg[2] += res['avg_latency']
+        agg[3] += res['avg_latency'] ** 2
+        agg[4] = min(agg[4], res['min_latency'])
+        agg[5] = max(agg[5], res['max_latency'])
+        agg[6] += res['packet_loss']
+        agg[7] += res['jitter']
+    return totals
+
+@pytest.mark.parametrize('hours_back', [0.5, 1, 5.25, 24, 49])
+def test_window_query_matches_raw_scan(samples, hours_back):
+    db, written = samples
+    cutoff = time.time() - hours_back * 3600
+    rows = db.conn.execute(*db.window_query(cutoff)).fetchall()
+    totals = expected(written, cutoff)
+
+    assert sorted(row[0] for row in rows) == sorted(totals)
+    for name, ip, *values in rows:
+        agg = totals[name]
+        assert values[:2] == agg[:2]
+        assert values[2:] == pytest.approx(agg[2:])
+
+def test_window_query_for_one_host(samples):
+    db, written = samples
+    cutoff = time.time() - 7.5 * 3600
+    rows = db.conn.execute(*db.window_query(cutoff, 'dns')).fetchall()
+    assert [row[0] for row in rows] == ['dns']
+    assert rows[0][2] == expected(written, cutoff, 'dns')['dns'][0]
+
+@pytest.mark.parametrize('granularity, width', [('minute', 60), ('hour', 3600), ('day', 86400)])
+def test_rollup_buckets_sum_the_samples(samples, granularity, width):
+    db, written = samples
+    counts = {}
+    for host, res in written:
+        key = (host['name'], int(res['timestamp'] // width) * width)
+        counts[key] = counts.get(key, 0) + 1
+
+    rows = db.conn.execute(f'''
+        SELECT h.name, r.bucket, r.samples FROM rollup_{granularity} r JOIN hosts h ON h.id = r.host_id
+    ''').fetchall()
+    assert {(name, bucket): samples for name, bucket, samples in rows} == counts
+
+def test_hourly_stats_use_the_window(samples):
+    db, written = samples
+    stats = {row['host_name']: row for row in db.get_hourly_stats(24)}
+    totals = expected(written, time.time() - 24 * 3600)
+    for name, agg in totals.items():
+        assert stats[name]['total_tests'] == agg[0]
+        assert stats[name]['availability'] == pytest.approx(agg[1] * 100.0 / agg[0])
@@ -0,0 +1,98 @@
+import time
+
+import pytest
+
+from database import DatabaseManager
+from sharding import HashRing, ShardMembership
+
+HOSTS = [{'name': f'host-{index}', 'ip': f'10.0.{index // 250}.{index % 250 + 1}'} for index in range(300)]
+
+@pytest.fixture
+def db_path(tmp_path):
+    # O DatabaseManager cria o schema, inclusive worker_leases
+    path = str(tmp_path / 'monitor.db')
+    DatabaseManager(db_path=path).close()
+    return path
+
+def owned(shard):
+    return {host['name'] for host in HOSTS if shard.owns(host)}
+
+def test_ring_moves_only_the_new_workers_share():
+    before = HashRing(['worker-0', 'worker-1', 'worker-2'])
+    after = HashRing(['worker-0', 'worker-1', 'worker-2', 'worker-3'])
+    moved = [host['name'] for host in HOSTS if before.owner(host['name']) != after.owner(host['name'])]
+    assert all(after.owner(name) == 'worker-3' for name in moved)
+    # Perto de 1/4 dos hosts, longe de redistribuir tudo
+    assert 0.1 * len(HOSTS) < len(moved) < 0.4 * len(HOSTS)
+
+def test_standalone_owns_everything(db_path):
+    shard = ShardMembership(db_path)
+    assert not shard.refresh()
+    assert owned(shard) == {host['name'] for host in HOSTS}
+    assert shard.is_leader
+
+def test_workers_split_the_hosts(db_path):
+    first = ShardMembership(db_path, 'worker-0')
+    second = ShardMembership(db_path, 'worker-1')
+    try:
+        first.refresh()
+        second.refresh()
+        first.refresh()
+        assert owned(first) and owned(second)
+        assert not owned(first) & owned(second)
+        assert owned(first) | owned(second) == {host['name'] for host in HOSTS}
+        # Líder é o lease mais antigo
+        assert first.is_leader and not second.is_leader
+    finally:
+        first.close()
+        second.close()
+
+def test_expired_lease_is_taken_over(db_path):
+    config = {'shard_lease_ttl_seconds': 0.2}
+    first = ShardMembership(db_path, 'worker-0', config)
+    second = ShardMembership(db_path, 'worker-1', config)
+    try:
+        first.refresh()
+        second.refresh()
+        assert len(owned(second)) < len(HOSTS)
+        # worker-0 para de renovar (travou ou morreu sem liberar o lease)
+        time.sleep(0.3)
+        assert second.refresh()
+        assert second.workers == ['worker-1']
+        assert owned(second) == {host['name'] for host in HOSTS}
+        assert second.is_leader
+    finally:
+        first.coordinator.close()
+        second.close()
+
+def test_released_lease_is_taken_over_immediately(db_path):
+    first = ShardMembership(db_path, 'worker-0')
+    second = ShardMembership(db_path, 'worker-1')
+    try:
+        first.refresh()
+        second.refresh()
+        first.close()
+        assert second.refresh()
+        assert owned(second) == {host['name'] for host in HOSTS}
+        assert second.is_leader
+    finally:
+        second.close()
+
+def test_returning_worker_gets_its_hosts_back(db_path):
+    config = {'shard_lease_ttl_seconds': 0.2}
+    first = ShardMembership(db_path, 'worker-0', config)
+    second = ShardMembership(db_path, 'worker-1', config)
+    try:
+        first.refresh()
+        second.refresh()
+        first.refresh()
+        share = owned(first)
+        time.sleep(0.3)
+        second.refresh()
+        first.refresh()
+        second.refresh()
+        assert owned(first) == share
+        assert not owned(first) & owned(second)
+    finally:
+        first.close()
+        second.close()
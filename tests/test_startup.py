@@ -0,0 +1,17 @@
+import os
+import subprocess
+import sys
+
+import startup_benchmark
+
+APP_DIR = os.path.dirname(os.path.abspath(startup_benchmark.__file__))
+
+def test_importing_main_has_no_logging_side_effects():
+    code = 'import logging, main; print(len(logging.getLogger().handlers))'
+    output = subprocess.run([sys.executable, '-c', code], cwd=APP_DIR,
+                            capture_output=True, text=True, check=True).stdout
+    assert output.strip() == '0'
+
+def test_monitor_path_skips_report_libraries():
+    run = startup_benchmark.measure(startup_benchmark.SCENARIOS['monitor'])
+    assert run['heavy_loaded'] == []
@@ -0,0 +1,45 @@
+import stats_generator
+from stats_generator import StatsGenerator
+
+class FakeDatabase:
+    write_generation = 0
+    cache_bucket_seconds = 60
+
+def chart(tmp_path):
+    path = tmp_path / 'network_stats.png'
+    path.write_bytes(b'')
+    return str(path)
+
+def test_signature_is_stable_without_writes(monkeypatch):
+    monkeypatch.setattr(stats_generator.time, 'time', lambda: 6000.0)
+    stats = StatsGenerator(FakeDatabase())
+    assert stats.chart_signature(24) == stats.chart_signature(24)
+    assert stats.chart_signature(24) != stats.chart_signature(12)
+
+def test_signature_changes_with_writes(monkeypatch):
+    monkeypatch.setattr(stats_generator.time, 'time', lambda: 6000.0)
+    db = FakeDatabase()
+    stats = StatsGenerator(db)
+    before = stats.chart_signature()
+    db.write_generation = 1
+    assert stats.chart_signature() != before
+
+def test_window_moving_redraws_without_writes(monkeypatch, tmp_path):
+    now = [6000.0]
+    monkeypatch.setattr(stats_generator.time, 'time', lambda: now[0])
+    stats = StatsGenerator(FakeDatabase())
+    path = chart(tmp_path)
+    stats.last_charts[path] = stats.chart_signature(24)
+
+    now[0] = 6059.0
+    assert stats.chart_unchanged(path, stats.chart_signature(24))
+    # Próximo bucket: a janela de 24h andou e o gráfico é desenhado de novo
+    now[0] = 6060.0
+    assert not stats.chart_unchanged(path, stats.chart_signature(24))
+
+def test_missing_image_is_redrawn(monkeypatch, tmp_path):
+    monkeypatch.setattr(stats_generator.time, 'time', lambda: 6000.0)
+    stats = StatsGenerator(FakeDatabase())
+    path = str(tmp_path / 'network_stats.png')
+    stats.last_charts[path] = stats.chart_signature()
+    assert not stats.chart_unchanged(path, stats.chart_signature())
@@ -0,0 +1,128 @@
+import asyncio
+import time
+
+import pytest
+
+from task_scheduler import TaskScheduler, seconds_until, seconds_until_aligned
+
+def run_for(scheduler, seconds):
+    async def main():
+        scheduler.start()
+        await asyncio.sleep(seconds)
+        await scheduler.stop()
+    asyncio.run(main())
+
+def test_runs_on_fixed_slots_without_drift():
+    scheduler = TaskScheduler()
+    starts = []
+
+    async def job():
+        starts.append(asyncio.get_running_loop().time())
+        # Cada execução leva 40% do intervalo: horários não podem escorregar
+        await asyncio.sleep(0.02)
+
+    scheduler.add('teste', 0.05, job)
+    run_for(scheduler, 0.52)
+    assert len(starts) >= 9
+    for index, start in enumerate(starts):
+        assert start - starts[0] == pytest.approx(index * 0.05, abs=0.015)
+
+def test_delay_postpones_the_first_run():
+    scheduler = TaskScheduler()
+    starts = []
+
+    async def job():
+        starts.append(asyncio.get_running_loop().time())
+
+    async def main():
+        scheduler.add('teste', 10, job, delay=0.1)
+        started = asyncio.get_running_loop().time()
+        scheduler.start()
+        await asyncio.sleep(0.15)
+        await scheduler.stop()
+        return started
+
+    started = asyncio.run(main())
+    assert len(starts) == 1
+    assert starts[0] - started == pytest.approx(0.1, abs=0.015)
+
+@pytest.mark.parametrize('overlap, counter', [('skip', 'skipped'), ('cancel', 'cancelled'), ('queue', 'queued')])
+def test_overlap_policies(overlap, counter):
+    scheduler = TaskScheduler()
+    running = []
+    overlapped = []
+
+    async def job():
+        overlapped.append(bool(running))
+        running.append(1)
+        try:
+            await asyncio.sleep(0.12)
+        finally:
+            running.pop()
+
+    scheduler.add('teste', 0.05, job, overlap=overlap)
+    run_for(scheduler, 0.4)
+    assert scheduler.metrics['teste'][counter] >= 1
+    assert not any(overlapped)
+
+def test_failures_do_not_stop_the_task():
+    scheduler = TaskScheduler()
+
+    async def job():
+        raise RuntimeError('falhou')
+
+    scheduler.add('teste', 0.05, job)
+    run_for(scheduler, 0.27)
+    metrics = scheduler.metrics['teste']
+    assert metrics['failures'] >= 4
+    assert metrics['runs'] == 0
+
+def test_reschedule_changes_the_interval():
+    scheduler = TaskScheduler()
+    starts = []
+
+    async def job():
+        starts.append(asyncio.get_running_loop().time())
+
+    async def main():
+        scheduler.add('teste', 0.2, job)
+        scheduler.start()
+        await asyncio.sleep(0.05)
+        scheduler.reschedule('teste', 0.05)
+        await asyncio.sleep(0.3)
+        await scheduler.stop()
+
+    asyncio.run(main())
+    # Sem a troca seriam 2 execuções (0 e 0,2s)
+    assert len(starts) >= 5
+    gaps = [b - a for a, b in zip(starts[1:], starts[2:])]
+    assert all(gap == pytest.approx(0.05, abs=0.015) for gap in gaps)
+
+def test_missed_slots_are_not_replayed():
+    scheduler = TaskScheduler()
+    calls = []
+
+    async def job():
+        calls.append(1)
+
+    async def main():
+        scheduler.add('teste', 0.02, job)
+        scheduler.start()
+        await asyncio.sleep(0)
+        # Bloqueia o loop por 5 intervalos
+        time.sleep(0.1)
+        await asyncio.sleep(0.01)
+        await scheduler.stop()
+
+    asyncio.run(main())
+    metrics = scheduler.metrics['teste']
+    assert metrics['missed'] >= 3
+    assert len(calls) <= 3
+
+def test_invalid_overlap_policy():
+    with pytest.raises(ValueError):
+        TaskScheduler().add('teste', 1, None, overlap='parallel')
+
+def test_alignment_helpers():
+    assert 0 < seconds_until_aligned(3600) <= 3600
+    assert 0 < seconds_until('03:00') <= 86400